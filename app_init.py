@@ -6,7 +6,7 @@ import os
 
 load_dotenv()
 
-def create_app():
+def create_app(with_scheduler=True):
     app = Flask(__name__)
 
     # アプリ設定
@@ -32,8 +32,9 @@ def create_app():
     from routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
-    # ✅ スケジューラー起動
-    from post_scheduler import start_scheduler
-    start_scheduler(app)
+    # ✅ スケジューラー起動（ワーカーなど Web 以外のプロセスでは起動しない）
+    if with_scheduler:
+        from post_scheduler import start_scheduler
+        start_scheduler(app)
 
     return app
@@ -1,26 +1,46 @@
 # article_generator.py
 
-import openai
+import asyncio
+import contextlib
 import os
-import requests
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from models import db, Article
 from utils.logger import log_article_progress
+from utils import metrics, model_router, pixabay, title_pool
+from utils.rate_limiter import estimate_text_tokens
 
 
 # .envの読み込み
 load_dotenv()
 
-# APIキー
-openai.api_key = os.getenv("OPENAI_API_KEY")
-PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY")
-
-# APIコスト計算用（GPT-4）
-GPT4_INPUT_COST = 0.01 / 1000  # $0.01 / 1K tokens
-GPT4_OUTPUT_COST = 0.03 / 1000  # $0.03 / 1K tokens
+# 生成途中の Article に入れておく仮の値
+TITLE_PLACEHOLDER = "タイトル生成中..."
+
+# 本文生成設定
+BODY_MAX_TOKENS = model_router.route("body")["max_tokens"]
+BODY_PLACEHOLDER = "本文生成中..."
+BODY_STREAM_FLUSH_SEC = float(os.getenv("BODY_STREAM_FLUSH_SEC", "2.0"))  # 途中保存の間隔
+BODY_PROGRESS_LOG_SEC = float(os.getenv("BODY_PROGRESS_LOG_SEC", "10"))  # 本文の進捗を投稿ログに残す間隔
+BODY_STREAM_TIMEOUT = float(os.getenv("BODY_STREAM_TIMEOUT", "60"))  # 無応答で打ち切る秒数
+BODY_STREAM_MAX_RESUMES = int(os.getenv("BODY_STREAM_MAX_RESUMES", "2"))  # 途切れたときの再開回数
+
+# 見出し構成を先に作り、見出しごとの本文を並行生成するモード（1記事の待ち時間が最長の見出し分になる）
+BODY_SECTIONS = os.getenv("BODY_SECTIONS", "false").lower() in ("1", "true", "yes")
+BODY_SECTIONS_MIN = int(os.getenv("BODY_SECTIONS_MIN", "3"))
+BODY_SECTIONS_MAX = int(os.getenv("BODY_SECTIONS_MAX", "5"))
+BODY_TARGET_CHARS = 2000
+
+# 本文の文体の条件（一括生成・見出しごとの生成で共通）
+BODY_STYLE_RULES = """・1行の長さは30文字前後にして接続詞などで改行してください。
+・「文章の島」は1行から3行以内にして、文章の島同士は2行空けてください
+・親友に向けて話すように書いてください（ただし敬語を使ってください）
+・読み手のことは「皆さん」ではなく必ず「あなた」と書いてください。"""
 
 
-def generate_title_from_keyword(keyword):
+def build_title_messages(keyword):
     prompt = f"""
 あなたはSEOとコンテンツマーケティングの専門家です。
 
@@ -34,27 +54,186 @@ WEBサイトのQ＆A記事コンテンツに使用する「記事タイトル」
 キーワード: {keyword}
 出力形式: 箇条書き
 """
+    return [
+        {"role": "system", "content": "あなたはSEOに強いプロのライターです。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_titles(output):
+    """
+    箇条書きのタイトル一覧を1行1タイトルのリストに整形
+    """
+    return [line.strip("-・●●0123456789. ").strip() for line in output.strip().split("\n") if line.strip()]
+
+
+def build_title_batch_messages(keywords):
+    keyword_lines = "\n".join(f"- {keyword}" for keyword in keywords)
+    prompt = f"""
+あなたはSEOとコンテンツマーケティングの専門家です。
+
+以下の各キーワードについて
+WEBサイトのQ＆A記事コンテンツに使用する「記事タイトル」を10個ずつ考えてください。
+
+記事タイトルには必ずそのキーワードを全て使ってください。
+キーワードの順番は入れ替えないでください。
+最後は「？」で締めてください。
+
+キーワード一覧:
+{keyword_lines}
+
+出力形式:
+キーワードごとに「### キーワード」の見出し行を書き、その下にタイトルを箇条書き
+"""
+    return [
+        {"role": "system", "content": "あなたはSEOに強いプロのライターです。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_title_batch(output, keywords):
+    """
+    一括生成の出力を {キーワード: [タイトル, ...]} に分解する。
+    見出しがキーワードと一致しない場合は出現順で対応づける。
+    """
+    by_key = {title_pool.normalize_keyword(keyword): keyword for keyword in keywords}
+    blocks = []
+    for line in output.strip().split("\n"):
+        if line.strip().startswith("#"):
+            heading = line.strip().lstrip("#").strip()
+            heading = heading.split(":", 1)[-1].split("：", 1)[-1].strip()
+            blocks.append([heading, []])
+        elif line.strip() and blocks:
+            blocks[-1][1].append(line)
+
+    result = {}
+    for i, (heading, lines) in enumerate(blocks):
+        keyword = by_key.get(title_pool.normalize_keyword(heading))
+        if keyword is None and i < len(keywords):
+            keyword = keywords[i]
+        if keyword is not None:
+            result.setdefault(keyword, []).extend(parse_titles("\n".join(lines)))
+    return result
+
+
+def _batch_max_tokens(keywords):
+    return min(4000, 400 * len(keywords))
+
+
+def _store_batch(genre, keywords, output):
+    added = 0
+    for keyword, titles in parse_title_batch(output, keywords).items():
+        added += title_pool.add_titles(keyword, titles, genre=genre)
+    return added
+
+
+def prefill_title_pool(genre, keywords, use_cache=True):
+    """
+    ジャンルのキーワード全件分のタイトルを1回の API 呼び出しでプールに補充する。
+    追加件数を返す。
+    """
+    if not keywords:
+        return 0
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "あなたはSEOに強いプロのライターです。"},
-                {"role": "user", "content": prompt}
-            ],
+        result = model_router.complete(
+            "title_batch",
+            build_title_batch_messages(keywords),
             temperature=0.7,
-            max_tokens=500  # ✅ タイトルは短く済むので変更なし
+            max_tokens=_batch_max_tokens(keywords),
+            use_cache=use_cache
         )
+        return _store_batch(genre, keywords, result["content"])
+
+    except Exception as e:
+        print("タイトル一括生成エラー:", e)
+        return 0
 
-        output = response.choices[0].message.content
-        lines = [line.strip("-・●●0123456789. ").strip() for line in output.strip().split("\n") if line.strip()]
-        return lines[0] if lines else f"{keyword} に関するQ&A記事"
+
+async def aprefill_title_pool(genre, keywords, use_cache=True):
+    """
+    prefill_title_pool の非同期版
+    """
+    if not keywords:
+        return 0
+    try:
+        result = await model_router.acomplete(
+            "title_batch",
+            build_title_batch_messages(keywords),
+            temperature=0.7,
+            max_tokens=_batch_max_tokens(keywords),
+            use_cache=use_cache
+        )
+        return _store_batch(genre, keywords, result["content"])
+
+    except Exception as e:
+        print("タイトル一括生成エラー:", e)
+        return 0
+
+
+def _take_pooled_title(keyword, genre=None):
+    try:
+        return title_pool.take_title(keyword, genre=genre)
+    except Exception as e:
+        print("タイトルプール取得エラー:", e)
+        return None
+
+
+def _pool_titles(keyword, lines, genre=None):
+    """
+    生成した10タイトルをジャンルのプールに入れ、1件取り出す（プールが使えなければ先頭を使う）
+    """
+    try:
+        title_pool.add_titles(keyword, lines, genre=genre)
+    except Exception as e:
+        print("タイトルプール保存エラー:", e)
+    return _take_pooled_title(keyword, genre) or (lines[0] if lines else f"{keyword} に関するQ&A記事")
+
+
+def generate_title_from_keyword(keyword, use_cache=True, genre=None):
+    """
+    ジャンルのプールに未使用タイトルがあればそれを使い、なければ10個生成してプールに保存する
+    """
+    pooled = _take_pooled_title(keyword, genre)
+    if pooled:
+        return pooled
+
+    try:
+        result = model_router.complete(
+            "title",
+            build_title_messages(keyword),
+            temperature=0.7,
+            use_cache=use_cache
+        )
+        return _pool_titles(keyword, parse_titles(result["content"]), genre)
 
     except Exception as e:
         print("タイトル生成エラー:", e)
         return f"{keyword} に関するQ&A記事"
 
 
-def generate_article_body(title):
+async def agenerate_title_from_keyword(keyword, use_cache=True, genre=None):
+    """
+    generate_title_from_keyword の非同期版
+    """
+    pooled = _take_pooled_title(keyword, genre)
+    if pooled:
+        return pooled
+
+    try:
+        result = await model_router.acomplete(
+            "title",
+            build_title_messages(keyword),
+            temperature=0.7,
+            use_cache=use_cache
+        )
+        return _pool_titles(keyword, parse_titles(result["content"]), genre)
+
+    except Exception as e:
+        print("タイトル生成エラー:", e)
+        return f"{keyword} に関するQ&A記事"
+
+
+def build_body_messages(title):
     prompt = f"""
 あなたはSEOとコンテンツマーケティングの専門家です。
 
@@ -69,104 +248,584 @@ def generate_article_body(title):
 ・Q＆A記事のタイトルについて悩んでいる人が知りたい事を書いてください。
 ・見出し（hタグ）を付けてわかりやすく書いてください
 ・記事の文字数は必ず2000文字程度でまとめてください
-・1行の長さは30文字前後にして接続詞などで改行してください。
-・「文章の島」は1行から3行以内にして、文章の島同士は2行空けてください
-・親友に向けて話すように書いてください（ただし敬語を使ってください）
-・読み手のことは「皆さん」ではなく必ず「あなた」と書いてください。
+{BODY_STYLE_RULES}
+"""
+    return [
+        {"role": "system", "content": "あなたはSEOに強いプロの日本語ライターです。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_resume_messages(title, partial):
+    """
+    途中で途切れた本文の続きを書かせるメッセージ
+    """
+    return build_body_messages(title) + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": "回答が途中で途切れました。直前の文章の続きから書いてください。すでに書いた部分は繰り返さないでください。"}
+    ]
+
+
+def build_outline_messages(title):
+    prompt = f"""
+あなたはSEOとコンテンツマーケティングの専門家です。
+
+入力された「Q＆A記事のタイトル」に対する回答記事の見出し（h2）を考えてください。
+
+タイトル: 「{title}」
+
+###条件###
+
+・見出しは{BODY_SECTIONS_MIN}〜{BODY_SECTIONS_MAX}個にしてください
+・問題提起、共感、問題解決策の順に構成し、最後の見出しはまとめにしてください
+・Q＆A記事のタイトルについて悩んでいる人が知りたい事を見出しにしてください
+・見出しだけを1行に1つずつ書いてください（説明は不要です）
+"""
+    return [
+        {"role": "system", "content": "あなたはSEOに強いプロの日本語ライターです。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_outline(output):
+    """
+    見出し構成を見出しのリストにする（2つ未満なら None。多すぎる分は切り捨てる）
+    """
+    headings = []
+    for line in output.strip().split("\n"):
+        heading = re.sub(r"</?h\d>", "", line).strip("#-・●0123456789.)）　 ").strip()
+        if heading:
+            headings.append(heading)
+    return headings[:BODY_SECTIONS_MAX] if len(headings) >= 2 else None
+
+
+def build_section_messages(title, headings, index):
+    outline = "\n".join(
+        f"{i + 1}. {heading}" + ("（担当）" if i == index else "") for i, heading in enumerate(headings)
+    )
+    if index == 0:
+        position = "・記事の書き出しなので、読み手の悩みに共感する導入から始めてください"
+    elif index == len(headings) - 1:
+        position = "・記事の最後の見出しなので、記事全体のまとめで締めくくってください"
+    else:
+        position = "・前後の見出しとつながるように書き、導入のあいさつや記事全体のまとめは書かないでください"
+    prompt = f"""
+あなたはSEOとコンテンツマーケティングの専門家です。
+
+入力された「Q＆A記事のタイトル」に対する回答記事を、下の見出し構成で分担して書いています。
+あなたの担当は「{headings[index]}」の見出しの本文です。
+
+タイトル: 「{title}」
+
+見出し構成:
+{outline}
+
+###条件###
+
+・担当の見出しの本文だけを書いてください（見出し行や、他の見出しの内容は書かないでください）
+・文字数は{BODY_TARGET_CHARS // len(headings)}文字程度でまとめてください
+{position}
+{BODY_STYLE_RULES}
 """
+    return [
+        {"role": "system", "content": "あなたはSEOに強いプロの日本語ライターです。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _strip_heading(text, heading):
+    """
+    指示に反して本文の先頭に書かれた見出し行を取り除く
+    """
+    lines = text.strip().split("\n")
+    while lines and (lines[0].lstrip().startswith(("#", "<h")) or lines[0].strip() == heading):
+        lines.pop(0)
+    return "\n".join(lines).strip()
+
+
+def stitch_sections(headings, texts):
+    """
+    見出しと本文を構成の順に h2 で連結する（文章の島と同じく2行空ける）
+    """
+    return "\n\n\n".join(
+        f"<h2>{heading}</h2>\n\n{_strip_heading(text, heading)}" for heading, text in zip(headings, texts)
+    )
+
+
+def _sections_result(outline, headings, sections):
+    """
+    見出し構成と各見出しの結果を、通常の本文生成と同じ形の dict にまとめる
+    （モデルが混在するので、コストは呼び出しごとに見積もった合計を cost_usd に入れる）
+    """
+    results = [outline] + sections
+    return {
+        "body": stitch_sections(headings, [section["content"] for section in sections]),
+        "input_tokens": sum(result["input_tokens"] for result in results),
+        "output_tokens": sum(result["output_tokens"] for result in results),
+        "model": sections[0]["model"],
+        "cost_usd": _usage_cost(results),
+        "sections": len(headings)
+    }
+
+
+def _usage_cost(results):
+    return sum(
+        model_router.estimate_cost(result["model"], result["input_tokens"], result["output_tokens"])
+        for result in results
+    )
+
+
+def _add_spent(result, spent):
+    """
+    見出しごとの生成をあきらめて通常の生成に切り替えた場合に、
+    それまでに終わった呼び出し（見出し構成など）のトークン数とコストを結果に足す
+    """
+    if not spent:
+        return result
+    cost = result.get("cost_usd")
+    if cost is None:
+        cost = model_router.estimate_cost(
+            result.get("model", model_router.route("body")["models"][0]),
+            result["input_tokens"], result["output_tokens"]
+        )
+    return {
+        **result,
+        "input_tokens": result["input_tokens"] + sum(call["input_tokens"] for call in spent),
+        "output_tokens": result["output_tokens"] + sum(call["output_tokens"] for call in spent),
+        "cost_usd": cost + _usage_cost(spent)
+    }
+
+
+def _generate_article_body_sections(title, use_cache, spent):
+    """
+    終わった呼び出しの結果は spent に追加する（途中で失敗しても使った分を数えられるように）
+    """
+    with metrics.timed("outline"):
+        outline = model_router.complete("outline", build_outline_messages(title), temperature=0.7, use_cache=use_cache)
+    spent.append(outline)
+    headings = parse_outline(outline["content"])
+    if not headings:
+        return None
+
+    def section(index):
+        result = model_router.complete(
+            "section", build_section_messages(title, headings, index), temperature=0.7, use_cache=use_cache
+        )
+        spent.append(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=len(headings)) as pool:
+        sections = list(pool.map(section, range(len(headings))))
+    return _sections_result(outline, headings, sections)
+
+
+async def _agenerate_article_body_sections(title, use_cache, spent):
+    with metrics.timed("outline"):
+        outline = await model_router.acomplete(
+            "outline", build_outline_messages(title), temperature=0.7, use_cache=use_cache
+        )
+    spent.append(outline)
+    headings = parse_outline(outline["content"])
+    if not headings:
+        return None
+
+    async def section(index):
+        result = await model_router.acomplete(
+            "section", build_section_messages(title, headings, index), temperature=0.7, use_cache=use_cache
+        )
+        spent.append(result)
+        return result
+
+    sections = await asyncio.gather(*[section(index) for index in range(len(headings))])
+    return _sections_result(outline, headings, list(sections))
+
+
+def _save_sections_body(article_id, title, result):
+    if article_id:
+        body = result["body"]
+        save_article_fields(article_id, content=body, preview_html=f"<h2>{title}</h2><p>{body[:300]}...</p>")
+    print(f"🧩 本文を{result['sections']}つの見出しに分けて生成しました（{title}）")
+    return result
+
+
+def _body_failed():
+    # complete=False で返し、呼び出し側で失敗扱いにする（途中まで保存した本文は残す）
+    return {
+        "body": "本文生成に失敗しました。",
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "complete": False
+    }
+
+
+def save_article_fields(article_id, **values):
+    """
+    生成途中の値を Article に直接書き込む（投稿ログで進捗が見えるように）
+    """
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "あなたはSEOに強いプロの日本語ライターです。"},
-                {"role": "user", "content": prompt}
-            ],
+        with metrics.timed("db_commit"):
+            db.session.execute(db.update(Article).where(Article.id == article_id).values(**values))
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print("記事の途中保存エラー:", e)
+
+
+class BodyStreamWriter:
+    """
+    ストリーミングで届いた本文をため、一定間隔ごとに Article へ書き込む
+    """
+
+    def __init__(self, article_id, title, prefix="", interval=BODY_STREAM_FLUSH_SEC):
+        self.article_id = article_id
+        self.title = title
+        self.parts = [prefix] if prefix else []
+        self.interval = interval
+        self._last_flush = time.monotonic()
+        self._last_progress = self._last_flush
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def write(self, delta):
+        self.parts.append(delta)
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self.article_id:
+            return
+        text = self.text
+        save_article_fields(
+            self.article_id,
+            content=text,
+            preview_html=f"<h2>{self.title}</h2><p>{text[:300]}...</p>"
+        )
+        if self._last_flush - self._last_progress >= BODY_PROGRESS_LOG_SEC:
+            self._last_progress = self._last_flush
+            log_article_progress(step=f"本文生成中（{len(text)}文字）", article_id=self.article_id)
+
+
+def _stream_request(title, partial, use_cache):
+    if partial:
+        # 続きの生成はキャッシュしない（途中までの本文ごとに内容が変わるため）
+        return {
+            "messages": build_resume_messages(title, partial),
+            # 書き終えた分のトークン数を上限から差し引く（文字数はトークン数に換算する）
+            "max_tokens": max(200, BODY_MAX_TOKENS - estimate_text_tokens(partial)),
+            "use_cache": False
+        }
+    return {"messages": build_body_messages(title), "max_tokens": BODY_MAX_TOKENS, "use_cache": use_cache}
+
+
+def _stream_body_result(writer, totals, ttft, complete, model):
+    writer.flush()
+    if ttft is not None:
+        print(f"⚡ 本文の最初のトークンまで {ttft:.2f} 秒（{writer.title}）")
+    body = writer.text
+    return {
+        "body": body.strip() if complete else body,
+        "input_tokens": totals[0],
+        "output_tokens": totals[1],
+        "ttft_sec": ttft,
+        "complete": complete,
+        "model": model
+    }
+
+
+def _generate_article_body_stream(title, article_id, resume_from, use_cache):
+    writer = BodyStreamWriter(article_id, title, prefix=resume_from or "")
+    totals, ttft, complete, model = [0, 0], None, False, None
+
+    for attempt in range(BODY_STREAM_MAX_RESUMES + 1):
+        result = model_router.stream(
+            "body",
             temperature=0.7,
-            max_tokens=2000  # ✅ コスト削減＆タイムアウト対策
+            on_text=writer.write,
+            timeout=BODY_STREAM_TIMEOUT,
+            **_stream_request(title, writer.text, use_cache)
         )
+        totals[0] += result["input_tokens"]
+        totals[1] += result["output_tokens"]
+        ttft = ttft if ttft is not None else result["ttft_sec"]
+        model = model or result["model"]
+        complete = result["complete"]
+        if complete:
+            break
+        print(f"⚠️ 本文ストリームが途中で切れました（{result['error']}）。続きから再開します")
+        writer.flush()
+
+    return _stream_body_result(writer, totals, ttft, complete, model)
+
+
+async def _agenerate_article_body_stream(title, article_id, resume_from, use_cache):
+    writer = BodyStreamWriter(article_id, title, prefix=resume_from or "")
+    totals, ttft, complete, model = [0, 0], None, False, None
+
+    for attempt in range(BODY_STREAM_MAX_RESUMES + 1):
+        result = await model_router.astream(
+            "body",
+            temperature=0.7,
+            on_text=writer.write,
+            timeout=BODY_STREAM_TIMEOUT,
+            **_stream_request(title, writer.text, use_cache)
+        )
+        totals[0] += result["input_tokens"]
+        totals[1] += result["output_tokens"]
+        ttft = ttft if ttft is not None else result["ttft_sec"]
+        model = model or result["model"]
+        complete = result["complete"]
+        if complete:
+            break
+        print(f"⚠️ 本文ストリームが途中で切れました（{result['error']}）。続きから再開します")
+        writer.flush()
+
+    return _stream_body_result(writer, totals, ttft, complete, model)
+
+
+def generate_article_body(title, use_cache=True, stream=False, article_id=None, resume_from=None, sections=None):
+    """
+    stream=True の場合は本文を受信しながら article_id の Article に一定間隔で保存し、
+    途中で切れても resume_from（保存済みの途中本文）から続きを生成できる。
+    戻り値には ttft_sec / complete が加わる。
+    sections=True（省略時は BODY_SECTIONS）の場合は見出し構成を作ってから見出しごとに並行生成する
+    （続きからの生成以外では stream より優先。失敗したら通常の生成に切り替える）。
+    """
+    sections = BODY_SECTIONS if sections is None else sections
+    spent = []
+    if sections and not resume_from:
+        try:
+            result = _generate_article_body_sections(title, use_cache, spent)
+            if result:
+                return _save_sections_body(article_id, title, result)
+            print("⚠️ 見出し構成を読み取れないため、通常の本文生成に切り替えます")
+        except Exception as e:
+            print("⚠️ 見出しごとの本文生成エラー（通常の本文生成に切り替えます）:", e)
 
-        usage = response.usage
-        content = response.choices[0].message.content.strip()
+    return _add_spent(_generate_article_body_single(title, use_cache, stream, article_id, resume_from), spent)
+
+
+def _generate_article_body_single(title, use_cache, stream, article_id, resume_from):
+    try:
+        if stream:
+            return _generate_article_body_stream(title, article_id, resume_from, use_cache)
+
+        result = model_router.complete(
+            "body",
+            build_body_messages(title),
+            temperature=0.7,
+            use_cache=use_cache
+        )
 
         return {
-            "body": content,
-            "input_tokens": usage.prompt_tokens,
-            "output_tokens": usage.completion_tokens
+            "body": result["content"],
+            "input_tokens": result["input_tokens"],
+            "output_tokens": result["output_tokens"],
+            "model": result["model"]
         }
 
     except Exception as e:
         print("本文生成エラー:", e)
+        return _body_failed()
+
+
+async def agenerate_article_body(title, use_cache=True, stream=False, article_id=None, resume_from=None,
+                                 sections=None):
+    """
+    generate_article_body の非同期版
+    """
+    sections = BODY_SECTIONS if sections is None else sections
+    spent = []
+    if sections and not resume_from:
+        try:
+            result = await _agenerate_article_body_sections(title, use_cache, spent)
+            if result:
+                return _save_sections_body(article_id, title, result)
+            print("⚠️ 見出し構成を読み取れないため、通常の本文生成に切り替えます")
+        except Exception as e:
+            print("⚠️ 見出しごとの本文生成エラー（通常の本文生成に切り替えます）:", e)
+
+    return _add_spent(
+        await _agenerate_article_body_single(title, use_cache, stream, article_id, resume_from), spent
+    )
+
+
+async def _agenerate_article_body_single(title, use_cache, stream, article_id, resume_from):
+    try:
+        if stream:
+            return await _agenerate_article_body_stream(title, article_id, resume_from, use_cache)
+
+        result = await model_router.acomplete(
+            "body",
+            build_body_messages(title),
+            temperature=0.7,
+            use_cache=use_cache
+        )
+
         return {
-            "body": "本文生成に失敗しました。",
-            "input_tokens": 0,
-            "output_tokens": 0
+            "body": result["content"],
+            "input_tokens": result["input_tokens"],
+            "output_tokens": result["output_tokens"],
+            "model": result["model"]
         }
 
+    except Exception as e:
+        print("本文生成エラー:", e)
+        return _body_failed()
 
-def get_pixabay_images(keyword, num_images=2):
-    url = "https://pixabay.com/api/"
-    params = {
-        "key": PIXABAY_API_KEY,
-        "q": keyword,
-        "image_type": "photo",
-        "orientation": "horizontal",
-        "per_page": num_images,
-        "safesearch": "true",
-        "lang": "ja"
-    }
 
+def resume_article_body(article_id):
+    """
+    途中で止まった Article の本文を、保存済みの部分から続けて生成する
+    """
+    article = db.session.get(Article, article_id)
+    partial = article.content if article.content != BODY_PLACEHOLDER else ""
+    return generate_article_body(article.title, stream=True, article_id=article_id, resume_from=partial)
+
+
+async def aresume_article_body(article_id):
+    """
+    resume_article_body の非同期版
+    """
+    article = db.session.get(Article, article_id)
+    partial = article.content if article.content != BODY_PLACEHOLDER else ""
+    return await agenerate_article_body(article.title, stream=True, article_id=article_id, resume_from=partial)
+
+
+def get_pixabay_images(keyword, num_images=2):
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        hits = data.get("hits", [])
-        return [hit["webformatURL"] for hit in hits][:num_images]
+        return pixabay.search_images(keyword, per_page=num_images)[:num_images]
 
     except Exception as e:
         print("Pixabay画像取得エラー:", e)
         return []
 
 
-def generate_article(keyword, genre=None, user_id=None, site_id=None):
+def get_article_images(keyword, genre=None, num_images=2):
     """
-    キーワードから記事一式を生成（タイトル＋本文＋画像＋ログ記録＋インターバル付き）
+    ジャンルの画像プールから重複しない画像を取り出し、足りなければキーワードで検索する
     """
-    time.sleep(3)  # インターバル①：キーワードごとに待機
+    images = pixabay.get_genre_pool(genre).take(num_images) if genre else []
+    if len(images) < num_images:
+        images += [url for url in get_pixabay_images(keyword, num_images) if url not in images]
+    return images[:num_images]
 
-    title = generate_title_from_keyword(keyword)
-    time.sleep(3)  # インターバル②：タイトル生成後に待機
 
-    article_data = generate_article_body(title)
+def assemble_article(keyword, title, article_data, images):
+    """
+    タイトル・本文・画像から記事データ（プレビュー・コスト付き）を組み立てる
+    """
     content = article_data["body"]
     input_tokens = article_data["input_tokens"]
     output_tokens = article_data["output_tokens"]
-    gpt_cost = input_tokens * GPT4_INPUT_COST + output_tokens * GPT4_OUTPUT_COST
+    gpt_cost = article_data.get("cost_usd")
+    if gpt_cost is None:
+        gpt_cost = model_router.estimate_cost(
+            article_data.get("model", model_router.route("body")["models"][0]), input_tokens, output_tokens
+        )
+    metrics.generation_cost.inc(gpt_cost)
 
-    images = get_pixabay_images(keyword)
     featured_image = images[0] if len(images) > 0 else ""
     content_image = images[1] if len(images) > 1 else ""
 
     # ✅ プレビューHTML作成
     preview_html = f"<h2>{title}</h2>\n<img src='{featured_image}' style='max-width:100%;'>\n<p>{content[:300]}...</p>"
 
-    # ✅ ログ記録
-    log_article_progress(
-        step="記事生成完了",
-        genre=genre,
-        keyword=keyword,
-        title=title,
-        preview_html=preview_html,
-        gpt_tokens=input_tokens + output_tokens,
-        gpt_cost_usd=gpt_cost,
-        user_id=user_id,
-        site_id=site_id
-    )
-
     return {
         "title": title,
         "content": content,
         "image_keyword": keyword,
         "featured_image_url": featured_image,
         "content_image_url": content_image,
+        "preview_html": preview_html,
+        "body_complete": article_data.get("complete", True),
+        "ttft_sec": article_data.get("ttft_sec"),
         "gpt_tokens": input_tokens + output_tokens,
         "gpt_cost_usd": gpt_cost
     }
+
+
+def generate_article(keyword, genre=None, user_id=None, site_id=None, use_cache=True):
+    """
+    キーワードから記事一式を生成（タイトル＋本文＋画像＋ログ記録）。
+    API の流量は utils.rate_limiter の共有リミッターで制御する。
+    """
+    # 画像はキーワードだけで決まるので、タイトル・本文の生成と並行して取得する
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        images_future = pool.submit(_get_article_images_timed, keyword, genre)
+        with metrics.timed("title"):
+            title = generate_title_from_keyword(keyword, use_cache=use_cache, genre=genre)
+        with metrics.timed("body"):
+            article_data = generate_article_body(title, use_cache=use_cache)
+        images = images_future.result()
+    result = assemble_article(keyword, title, article_data, images)
+
+    # ✅ ログ記録
+    log_article_progress(
+        step="記事生成完了",
+        genre=genre,
+        keyword=keyword,
+        title=title,
+        preview_html=result["preview_html"],
+        tokens=result["gpt_tokens"],
+        cost_usd=result["gpt_cost_usd"],
+        site_id=site_id
+    )
+
+    return result
+
+
+def _get_article_images_timed(keyword, genre):
+    with metrics.timed("images"):
+        return get_article_images(keyword, genre)
+
+
+async def agenerate_article(keyword, use_cache=True, article_id=None, stream=False, genre=None, resume=False,
+                            body_slot=None):
+    """
+    generate_article の非同期版（タイトル→本文。画像はその間に並行して取得）。
+    article_id を渡すとタイトル・本文を生成途中から Article に書き込む。
+    resume=True の場合は Article に保存済みのタイトル・本文の続きから生成する。
+    body_slot（async with で使う枠）を渡すと本文の生成だけをその枠の中で行うので、
+    枠を待つ間に他の記事のタイトル・画像を先に進められる。
+    ログ記録は保存先の Article が分かる呼び出し側で行う。
+    """
+    images_task = asyncio.create_task(asyncio.to_thread(_get_article_images_timed, keyword, genre))
+    try:
+        title, article_data = await _agenerate_article_text(
+            keyword, genre, use_cache, article_id, stream, resume, body_slot
+        )
+        images = await images_task
+    finally:
+        images_task.cancel()
+
+    if article_id:
+        log_article_progress(step=f"画像取得完了（{len(images)}枚）", article_id=article_id)
+    return assemble_article(keyword, title, article_data, images)
+
+
+async def _agenerate_article_text(keyword, genre, use_cache, article_id, stream, resume, body_slot):
+    title, resume_from = None, None
+    if resume and article_id:
+        article = db.session.get(Article, article_id)
+        if article.title != TITLE_PLACEHOLDER:
+            title = article.title
+        if title and article.content != BODY_PLACEHOLDER:
+            resume_from = article.content
+            stream = True  # 続きからの生成はストリーミングのみ対応
+
+    if title is None:
+        with metrics.timed("title"):
+            title = await agenerate_title_from_keyword(keyword, use_cache=use_cache, genre=genre)
+        if article_id:
+            save_article_fields(article_id, title=title)
+            log_article_progress(step="タイトル生成完了", article_id=article_id, title=title)
+
+    async with body_slot or contextlib.nullcontext():
+        with metrics.timed("body"):
+            article_data = await agenerate_article_body(
+                title, use_cache=use_cache, stream=stream, article_id=article_id, resume_from=resume_from
+            )
+    return title, article_data
@@ -0,0 +1,288 @@
+# batch_article_generator.py
+
+import argparse
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+
+from article_generator import (
+    build_title_messages, build_body_messages, parse_titles,
+    get_article_images, assemble_article, BODY_PLACEHOLDER, TITLE_PLACEHOLDER
+)
+from keywords import build_keyword_messages, parse_keywords
+from models import db, Article, GenerationJob
+from utils import generation_jobs, model_router, title_pool
+from utils.keyword_index import filter_new_keywords
+from utils.logger import log_article_progress
+from utils.openai_client import build_batch_request, submit_chat_batch, wait_for_batch, iter_batch_results
+
+# Batch API は通常料金の半額
+BATCH_COST_RATE = 0.5
+# 結果を DB に反映するときのコミット単位
+COMMIT_EVERY = 50
+
+
+def _run_batch(requests, stage):
+    """
+    リクエストを1つの Batch として投入し、完了まで待って結果を返す
+    """
+    if not requests:
+        return []
+    batch = wait_for_batch(submit_chat_batch(requests, metadata={"stage": stage}))
+    if batch.status != "completed":
+        print(f"⚠️ Batch {batch.id}（{stage}）が {batch.status} で終了しました")
+    return iter_batch_results(batch)
+
+
+def _batch_model(stage):
+    """
+    ステージのルートの先頭モデル（Batch は結果を待つだけなのでフォールバックしない）
+    """
+    return model_router.route(stage)["models"][0]
+
+
+def _batch_request(custom_id, stage, messages):
+    return build_batch_request(
+        custom_id, messages, model=_batch_model(stage), max_tokens=model_router.route(stage)["max_tokens"]
+    )
+
+
+def _batch_cost(stage, result):
+    """
+    Batch の料金（通常料金の BATCH_COST_RATE 倍）をステージのモデルの単価で計算する
+    """
+    cost = model_router.estimate_cost(_batch_model(stage), result["input_tokens"], result["output_tokens"])
+    return cost * BATCH_COST_RATE
+
+
+@contextmanager
+def _job_heartbeat(job_ids):
+    """
+    Batch の完了を待つ間（最長24時間）、ジョブのハートビートを更新し続ける。
+    プロセスが落ちて途切れたら、generation_worker が run_job で続きから引き取る。
+    """
+    app = current_app._get_current_object()
+    stopping = threading.Event()
+
+    def _beat():
+        while not stopping.wait(generation_jobs.JOB_LEASE_SEC / 3):
+            with app.app_context():
+                try:
+                    generation_jobs.heartbeat(job_ids)
+                except Exception as e:
+                    print("⚠️ ハートビート更新エラー:", e)
+
+    thread = threading.Thread(target=_beat, name="batch-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopping.set()
+        thread.join()
+
+
+def _start_jobs(jobs):
+    """
+    ジャンルごとに実行中のジョブを登録する（作った記事は job_id で引き取れるようにする）
+    """
+    for job in jobs:
+        job["job_id"] = generation_jobs.start_job(job["genre"], job["site_id"], job["user_id"], step="batch")
+
+
+def _generate_keywords(jobs):
+    requests = [
+        _batch_request(f"keywords-{i}", "keywords", build_keyword_messages(job["genre"]))
+        for i, job in enumerate(jobs) if not job.get("keywords")
+    ]
+    for custom_id, result, error in _run_batch(requests, "keywords"):
+        job = jobs[int(custom_id.split("-", 1)[1])]
+        if result:
+            job["keywords"] = parse_keywords(job["genre"], result["content"])
+        else:
+            print(f"❌ キーワード生成失敗（{job['genre']}）:", error)
+
+    # サイトの既存記事と近似重複するキーワードは生成しない
+    for job in jobs:
+        job["keywords"], skipped = filter_new_keywords(job["site_id"], job.get("keywords") or [])
+        for keyword, similar, similarity in skipped:
+            print(f"⏭ 重複キーワードをスキップ: {keyword}（既存: {similar}, 類似度 {similarity:.2f}）")
+        # 引き取ったワーカーがキーワードを作り直さないよう保存しておく
+        db.session.execute(
+            db.update(GenerationJob)
+            .where(GenerationJob.id == job["job_id"])
+            .values(keywords=json.dumps(job["keywords"], ensure_ascii=False))
+        )
+    db.session.commit()
+
+
+def _create_placeholders(jobs):
+    articles = []
+    for job in jobs:
+        for keyword in job.get("keywords") or []:
+            articles.append(Article(
+                site_id=job["site_id"],
+                user_id=job["user_id"],
+                keyword=keyword,
+                title=TITLE_PLACEHOLDER,
+                content=BODY_PLACEHOLDER,
+                featured_image_url="",
+                status="generating",
+                created_at=datetime.utcnow(),
+                genre=job["genre"],
+                job_id=job["job_id"]
+            ))
+    db.session.add_all(articles)
+    db.session.commit()
+    return {article.id: article for article in articles}
+
+
+def _assign_titles(articles, usage):
+    # プールに在庫があるキーワードは API を呼ばない
+    requests = []
+    for article in articles.values():
+        title = title_pool.take_title(article.keyword, genre=article.genre)
+        if title:
+            article.title = title
+        else:
+            requests.append(_batch_request(f"title-{article.id}", "title", build_title_messages(article.keyword)))
+    db.session.commit()
+
+    for custom_id, result, error in _run_batch(requests, "titles"):
+        article = articles[int(custom_id.split("-", 1)[1])]
+        lines = parse_titles(result["content"]) if result else []
+        if result:
+            usage[article.id] = [result["input_tokens"], result["output_tokens"], _batch_cost("title", result)]
+            title_pool.add_titles(article.keyword, lines, genre=article.genre)
+        else:
+            print(f"❌ タイトル生成失敗（{article.keyword}）:", error)
+        article.title = (
+            title_pool.take_title(article.keyword, genre=article.genre)
+            or (lines[0] if lines else f"{article.keyword} に関するQ&A記事")
+        )
+    db.session.commit()
+
+
+def _fail_untitled(articles):
+    """
+    Batch が期限切れ・失敗・キャンセルで終わったり結果が欠けたりして、
+    タイトルが付かなかった記事は失敗にする（仮タイトルのまま本文を書いて投稿しない）
+    """
+    failed = 0
+    for article in articles.values():
+        if article.title == TITLE_PLACEHOLDER:
+            print(f"❌ タイトルが生成されなかったため失敗にします（{article.keyword}）")
+            article.status = "failed"
+            failed += 1
+    db.session.commit()
+    return failed
+
+
+def _write_bodies(articles, usage):
+    requests = [
+        _batch_request(f"body-{article.id}", "body", build_body_messages(article.title))
+        for article in articles.values() if article.status == "generating"
+    ]
+
+    done = []
+    for i, (custom_id, result, error) in enumerate(_run_batch(requests, "bodies"), start=1):
+        article = articles[int(custom_id.split("-", 1)[1])]
+        if not result:
+            print(f"❌ 本文生成失敗（{article.keyword}）:", error)
+            article.status = "failed"
+            continue
+
+        # タイトルと本文はモデルが違うので、コストはそれぞれの単価で計算して足す
+        title_input, title_output, title_cost = usage.get(article.id, [0, 0, 0.0])
+        article_data = assemble_article(article.keyword, article.title, {
+            "body": result["content"],
+            "input_tokens": result["input_tokens"] + title_input,
+            "output_tokens": result["output_tokens"] + title_output,
+            "cost_usd": _batch_cost("body", result) + title_cost
+        }, get_article_images(article.keyword, article.genre))
+
+        article.content = article_data["content"]
+        article.featured_image_url = article_data["featured_image_url"]
+        article.preview_html = article_data["preview_html"]
+        article.gpt_tokens = article_data["gpt_tokens"]
+        article.gpt_cost_usd = article_data["gpt_cost_usd"]
+        article.status = "pending"
+        done.append(article)
+
+        if i % COMMIT_EVERY == 0:
+            db.session.commit()
+    db.session.commit()
+
+    for article in done:
+        log_article_progress(
+            step="記事生成完了（Batch）",
+            article_id=article.id,
+            genre=article.genre,
+            keyword=article.keyword,
+            title=article.title,
+            preview_html=article.preview_html,
+            tokens=article.gpt_tokens,
+            cost_usd=article.gpt_cost_usd
+        )
+    return done
+
+
+def generate_articles_in_batch(jobs):
+    """
+    OpenAI Batch API で複数ジャンル分の記事をまとめて生成する（夜間の一括生成用）。
+    jobs は {"genre", "site_id", "user_id", "keywords"(省略可)} のリスト。
+    キーワード → タイトル → 本文の順に Batch を投入し、結果を Article に反映する。
+    ジャンルごとに GenerationJob を登録して記事に job_id を付けるので、
+    Batch の待ち中にプロセスが落ちても generation_worker が続きから引き取る。
+    """
+    jobs = [dict(job) for job in jobs]
+    started = datetime.utcnow()
+
+    _start_jobs(jobs)
+    job_ids = [job["job_id"] for job in jobs]
+    with _job_heartbeat(job_ids):
+        _generate_keywords(jobs)
+        articles = _create_placeholders(jobs)
+        print(f"🗂 {len(articles)} 記事分の Batch 生成を開始します")
+
+        usage = {}
+        _assign_titles(articles, usage)
+        _fail_untitled(articles)
+        done = _write_bodies(articles, usage)
+
+        # 結果が返らなかった記事は失敗扱い
+        for article in articles.values():
+            if article.status == "generating":
+                article.status = "failed"
+        db.session.commit()
+
+    for job_id in job_ids:
+        if not generation_jobs.finish_job(job_id):
+            print(f"⚠️ ジョブ {job_id} は他のワーカーに引き取られていたため完了にしませんでした")
+
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    print(f"🎉 Batch 生成完了: {len(done)} / {len(articles)} 記事（{elapsed:.0f} 秒）")
+    return {
+        "article_ids": [article.id for article in done],
+        "failed": len(articles) - len(done),
+        "elapsed_sec": elapsed
+    }
+
+
+if __name__ == "__main__":
+    from app_init import create_app
+
+    parser = argparse.ArgumentParser(description="Batch API で記事を一括生成")
+    parser.add_argument("--genre", required=True, action="append")
+    parser.add_argument("--site-id", required=True, type=int)
+    parser.add_argument("--user-id", required=True, type=int)
+    args = parser.parse_args()
+
+    app = create_app(with_scheduler=False)
+    with app.app_context():
+        generate_articles_in_batch([
+            {"genre": genre, "site_id": args.site_id, "user_id": args.user_id}
+            for genre in args.genre
+        ])
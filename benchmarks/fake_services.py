@@ -0,0 +1,418 @@
+# benchmarks/fake_services.py
+"""
+ベンチマーク用のローカル代替サーバー（OpenAI / Pixabay / WordPress）。
+サービスごとにレイテンシ・エラー率・429（レート制限）の割合を指定できる。
+
+    openai = FakeOpenAI(Fault(latency=0.3, rate_limit_rate=0.05)).start()
+    os.environ["OPENAI_BASE_URL"] = openai.url + "/v1"
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+KEYWORD_WORDS = ["初心者", "おすすめ", "比較", "費用", "自宅", "効果", "期間", "注意点", "選び方", "コツ"]
+
+
+class Fault:
+    """
+    1リクエストごとの遅延（latency 秒 ± jitter）と、エラー（500）・429 を返す割合
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after_ms=200, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_ms = retry_after_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def pick(self):
+        """
+        このリクエストで返す障害（429 / 500 / None）
+        """
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def send(self, status, payload, content_type="application/json", headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        self._dispatch("GET", b"")
+
+    def do_POST(self):
+        self._dispatch("POST", self._read_body())
+
+    def _dispatch(self, method, body):
+        url = urlparse(self.path)
+        try:
+            self.service.handle(self, method, url.path, parse_qs(url.query), body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FakeService:
+    """
+    別スレッドで動く HTTP サーバー。calls にエンドポイントごとの呼び出し回数、
+    faults に返した障害（429 / 500）の回数を数える。
+    """
+
+    def __init__(self, fault=None):
+        self.fault = fault or Fault()
+        self.calls = Counter()
+        self.faults = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self.url = None
+
+    def start(self, port=0):
+        handler = type(f"{type(self).__name__}Handler", (_Handler,), {"service": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def inject_fault(self, handler, error_body):
+        """
+        遅延を入れたうえで、割合に応じて 429 / 500 を返す（返したら True）
+        """
+        self.fault.delay()
+        status = self.fault.pick()
+        if status is None:
+            return False
+        with self._lock:
+            self.faults[status] += 1
+        headers = {}
+        if status == 429:
+            headers = {
+                "retry-after-ms": str(self.fault.retry_after_ms),
+                "x-ratelimit-reset-requests": f"{self.fault.retry_after_ms}ms",
+            }
+        handler.send(status, error_body(status), headers=headers)
+        return True
+
+    def handle(self, handler, method, path, query, body):
+        raise NotImplementedError
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "faults": {str(k): v for k, v in self.faults.items()}}
+
+
+class FakeOpenAI(FakeService):
+    """
+    Chat Completions（通常・ストリーミング）と Batch API（files / batches）の代替。
+    本文は chars_per_sec の速さで少しずつストリーミングする。
+    """
+
+    def __init__(self, fault=None, body_chars=2000, chars_per_sec=4000, stream_chunk_chars=40, batch_polls=1):
+        super().__init__(fault)
+        self.body_chars = body_chars
+        self.chars_per_sec = chars_per_sec
+        self.stream_chunk_chars = stream_chunk_chars
+        self.batch_polls = batch_polls
+        self._files = {}
+        self._batches = {}
+
+    @staticmethod
+    def _error(status):
+        if status == 429:
+            return {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+        return {"error": {"message": "The server had an error", "type": "server_error", "code": None}}
+
+    def answer(self, messages):
+        """
+        プロンプトの種類（キーワード・タイトル・一括タイトル・見出し構成・見出しの本文・本文）に合わせた応答
+        """
+        prompt = messages[-1].get("content") or ""
+        if "ロングテール" in prompt:
+            match = re.search(r"ジャンル:\s*(.+)", prompt)
+            genre = match.group(1).strip() if match else "ジャンル"
+            return "\n".join(
+                f"{i + 1}. {genre} {uuid.uuid4().hex[:6]} {word}" for i, word in enumerate(KEYWORD_WORDS)
+            )
+        if "キーワード一覧:" in prompt:
+            keywords = re.findall(r"^- (.+)$", prompt.split("キーワード一覧:", 1)[1].split("出力形式", 1)[0], re.M)
+            return "\n".join(
+                f"### {keyword}\n" + "\n".join(f"- {keyword}のタイトル{i}？" for i in range(10))
+                for keyword in keywords
+            )
+        if "記事タイトル" in prompt:
+            match = re.search(r"キーワード:\s*(.+)", prompt)
+            keyword = match.group(1).strip() if match else "キーワード"
+            return "\n".join(f"- {keyword}のタイトル{i}？" for i in range(10))
+        if "見出し（h2）を考えてください" in prompt:
+            return "\n".join(f"{i + 1}. 見出し{i + 1}" for i in range(4))
+        match = re.search(r"文字数は(\d+)文字程度", prompt)
+        if match:
+            chars = int(match.group(1))
+            return ("見出しの本文です。\n" * (chars // 10 + 1))[:chars]
+        chars = self.body_chars // 3 if any(m.get("role") == "assistant" for m in messages) else self.body_chars
+        return ("本文のテスト文章です。\n" * (chars // 11 + 1))[:chars]
+
+    @staticmethod
+    def _usage(messages, text):
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(text),
+                "total_tokens": prompt_tokens + len(text)}
+
+    def _completion(self, model, messages):
+        text = self.answer(messages)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": self._usage(messages, text)
+        }
+
+    def _stream(self, handler, model, messages):
+        text = self.answer(messages)
+        handler.start_chunked("text/event-stream")
+        step = self.stream_chunk_chars
+        pause = step / self.chars_per_sec if self.chars_per_sec else 0
+
+        def event(payload):
+            handler.write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        base = {"id": "chatcmpl-stream", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for start in range(0, len(text), step):
+            event({**base, "choices": [{"index": 0, "delta": {"content": text[start:start + step]},
+                                        "finish_reason": None}]})
+            if pause:
+                time.sleep(pause)
+        event({**base, "choices": [], "usage": self._usage(messages, text)})
+        handler.write_chunk(b"data: [DONE]\n\n")
+        handler.write_chunk(b"")
+
+    def handle(self, handler, method, path, query, body):
+        if method == "POST" and path.endswith("/chat/completions"):
+            self.count("chat")
+            if self.inject_fault(handler, self._error):
+                return
+            request = json.loads(body)
+            if request.get("stream"):
+                self.count("chat_stream")
+                return self._stream(handler, request.get("model"), request["messages"])
+            completion = self._completion(request.get("model"), request["messages"])
+            if self.chars_per_sec:
+                # 通常の呼び出しは全文を生成し終えてから返る
+                time.sleep(completion["usage"]["completion_tokens"] / self.chars_per_sec)
+            return handler.send(200, completion, headers={
+                "x-ratelimit-remaining-requests": "10000", "x-ratelimit-remaining-tokens": "10000000"
+            })
+
+        if method == "POST" and path.endswith("/files"):
+            self.count("files")
+            return handler.send(200, self._upload(handler, body))
+        if method == "POST" and path.endswith("/batches"):
+            self.count("batches")
+            return handler.send(200, self._create_batch(json.loads(body)))
+        match = re.search(r"/batches/([^/]+)$", path)
+        if method == "GET" and match:
+            return handler.send(200, self._poll_batch(match.group(1)))
+        match = re.search(r"/files/([^/]+)/content$", path)
+        if method == "GET" and match:
+            return handler.send(200, self._files[match.group(1)], content_type="application/octet-stream")
+        handler.send(404, {"error": {"message": f"{method} {path} は未対応です"}})
+
+    def _upload(self, handler, body):
+        boundary = handler.headers["Content-Type"].split("boundary=", 1)[1].encode()
+        part = next(p for p in body.split(b"--" + boundary) if b"filename=" in p)
+        content = part.split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n", 1)[0]
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": "batch.jsonl", "purpose": "batch", "status": "processed"}
+
+    def _create_batch(self, request):
+        lines = []
+        for raw in self._files[request["input_file_id"]].decode("utf-8").splitlines():
+            item = json.loads(raw)
+            completion = self._completion(item["body"]["model"], item["body"]["messages"])
+            lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:8]}", "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "body": completion}, "error": None
+            }, ensure_ascii=False))
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._files[output_id] = ("\n".join(lines) + "\n").encode("utf-8")
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        self._batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"], "completion_window": "24h", "status": "in_progress",
+            "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+            "_output": output_id, "_polls": 0
+        }
+        return self._public(self._batches[batch_id])
+
+    def _poll_batch(self, batch_id):
+        batch = self._batches[batch_id]
+        batch["_polls"] += 1
+        if batch["_polls"] >= self.batch_polls:
+            batch.update(status="completed", output_file_id=batch["_output"])
+            batch["request_counts"]["completed"] = batch["request_counts"]["total"]
+        return self._public(batch)
+
+    @staticmethod
+    def _public(batch):
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+
+class FakePixabay(FakeService):
+    """
+    Pixabay 検索 API と画像配信の代替（画像は URL ごとに内容の異なる JPEG 風のバイト列）
+    """
+
+    def __init__(self, fault=None, total_hits=500, image_bytes=50_000):
+        super().__init__(fault)
+        self.total_hits = total_hits
+        self.image_bytes = image_bytes
+
+    @staticmethod
+    def _error(status):
+        return {"error": "rate limit" if status == 429 else "server error"}
+
+    def handle(self, handler, method, path, query, body):
+        if path.startswith("/img/"):
+            self.count("image")
+            digest = hashlib.sha256(path.encode("utf-8")).digest()
+            image = b"\xff\xd8\xff\xe0" + (digest * (self.image_bytes // len(digest) + 1))[:self.image_bytes]
+            return handler.send(200, image, content_type="image/jpeg")
+
+        self.count("search")
+        if self.inject_fault(handler, self._error):
+            return
+        per_page = int(query.get("per_page", ["20"])[0])
+        page = int(query.get("page", ["1"])[0])
+        keyword = query.get("q", [""])[0]
+        start = (page - 1) * per_page
+        token = hashlib.md5(keyword.encode("utf-8")).hexdigest()[:8]
+        hits = [{"webformatURL": f"{self.url}/img/{token}/{i}.jpg"}
+                for i in range(start, min(start + per_page, self.total_hits))]
+        handler.send(200, {"total": self.total_hits, "totalHits": self.total_hits, "hits": hits})
+
+
+class FakeWordPress(FakeService):
+    """
+    WordPress REST API（media / categories / tags / posts）の代替。
+    サイトは URL の先頭パス（例: {url}/site1）で区別する。
+    """
+
+    _PATH_RE = re.compile(r"^(?P<site>.*)/wp-json/wp/v2/(?P<resource>media|categories|tags|posts)$")
+
+    def __init__(self, fault=None):
+        super().__init__(fault)
+        self._sites = {}
+        self._next_id = 1
+
+    def _site(self, name):
+        with self._lock:
+            return self._sites.setdefault(name, {"categories": {}, "tags": {}, "media": 0, "posts": 0})
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    @staticmethod
+    def _error(status):
+        if status == 429:
+            return {"code": "rest_too_many_requests", "message": "Too many requests", "data": {"status": 429}}
+        return {"code": "internal_server_error", "message": "Server error", "data": {"status": 500}}
+
+    def handle(self, handler, method, path, query, body):
+        match = self._PATH_RE.match(path)
+        if not match:
+            return handler.send(404, {"code": "rest_no_route", "data": {"status": 404}})
+        resource = match.group("resource")
+        self.count(f"{method} {resource}")
+        if self.inject_fault(handler, self._error):
+            return
+        site = self._site(match.group("site"))
+
+        if resource in ("categories", "tags"):
+            terms = site[resource]
+            if method == "GET":
+                slugs = set(query.get("slug", [""])[0].split(","))
+                return handler.send(200, [{"id": term_id, "name": name} for name, term_id in terms.items()
+                                          if name in slugs])
+            name = json.loads(body)["name"]
+            if name in terms:
+                return handler.send(400, {"code": "term_exists", "message": "既に存在します",
+                                          "data": {"status": 400, "term_id": terms[name]}})
+            terms[name] = self._new_id()
+            return handler.send(201, {"id": terms[name], "name": name})
+
+        if resource == "media":
+            site["media"] += 1
+            return handler.send(201, {"id": self._new_id(), "media_type": "image"})
+
+        post = json.loads(body)
+        site["posts"] += 1
+        handler.send(201, {"id": self._new_id(), "link": f"{self.url}/?p={site['posts']}",
+                           "categories": post.get("categories", []), "tags": post.get("tags", [])})
@@ -0,0 +1,364 @@
+# benchmarks/pipeline_benchmark.py
+"""
+記事生成〜投稿のパイプライン全体のベンチマーク。
+OpenAI / Pixabay / WordPress はローカルの代替サーバー（benchmarks/fake_services.py）に向け、
+記事/分・ステージごとの p50/p99・DB ラウンドトリップ数・ピークメモリを表示する。
+
+    python benchmarks/pipeline_benchmark.py                                   # bulk → safely → post
+    python benchmarks/pipeline_benchmark.py --jobs 6 --openai-latency 0.5 --openai-429-rate 0.05
+    python benchmarks/pipeline_benchmark.py --json result.json                # 結果を保存
+    python benchmarks/pipeline_benchmark.py --baseline result.json            # 保存した結果より遅ければ終了コード 1
+
+指定した DB のテーブルは作り直すので、本番・開発用の DB には向けないこと。
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_services import Fault, FakeOpenAI, FakePixabay, FakeWordPress  # noqa: E402
+
+SCENARIOS = ["bulk", "safely", "batch", "post"]
+DEFAULT_SCENARIOS = ["bulk", "safely", "post"]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Recorder:
+    """
+    ステージの所要時間（utils.metrics のヒストグラムに記録される値そのもの）と、
+    DB に発行した SQL の件数を集める
+    """
+
+    def __init__(self):
+        self.stage_samples = defaultdict(list)
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def install(self, metrics):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        for histogram, stage_of in (
+            (metrics.stage_seconds, lambda labels: labels["stage"]),
+            (metrics.openai_request_seconds, lambda labels: f"openai_{labels['mode']}"),
+        ):
+            self._wrap(histogram, stage_of)
+        event.listen(Engine, "before_cursor_execute", self._on_query)
+
+    def _wrap(self, histogram, stage_of):
+        observe = histogram.observe
+
+        def record(value, **labels):
+            with self._lock:
+                self.stage_samples[stage_of(labels)].append(value)
+            observe(value, **labels)
+
+        histogram.observe = record
+
+    def _on_query(self, *args):
+        with self._lock:
+            self.queries += 1
+
+    def reset(self):
+        with self._lock:
+            self.stage_samples = defaultdict(list)
+            self.queries = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: list(samples) for stage, samples in self.stage_samples.items()}, self.queries
+
+
+def start_fakes(args):
+    openai = FakeOpenAI(
+        Fault(args.openai_latency, args.openai_latency / 4, args.openai_error_rate, args.openai_429_rate, seed=1),
+        body_chars=args.body_chars, chars_per_sec=args.openai_chars_per_sec
+    ).start()
+    pixabay = FakePixabay(Fault(args.pixabay_latency, args.pixabay_latency / 4, args.pixabay_error_rate, seed=2)).start()
+    wordpress = FakeWordPress(
+        Fault(args.wp_latency, args.wp_latency / 4, args.wp_error_rate, args.wp_429_rate, seed=3)
+    ).start()
+    return {"openai": openai, "pixabay": pixabay, "wordpress": wordpress}
+
+
+def configure_environment(args, fakes):
+    """
+    アプリのモジュールは import 時に環境変数を読むので、import より前に設定する
+    """
+    os.environ.update({
+        "DATABASE_URL": args.database_url,
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": fakes["openai"].url + "/v1",
+        "OPENAI_RATE_LIMIT_STATE": os.path.join(tempfile.mkdtemp(prefix="pipeline_benchmark_"), "limits.json"),
+        "OPENAI_BATCH_POLL_SEC": "0.2",
+        "LLM_CACHE_BACKEND": "none",
+        "PIXABAY_URL": fakes["pixabay"].url + "/api/",
+        "PIXABAY_API_KEY": "benchmark",
+    })
+    # 共有レートリミッターの上限（本番の組織クォータに合わせて計測する）
+    if args.openai_rpm:
+        os.environ["OPENAI_RPM"] = str(args.openai_rpm)
+    if args.openai_tpm:
+        os.environ["OPENAI_TPM"] = str(args.openai_tpm)
+    if args.body_sections:
+        os.environ["BODY_SECTIONS"] = "true"
+
+
+def seed(app, db, users, wp_url):
+    """
+    テーブルを作り直し、ユーザーと1ユーザー1サイト（代替 WordPress 上）を作る
+    """
+    from models import User, Site
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        accounts = []
+        for n in range(1, users + 1):
+            user = User(email=f"bench{n}@example.com", password_hash="x")
+            db.session.add(user)
+            db.session.flush()
+            site = Site(user_id=user.id, site_name=f"bench{n}", wp_url=f"{wp_url}/site{n}",
+                        wp_username="bench", wp_app_password="bench")
+            db.session.add(site)
+            db.session.flush()
+            accounts.append((user.id, site.id))
+        db.session.commit()
+    return accounts
+
+
+def _generation_jobs(args, accounts):
+    return [(f"ベンチ{n}", *accounts[n % len(accounts)]) for n in range(args.jobs)]
+
+
+def run_bulk(app, args, accounts):
+    from bulk_article_generator import generate_bulk_articles
+
+    def run(job):
+        genre, user_id, site_id = job
+        return generate_bulk_articles(genre, site_id, user_id, app=app)
+
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        list(pool.map(run, _generation_jobs(args, accounts)))
+
+
+def run_safely(app, args, accounts):
+    from utils.async_article_generator import generate_articles_safely
+
+    futures = [
+        generate_articles_safely(genre, site_id, user_id, app=app, wait=False)
+        for genre, user_id, site_id in _generation_jobs(args, accounts)
+    ]
+    for future in futures:
+        future.result()
+
+
+def run_batch(app, args, accounts):
+    from bulk_article_generator import generate_bulk_articles
+
+    with app.app_context():
+        for genre, user_id, site_id in _generation_jobs(args, accounts):
+            generate_bulk_articles(genre, site_id, user_id, app=app, batch=True)
+
+
+def run_post(app, args, accounts):
+    """
+    生成済みの記事をすべて予約時刻を過ぎた scheduled にして、予約投稿を1回実行する
+    """
+    from models import db, Article
+    from scheduler_runner import dispatch_due_posts
+
+    with app.app_context():
+        db.session.execute(
+            db.update(Article)
+            .where(Article.status.in_(["pending", "scheduled"]))
+            .values(status="scheduled", scheduled_time=datetime.utcnow() - timedelta(minutes=1))
+        )
+        db.session.commit()
+        asyncio.run(dispatch_due_posts())
+
+
+RUNNERS = {"bulk": run_bulk, "safely": run_safely, "batch": run_batch, "post": run_post}
+
+
+def measure(name, app, args, accounts, recorder, fakes):
+    from models import db, Article
+    from utils.logger import flush_logs
+
+    with app.app_context():
+        before_id = db.session.query(db.func.max(Article.id)).scalar() or 0
+        before_posted = Article.query.filter_by(status="posted").count()
+        before_failed = Article.query.filter_by(status="failed").count()
+
+    before_calls = {service: dict(fake.calls) for service, fake in fakes.items()}
+    recorder.reset()
+    if args.trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    RUNNERS[name](app, args, accounts)
+    flush_logs()
+    elapsed = time.perf_counter() - started
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024 if args.trace_memory else None
+    if args.trace_memory:
+        tracemalloc.stop()
+    samples, queries = recorder.snapshot()
+
+    with app.app_context():
+        if name == "post":
+            done = Article.query.filter_by(status="posted").count() - before_posted
+            failed = Article.query.filter_by(status="failed").count() - before_failed
+        else:
+            created = Article.query.filter(Article.id > before_id)
+            done = created.filter(Article.status.in_(["pending", "scheduled"])).count()
+            failed = created.filter(Article.status == "failed").count()
+
+    calls = {
+        service: {key: count - before_calls[service].get(key, 0) for key, count in fake.calls.items()
+                  if count - before_calls[service].get(key, 0)}
+        for service, fake in fakes.items()
+    }
+    return {
+        "elapsed_sec": round(elapsed, 3),
+        "articles": done,
+        "failed": failed,
+        "articles_per_min": round(done / elapsed * 60, 2) if elapsed else 0,
+        "db_round_trips": queries,
+        "db_round_trips_per_article": round(queries / done, 1) if done else None,
+        "peak_memory_mb": round(peak_mb, 1) if peak_mb is not None else None,
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50_ms": round(statistics.median(values) * 1000, 1),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 1),
+            }
+            for stage, values in sorted(samples.items())
+        },
+        "calls": calls,
+    }
+
+
+def report(name, result):
+    print(f"\n===== {name} =====")
+    print(f"⏱ {result['elapsed_sec']:.1f} 秒 / 成功 {result['articles']} 件 / 失敗 {result['failed']} 件"
+          f" → {result['articles_per_min']:.1f} 記事/分")
+    print(f"🗄 DB ラウンドトリップ {result['db_round_trips']} 回（1記事あたり {result['db_round_trips_per_article']}）")
+    if result["peak_memory_mb"] is not None:
+        print(f"🧠 ピークメモリ（tracemalloc）{result['peak_memory_mb']:.1f} MB")
+    print(f"   {'ステージ':<18}{'件数':>6}{'p50 ms':>10}{'p99 ms':>10}")
+    for stage, stats in result["stages"].items():
+        print(f"   {stage:<18}{stats['count']:>6}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    for service, calls in result["calls"].items():
+        if calls:
+            print(f"   {service}: " + ", ".join(f"{key} {count}" for key, count in sorted(calls.items())))
+
+
+def compare(results, baseline_path, max_regression, slack_ms):
+    """
+    保存済みの結果と比べ、記事/分の低下か p99 の悪化が max_regression を超えたものを返す。
+    p99 は slack_ms 未満の差（数ミリ秒のステージのゆらぎ）を無視する。
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["scenarios"]
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["articles_per_min"] and result["articles_per_min"] < base["articles_per_min"] * (1 - max_regression):
+            regressions.append(f"{name}: 記事/分 {base['articles_per_min']} → {result['articles_per_min']}")
+        for stage, stats in result["stages"].items():
+            base_stage = base["stages"].get(stage)
+            if base_stage and stats["p99_ms"] > base_stage["p99_ms"] * (1 + max_regression) + slack_ms:
+                regressions.append(f"{name}/{stage}: p99 {base_stage['p99_ms']} ms → {stats['p99_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="記事生成〜投稿パイプラインのスループット計測")
+    parser.add_argument("--database-url", default="sqlite:////tmp/pipeline_benchmark.sqlite3")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help=f"実行するシナリオ（複数指定可、既定: {' '.join(DEFAULT_SCENARIOS)}）")
+    parser.add_argument("--jobs", type=int, default=4, help="シナリオごとの生成ジョブ数（1ジョブ10記事）")
+    parser.add_argument("--parallel", type=int, default=4, help="bulk で同時に呼び出すジョブ数")
+    parser.add_argument("--users", type=int, default=2, help="ユーザー数（1ユーザー1サイト）")
+    parser.add_argument("--body-chars", type=int, default=2000, help="代替 OpenAI が返す本文の文字数")
+    parser.add_argument("--body-sections", action="store_true", help="本文を見出しごとに並行生成する")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="最初の応答までの秒数")
+    parser.add_argument("--openai-chars-per-sec", type=float, default=4000, help="本文の生成速度（文字/秒）")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-429-rate", type=float, default=0.0)
+    parser.add_argument("--openai-rpm", type=int, help="レートリミッターの RPM（省略時は OPENAI_RPM）")
+    parser.add_argument("--openai-tpm", type=int, help="レートリミッターの TPM（省略時は OPENAI_TPM）")
+    parser.add_argument("--pixabay-latency", type=float, default=0.1)
+    parser.add_argument("--pixabay-error-rate", type=float, default=0.0)
+    parser.add_argument("--wp-latency", type=float, default=0.1)
+    parser.add_argument("--wp-error-rate", type=float, default=0.0)
+    parser.add_argument("--wp-429-rate", type=float, default=0.0)
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false",
+                        help="tracemalloc を使わない（計測のオーバーヘッドを除く）")
+    parser.add_argument("--json", help="結果を書き出す JSON ファイル")
+    parser.add_argument("--baseline", help="比較する過去の結果（--json で保存したもの）")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="許容する悪化の割合")
+    parser.add_argument("--slack-ms", type=float, default=50, help="p99 の比較で無視する差（ミリ秒）")
+    args = parser.parse_args()
+    scenarios = args.scenario or DEFAULT_SCENARIOS
+
+    fakes = start_fakes(args)
+    configure_environment(args, fakes)
+
+    from app_init import create_app
+    from extensions import db
+    from utils import metrics
+
+    recorder = Recorder()
+    recorder.install(metrics)
+    app = create_app(with_scheduler=False)
+    accounts = seed(app, db, args.users, fakes["wordpress"].url)
+
+    results = {}
+    for name in scenarios:
+        results[name] = measure(name, app, args, accounts, recorder, fakes)
+        report(name, results[name])
+
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\n📈 プロセスの最大 RSS {max_rss_mb:.0f} MB")
+    for service, fake in fakes.items():
+        faults = fake.stats()["faults"]
+        if faults:
+            print(f"💥 {service} が返した障害: " + ", ".join(f"{status} × {count}" for status, count in faults.items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "max_rss_mb": round(max_rss_mb, 1), "scenarios": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 結果を {args.json} に保存しました")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression, args.slack_ms)
+        if regressions:
+            print("\n❌ 基準より悪化しています:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✅ 基準からの悪化はありません")
+
+
+if __name__ == "__main__":
+    main()
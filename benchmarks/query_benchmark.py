@@ -0,0 +1,208 @@
+# benchmarks/query_benchmark.py
+"""
+Article / PostLog の主要クエリのベンチマーク。
+ローカル DB に記事を大量投入し、インデックス追加前後の実行計画とレイテンシを表示する。
+
+    python benchmarks/query_benchmark.py                        # SQLite に 100万件
+    python benchmarks/query_benchmark.py --rows 100000 --database-url postgresql://localhost/bench
+
+指定した DB のテーブルは作り直すので、本番・開発用の DB には向けないこと。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, User, Site, Article, PostLog  # noqa: E402
+
+STATUSES = ["pending", "scheduled", "posted", "failed"]
+STATUS_WEIGHTS = [10, 5, 80, 5]  # 運用中は投稿済みが大半
+INSERT_CHUNK = 10000
+
+# 追加したインデックス（「追加前」の計測ではこれらを落とす）
+BENCH_INDEXES = [
+    index for table in (Article.__table__, PostLog.__table__)
+    for index in table.indexes
+    if index.name in {
+        "ix_article_user_site_status_created",
+        "ix_article_user_created",
+        "ix_article_due_scheduled",
+        "ix_article_pending_created",
+        "ix_post_log_article_created",
+    }
+]
+
+
+def _queries(users, now):
+    """
+    各ホットパスと同じ形のクエリ（名前, SQL, パラメータを返す関数）
+    """
+    user_id = lambda: random.randint(1, users)  # noqa: E731
+    site_of = lambda u: (u - 1) * 3 + random.randint(1, 3)  # noqa: E731
+
+    def user_site():
+        u = user_id()
+        return {"user_id": u, "site_id": site_of(u)}
+
+    return [
+        ("scheduler_runner: 予約時刻を過ぎた scheduled",
+         "SELECT id, site_id FROM article WHERE status = 'scheduled' AND scheduled_time <= :now "
+         "ORDER BY id LIMIT 100",
+         lambda: {"now": now}),
+        ("post_scheduler: pending を3件",
+         "SELECT id FROM article WHERE status = 'pending' ORDER BY created_at, id LIMIT 3",
+         lambda: {}),
+        ("utils/scheduler: サイト・ユーザーの pending",
+         "SELECT id FROM article WHERE site_id = :site_id AND user_id = :user_id AND status = 'pending' "
+         "ORDER BY created_at",
+         user_site),
+        ("post_log: ステータス絞り込みの1ページ目",
+         "SELECT id, title, status, created_at FROM article "
+         "WHERE user_id = :user_id AND site_id = :site_id AND status = 'posted' "
+         "ORDER BY created_at DESC, id DESC LIMIT 51",
+         user_site),
+        ("post_log: ユーザーの全記事の1ページ目",
+         "SELECT id, title, status, created_at FROM article WHERE user_id = :user_id "
+         "ORDER BY created_at DESC, id DESC LIMIT 51",
+         lambda: {"user_id": user_id()}),
+        ("post_log: ステータス別件数",
+         "SELECT status, count(id) FROM article WHERE user_id = :user_id AND site_id = :site_id GROUP BY status",
+         user_site),
+        ("PostLog: 記事のログを時系列で",
+         "SELECT id, step, created_at FROM post_log WHERE article_id = :article_id ORDER BY created_at",
+         lambda: {"article_id": random.randint(1, 1000)}),
+    ]
+
+
+def _scheduled_time(rng, status, now, created_at):
+    if status == "pending":
+        return None
+    if status == "scheduled":
+        # 予約中の記事は大半が未来（予約時刻を過ぎたものはすぐ投稿される）
+        return now + timedelta(minutes=rng.randint(-30, 3 * 24 * 60))
+    return created_at + timedelta(days=rng.randint(0, 3))
+
+
+def seed(engine, rows, users):
+    """
+    テーブルを作り直し、ユーザー・サイト（1ユーザー3サイト）・記事・投稿ログを投入する
+    """
+    tables = [User.__table__, Site.__table__, Article.__table__, PostLog.__table__]
+    db.metadata.drop_all(engine, tables=list(reversed(tables)))
+    db.metadata.create_all(engine, tables=tables)
+
+    started = time.monotonic()
+    now = datetime.utcnow()
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": u, "email": f"bench{u}@example.com", "password_hash": "x"} for u in range(1, users + 1)
+        ])
+        conn.execute(Site.__table__.insert(), [
+            {"id": (u - 1) * 3 + n, "user_id": u, "site_name": f"site{u}-{n}",
+             "wp_url": f"https://example.com/{u}/{n}", "wp_username": "u", "wp_app_password": "p"}
+            for u in range(1, users + 1) for n in range(1, 4)
+        ])
+
+    for start in range(0, rows, INSERT_CHUNK):
+        articles, logs = [], []
+        for article_id in range(start + 1, min(start + INSERT_CHUNK, rows) + 1):
+            user_id = rng.randint(1, users)
+            status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            articles.append({
+                "id": article_id,
+                "user_id": user_id,
+                "site_id": (user_id - 1) * 3 + rng.randint(1, 3),
+                "keyword": f"キーワード {article_id}",
+                "title": f"タイトル {article_id}",
+                "content": "本文",
+                "status": status,
+                "scheduled_time": _scheduled_time(rng, status, now, created_at),
+                "created_at": created_at,
+            })
+            logs.append({"article_id": article_id, "step": "記事生成完了", "created_at": created_at})
+        with engine.begin() as conn:
+            conn.execute(Article.__table__.insert(), articles)
+            conn.execute(PostLog.__table__.insert(), logs)
+        print(f"\r📥 {min(start + INSERT_CHUNK, rows):,} / {rows:,} 件投入", end="", flush=True)
+
+    print(f"\n✅ 投入完了（{time.monotonic() - started:.1f} 秒）")
+
+
+def _explain(conn, sql, params):
+    if conn.dialect.name == "postgresql":
+        rows = conn.execute(sa.text("EXPLAIN " + sql), params).fetchall()
+        return [row[0] for row in rows]
+    rows = conn.execute(sa.text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def measure(engine, users, repeat, label):
+    """
+    各クエリの実行計画と、repeat 回実行したときの中央値・p95 を表示する
+    """
+    print(f"\n===== {label} =====")
+    results = {}
+    now = datetime.utcnow()
+    with engine.connect() as conn:
+        for name, sql, make_params in _queries(users, now):
+            plan = _explain(conn, sql, make_params())
+            timings = []
+            for _ in range(repeat):
+                params = make_params()
+                started = time.perf_counter()
+                conn.execute(sa.text(sql), params).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            median = statistics.median(timings)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            results[name] = median
+            print(f"\n▶ {name}\n   中央値 {median:.2f} ms / p95 {p95:.2f} ms")
+            for line in plan:
+                print(f"   {line}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Article / PostLog クエリのインデックス効果を計測")
+    parser.add_argument("--database-url", default="sqlite:////tmp/article_benchmark.sqlite3")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="投入する記事数")
+    parser.add_argument("--users", type=int, default=200, help="ユーザー数（1ユーザー3サイト）")
+    parser.add_argument("--repeat", type=int, default=20, help="1クエリあたりの実行回数")
+    parser.add_argument("--skip-seed", action="store_true", help="投入済みの DB をそのまま使う")
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.database_url)
+    if not args.skip_seed:
+        seed(engine, args.rows, args.users)
+
+    for index in BENCH_INDEXES:
+        index.drop(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(sa.text("ANALYZE"))
+    before = measure(engine, args.users, args.repeat, "インデックス追加前")
+
+    started = time.monotonic()
+    for index in BENCH_INDEXES:
+        index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(sa.text("ANALYZE"))
+    print(f"\n🗂 インデックス作成 {time.monotonic() - started:.1f} 秒")
+    after = measure(engine, args.users, args.repeat, "インデックス追加後")
+
+    print("\n===== まとめ（中央値） =====")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] > 0 else float("inf")
+        print(f"{name}: {before[name]:.2f} ms → {after[name]:.2f} ms（{speedup:.1f} 倍）")
+
+
+if __name__ == "__main__":
+    main()
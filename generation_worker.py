@@ -0,0 +1,84 @@
+# generation_worker.py
+"""
+記事生成ワーカー（Procfile の worker プロセス）。
+generation_job テーブルからジョブを確保し、生成エンジンで実行する。
+ワーカーを増やすと生成できる量が増え、Web プロセスは生成処理を持たない。
+OpenAI のレートリミッター・LLM キャッシュの状態は /tmp のファイル（ホストごと）なので、
+ワーカーを複数ホストに分ける場合は OPENAI_RATE_LIMIT_HOSTS にホスト数を指定する。
+"""
+import os
+import signal
+import threading
+
+from app_init import create_app
+from utils import generation_engine, generation_jobs, metrics
+
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "2"))  # 1ワーカーで同時に実行するジョブ数
+WORKER_POLL_SEC = float(os.getenv("WORKER_POLL_SEC", "2"))
+HEARTBEAT_SEC = max(1, generation_jobs.JOB_LEASE_SEC // 3)
+METRICS_PORT = os.getenv("METRICS_PORT")  # 指定するとワーカーのメトリクスをこのポートで公開
+
+
+def _heartbeat_loop(app, running, running_lock, stopping):
+    while not stopping.wait(HEARTBEAT_SEC):
+        # running はメインループが書き換えるので、ロックを取ってジョブIDを写してから使う
+        with running_lock:
+            job_ids = list(running)
+        with app.app_context():
+            try:
+                generation_jobs.heartbeat(job_ids)
+            except Exception as e:
+                print("⚠️ ハートビート更新エラー:", e)
+
+
+def run_worker():
+    app = create_app(with_scheduler=False)
+    running = {}  # ジョブID → Future（ハートビートのスレッドと共有するので running_lock の中で読み書きする）
+    running_lock = threading.Lock()
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        print("🛑 ワーカーを停止します")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    threading.Thread(target=_heartbeat_loop, args=(app, running, running_lock, stopping), daemon=True).start()
+    if METRICS_PORT:
+        metrics.start_http_server(int(METRICS_PORT))
+    print(f"👷 記事生成ワーカー起動: {generation_jobs.WORKER_ID}（同時 {WORKER_MAX_JOBS} ジョブ）")
+
+    while not stopping.is_set():
+        with running_lock:
+            finished = [(job_id, running.pop(job_id)) for job_id, future in list(running.items()) if future.done()]
+        for job_id, future in finished:
+            if future.cancelled():
+                print(f"⚠️ ジョブ {job_id} はキャンセルされました")
+            elif future.exception():
+                print(f"❌ ジョブ {job_id} で予期しないエラー:", future.exception())
+
+        job_id = None
+        if len(running) < WORKER_MAX_JOBS:
+            with app.app_context():
+                try:
+                    job_id = generation_jobs.claim_job()
+                except Exception as e:
+                    print("⚠️ ジョブ確保エラー:", e)
+        if job_id:
+            print(f"▶️ ジョブ {job_id} を開始")
+            with running_lock:
+                running[job_id] = generation_engine.submit(generation_jobs.run_job(app, job_id))
+            continue
+        stopping.wait(WORKER_POLL_SEC)
+
+    # 実行中のジョブは実行待ちに戻し、他のワーカー（または再起動後）に続きから引き継ぐ
+    with running_lock:
+        unfinished = [job_id for job_id, future in running.items() if not future.done()]
+    with app.app_context():
+        generation_jobs.release_jobs(unfinished)
+    if unfinished:
+        print(f"↩️ 実行中のジョブ {unfinished} を実行待ちに戻しました")
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -90,9 +90,15 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # APScheduler の永続ジョブストア（post_scheduler）のテーブルはモデル外なので比較しない
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == "table" and name == "apscheduler_jobs")
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
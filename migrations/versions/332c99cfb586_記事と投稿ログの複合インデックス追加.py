@@ -0,0 +1,46 @@
+"""記事と投稿ログの複合インデックス追加
+
+Revision ID: 332c99cfb586
+Revises: fea1075db1e7
+Create Date: 2026-10-18 12:48:13.205871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '332c99cfb586'
+down_revision = 'fea1075db1e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 稼働中のテーブルへの書き込みを止めないよう、PostgreSQL では CONCURRENTLY で作成する
+    # （トランザクションの中では実行できないため autocommit_block で囲む）
+    with op.get_context().autocommit_block():
+        op.create_index('ix_article_user_site_status_created', 'article',
+                        ['user_id', 'site_id', 'status', 'created_at', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_article_user_created', 'article', ['user_id', 'created_at', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_article_due_scheduled', 'article', ['scheduled_time', 'id'], unique=False,
+                        postgresql_where=sa.text("status = 'scheduled'"),
+                        sqlite_where=sa.text("status = 'scheduled'"),
+                        postgresql_concurrently=True)
+        op.create_index('ix_article_pending_created', 'article', ['created_at', 'id'], unique=False,
+                        postgresql_where=sa.text("status = 'pending'"),
+                        sqlite_where=sa.text("status = 'pending'"),
+                        postgresql_concurrently=True)
+        op.create_index('ix_post_log_article_created', 'post_log', ['article_id', 'created_at'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_post_log_article_created', table_name='post_log', postgresql_concurrently=True)
+        op.drop_index('ix_article_pending_created', table_name='article', postgresql_concurrently=True)
+        op.drop_index('ix_article_due_scheduled', table_name='article', postgresql_concurrently=True)
+        op.drop_index('ix_article_user_created', table_name='article', postgresql_concurrently=True)
+        op.drop_index('ix_article_user_site_status_created', table_name='article', postgresql_concurrently=True)
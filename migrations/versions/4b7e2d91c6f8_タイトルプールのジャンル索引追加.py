@@ -0,0 +1,29 @@
+"""タイトルプールのジャンル索引追加
+
+Revision ID: 4b7e2d91c6f8
+Revises: 9c41e2b7d0a3
+Create Date: 2026-10-18 18:21:07.634118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2d91c6f8'
+down_revision = '9c41e2b7d0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # インデックスは書き込みを止めないよう CONCURRENTLY で作成する（PostgreSQL）
+    with op.get_context().autocommit_block():
+        op.create_index('ix_title_pool_genre_keyword', 'title_pool', ['genre', 'keyword'], unique=False,
+                        postgresql_ops={'keyword': 'varchar_pattern_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_title_pool_genre_keyword', table_name='title_pool', postgresql_concurrently=True)
@@ -0,0 +1,33 @@
+"""タームキャッシュ追加
+
+Revision ID: 5bc17619bfa5
+Revises: fbf6559e9f3c
+Create Date: 2026-10-18 11:20:04.318226
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5bc17619bfa5'
+down_revision = 'fbf6559e9f3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('term_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('site_url', sa.String(length=200), nullable=False),
+        sa.Column('taxonomy', sa.String(length=20), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('term_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('site_url', 'taxonomy', 'name', name='uq_term_cache_site_taxonomy_name')
+    )
+
+
+def downgrade():
+    op.drop_table('term_cache')
@@ -0,0 +1,37 @@
+"""タイトルプール追加
+
+Revision ID: 6d26f1795f69
+Revises: a6a369a487fc
+Create Date: 2026-10-18 09:12:04.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d26f1795f69'
+down_revision = 'a6a369a487fc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('title_pool',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('genre', sa.String(length=100), nullable=True),
+        sa.Column('keyword', sa.String(length=200), nullable=False),
+        sa.Column('title', sa.String(length=300), nullable=False),
+        sa.Column('used_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('title_pool', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_title_pool_keyword'), ['keyword'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('title_pool', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_title_pool_keyword'))
+
+    op.drop_table('title_pool')
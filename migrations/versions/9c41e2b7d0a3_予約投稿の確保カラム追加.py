@@ -0,0 +1,38 @@
+"""予約投稿の確保カラム追加
+
+Revision ID: 9c41e2b7d0a3
+Revises: 332c99cfb586
+Create Date: 2026-10-18 15:02:41.517203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c41e2b7d0a3'
+down_revision = '332c99cfb586'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_by', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+    # インデックスは書き込みを止めないよう CONCURRENTLY で作成する（PostgreSQL）
+    with op.get_context().autocommit_block():
+        op.create_index('ix_article_posting_claimed', 'article', ['claimed_at', 'id'], unique=False,
+                        postgresql_where=sa.text("status = 'posting'"),
+                        sqlite_where=sa.text("status = 'posting'"),
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_article_posting_claimed', table_name='article', postgresql_concurrently=True)
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_column('claimed_at')
+        batch_op.drop_column('claimed_by')
@@ -0,0 +1,39 @@
+"""メディアキャッシュ追加
+
+Revision ID: fbf6559e9f3c
+Revises: 6d26f1795f69
+Create Date: 2026-10-18 10:41:27.530914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fbf6559e9f3c'
+down_revision = '6d26f1795f69'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('media_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('site_url', sa.String(length=200), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('media_id', sa.Integer(), nullable=False),
+        sa.Column('source_url', sa.String(length=300), nullable=True),
+        sa.Column('content_type', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('site_url', 'content_hash', name='uq_media_cache_site_hash')
+    )
+    with op.batch_alter_table('media_cache', schema=None) as batch_op:
+        batch_op.create_index('ix_media_cache_site_source', ['site_url', 'source_url'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('media_cache', schema=None) as batch_op:
+        batch_op.drop_index('ix_media_cache_site_source')
+
+    op.drop_table('media_cache')
@@ -0,0 +1,57 @@
+"""生成ジョブキュー追加
+
+Revision ID: fea1075db1e7
+Revises: 5bc17619bfa5
+Create Date: 2026-10-18 12:02:45.917342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fea1075db1e7'
+down_revision = '5bc17619bfa5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('site_id', sa.Integer(), nullable=False),
+        sa.Column('genre', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('step', sa.String(length=20), nullable=True),
+        sa.Column('keywords', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('worker_id', sa.String(length=100), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['site_id'], ['site.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.create_index('ix_generation_job_status_id', ['status', 'id'], unique=False)
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('job_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_article_job_id'), ['job_id'], unique=False)
+        batch_op.create_foreign_key('fk_article_job_id', 'generation_job', ['job_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_article_job_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_article_job_id'))
+        batch_op.drop_column('job_id')
+
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_generation_job_status_id')
+
+    op.drop_table('generation_job')
@@ -26,6 +26,26 @@ class Site(db.Model):
 
 # ✅ 記事情報（生成・編集・投稿管理）
 class Article(db.Model):
+    __table_args__ = (
+        # 投稿ログ（ユーザー・サイト・ステータスで絞り込み、作成日時の新しい順）と
+        # 投稿スケジュール設定（サイト・ユーザーの pending を作成日時順）
+        db.Index("ix_article_user_site_status_created", "user_id", "site_id", "status", "created_at", "id"),
+        # 投稿ログ（ユーザーの全記事を作成日時の新しい順）
+        db.Index("ix_article_user_created", "user_id", "created_at", "id"),
+        # 予約投稿の取り出し（scheduled のうち予約時刻を過ぎたもの）
+        db.Index("ix_article_due_scheduled", "scheduled_time", "id",
+                 postgresql_where=db.text("status = 'scheduled'"),
+                 sqlite_where=db.text("status = 'scheduled'")),
+        # 日次スケジュール（pending を古い順）
+        db.Index("ix_article_pending_created", "created_at", "id",
+                 postgresql_where=db.text("status = 'pending'"),
+                 sqlite_where=db.text("status = 'pending'")),
+        # 投稿中のまま止まった記事（リースが切れたもの）の取り直し
+        db.Index("ix_article_posting_claimed", "claimed_at", "id",
+                 postgresql_where=db.text("status = 'posting'"),
+                 sqlite_where=db.text("status = 'posting'")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -38,18 +58,51 @@ class Article(db.Model):
     preview_html = db.Column(db.Text)
     featured_image_url = db.Column(db.String(300))
 
-    status = db.Column(db.String(20), default="draft")  # draft, scheduled, posted, error
+    status = db.Column(db.String(20), default="draft")  # draft, scheduled, posting, posted, error
     scheduled_time = db.Column(db.DateTime)
+    claimed_by = db.Column(db.String(100))  # 投稿中のプロセス（ホスト名:PID）
+    claimed_at = db.Column(db.DateTime)  # 投稿を確保した時刻（リースの起点）
     posted_time = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     gpt_tokens = db.Column(db.Integer)
     gpt_cost_usd = db.Column(db.Float)
 
+    job_id = db.Column(db.Integer, db.ForeignKey("generation_job.id"), index=True)  # 生成したジョブ
+
+    snippet = db.query_expression()  # 一覧表示用の本文の冒頭（with_expression で読み込む）
+
+# ✅ 記事生成ジョブ（ワーカープロセスが取り出して実行）
+class GenerationJob(db.Model):
+    __tablename__ = "generation_job"
+    __table_args__ = (
+        db.Index("ix_generation_job_status_id", "status", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey("site.id"), nullable=False)
+    genre = db.Column(db.String(100), nullable=False)
+
+    status = db.Column(db.String(20), default="queued")  # queued, running, done, failed
+    step = db.Column(db.String(20))  # keywords, articles, scheduling, done
+    keywords = db.Column(db.Text)  # 生成対象キーワード（JSON）。決まったら再実行でも作り直さない
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+
+    worker_id = db.Column(db.String(100))  # 実行中のワーカー（ホスト名:PID）
+    heartbeat_at = db.Column(db.DateTime)  # 途切れたら他のワーカーが引き取る
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
 # ✅ 投稿ログ（記事単位、詳細ステップ記録用）
 class PostLog(db.Model):
     __tablename__ = "post_log"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index("ix_post_log_article_created", "article_id", "created_at"),
+        {'extend_existing': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     article_id = db.Column(db.Integer, db.ForeignKey("article.id"))
@@ -63,6 +116,52 @@ class PostLog(db.Model):
     gpt_cost_usd = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# ✅ タイトルプール（1回の生成で得た10タイトルを捨てずに保持）
+class TitlePool(db.Model):
+    __tablename__ = "title_pool"
+    __table_args__ = (
+        # ジャンル内のキーワード一致・前方一致（LIKE 'key %'）の取り出し用
+        db.Index("ix_title_pool_genre_keyword", "genre", "keyword",
+                 postgresql_ops={"keyword": "varchar_pattern_ops"}),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    genre = db.Column(db.String(100))
+    keyword = db.Column(db.String(200), nullable=False, index=True)  # 正規化済みキーワード
+    title = db.Column(db.String(300), nullable=False)
+    used_at = db.Column(db.DateTime)  # 記事に使用済みなら日時
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ✅ WordPressメディアキャッシュ（画像の内容ハッシュ → サイトのメディアID）
+class MediaCache(db.Model):
+    __tablename__ = "media_cache"
+    __table_args__ = (
+        db.UniqueConstraint("site_url", "content_hash", name="uq_media_cache_site_hash"),
+        db.Index("ix_media_cache_site_source", "site_url", "source_url"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    site_url = db.Column(db.String(200), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256
+    media_id = db.Column(db.Integer, nullable=False)
+    source_url = db.Column(db.String(300))
+    content_type = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ✅ WordPressターム（カテゴリ・タグ）IDキャッシュ
+class TermCache(db.Model):
+    __tablename__ = "term_cache"
+    __table_args__ = (
+        db.UniqueConstraint("site_url", "taxonomy", "name", name="uq_term_cache_site_taxonomy_name"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    site_url = db.Column(db.String(200), nullable=False)
+    taxonomy = db.Column(db.String(20), nullable=False)  # categories / tags
+    name = db.Column(db.String(200), nullable=False)
+    term_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # ✅ 外部連携（今後の拡張用）
 class WordPressSite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -1,13 +1,28 @@
-import random
-from datetime import datetime, timedelta, time
+import atexit
+import os
+import threading
+from datetime import datetime, timezone
+from time import monotonic
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from article_generator import generate_article
-from models import db, Site, Article
-from wordpress_client import post_to_wordpress
-from utils.logger import log_article_progress
+from models import db
+from scheduler_runner import run_scheduled_posts
+from utils.leader_lock import LeaderLock
+from utils.scheduler import schedule_daily_posts
+from utils.title_pool import prune_titles
 
-scheduler = BackgroundScheduler()
+# スケジューラーは全プロセスで1つだけ（リーダーロックを取れたプロセス）が動かす
+LEADER_LOCK_NAME = "post_scheduler"
+LEADER_RETRY_SEC = int(os.getenv("SCHEDULER_LEADER_RETRY_SEC", "30"))  # ロックの再取得・確認の間隔
+POST_DISPATCH_SEC = int(os.getenv("POST_DISPATCH_SEC", "60"))  # 予約時刻を過ぎた記事を投稿する間隔
+JOB_TABLE = "apscheduler_jobs"
+
+scheduler = None  # リーダーになったときに作る（ジョブは JOB_TABLE に永続化）
+_app = None
+_started = False
+_start_lock = threading.Lock()
+_stopping = threading.Event()
 
 # 投稿時間帯（朝・昼・夜）
 PREFERRED_HOURS = [
@@ -16,94 +31,127 @@ PREFERRED_HOURS = [
     (18, 21),    # 夜
 ]
 
-def choose_random_time(start_hour, end_hour):
-    hour = random.randint(start_hour, end_hour)
-    minute = random.randint(0, 59)
-    return time(hour, minute)
-
-def schedule_daily_articles(app):
+def schedule_daily_articles(app=None):
     """
-    毎日0時に呼び出され、その日の3投稿を予約
+    毎日0時に呼び出され、サイトごとにその日の投稿（朝・昼・夜に1本ずつ）を予約
     """
+    app = app or _app
+    started = monotonic()
     with app.app_context():
-        articles = Article.query.filter_by(status='pending').limit(3).all()
-        if not articles:
-            print("📭 投稿待ち記事がありません")
-            return
-
-        for i, article in enumerate(articles):
-            start_hour, end_hour = PREFERRED_HOURS[i % len(PREFERRED_HOURS)]
-            rand_time = choose_random_time(start_hour, end_hour)
-            post_datetime = datetime.combine(datetime.today(), rand_time)
-
-            scheduler.add_job(
-                func=submit_article,
-                trigger='date',
-                run_date=post_datetime,
-                args=[article.id, app],  # ← app を引数で渡す
-                id=f"post_{article.id}"
-            )
+        plan = schedule_daily_posts(PREFERRED_HOURS)
+    if not plan:
+        print("📭 投稿待ち記事がありません")
+        return
+    print(f"📅 {len(plan)}記事の投稿を予約しました（{monotonic() - started:.1f}秒）")
 
-            article.scheduled_time = post_datetime
-            article.status = "scheduled"
-            db.session.commit()
 
-            print(f"📅 記事ID {article.id} を {post_datetime.strftime('%Y-%m-%d %H:%M')} に予約しました")
-
-def submit_article(article_id, app):
+def dispatch_scheduled_posts(app=None):
     """
-    スケジュールされた時間に記事を投稿
+    予約時刻を過ぎた記事を確保して投稿する（リーダーが POST_DISPATCH_SEC ごとに実行）。
+    予約は Article.scheduled_time そのものなので、再起動しても失われない。
     """
+    app = app or _app
     with app.app_context():
-        article = Article.query.get(article_id)
+        run_scheduled_posts()
 
-        if not article:
-            print(f"⚠️ 記事ID {article_id} が見つかりません")
-            return
-        if article.status != "scheduled":
-            print(f"⏸ 記事ID {article.id} はスケジュール状態ではありません（現在: {article.status}）")
-            return
 
-        site = Site.query.get(article.site_id)
-        if not site:
-            print(f"⚠️ サイトID {article.site_id} が見つかりません")
-            return
+def prune_title_pool(app=None):
+    """
+    期限切れのタイトルをプールから削除する（毎日リーダーが実行）
+    """
+    app = app or _app
+    with app.app_context():
+        deleted = prune_titles()
+    if deleted:
+        print(f"🧹 期限切れのタイトルを {deleted} 件削除しました")
 
-        result = post_to_wordpress(
-            title=article.title,
-            content=article.content,
-            site_url=site.wp_url,
-            username=site.wp_username,
-            app_password=site.wp_app_password,
-            featured_image_url=article.featured_image_url,
-            category_name="AI記事",
-            publish=True
-        )
-
-        if result:
-            article.status = "posted"
-            article.posted_time = datetime.utcnow()
-            db.session.commit()
-            log_article_progress(step="投稿完了", article_id=article.id)
-            print(f"✅ 記事ID {article.id} 投稿完了")
-        else:
-            article.status = "failed"
-            db.session.commit()
-            log_article_progress(step="投稿失敗", article_id=article.id)
-            print(f"❌ 記事ID {article.id} 投稿失敗")
 
-def start_scheduler(app):
+def _become_leader(engine):
     """
-    スケジューラー起動設定
+    永続ジョブストア付きのスケジューラーを起動し、停止中に過ぎた予約もすぐに投稿する
     """
+    global scheduler
+    scheduler = BackgroundScheduler(
+        jobstores={"default": SQLAlchemyJobStore(engine=engine, tablename=JOB_TABLE)},
+        timezone="UTC",  # 予約時刻（Article.scheduled_time）と同じく UTC で日付を区切る
+        # 停止中に過ぎた実行は起動時に1回だけ実行する
+        job_defaults={"coalesce": True, "misfire_grace_time": None, "max_instances": 1}
+    )
     scheduler.start()
 
     # 毎日深夜0:00に投稿スケジュールを予約
     scheduler.add_job(
-        func=lambda: schedule_daily_articles(app),
+        func=schedule_daily_articles,
         trigger='cron',
         hour=0,
-        minute=0
+        minute=0,
+        id="schedule_daily_articles",
+        replace_existing=True
     )
+    scheduler.add_job(
+        func=prune_title_pool,
+        trigger='cron',
+        hour=0,
+        minute=30,
+        id="prune_title_pool",
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=dispatch_scheduled_posts,
+        trigger='interval',
+        seconds=POST_DISPATCH_SEC,
+        next_run_time=datetime.now(timezone.utc),
+        id="dispatch_scheduled_posts",
+        replace_existing=True
+    )
+    print(f"⏱ スケジューラーが起動しました（リーダー: pid {os.getpid()}）")
+
+
+def _step_down():
+    global scheduler
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=False)
+    scheduler = None
+
+
+def _run_leader_election(app):
+    """
+    リーダーロックを取れたらスケジューラーを起動し、取れなければ定期的に取り直しを試みる
+    """
+    with app.app_context():
+        engine = db.engine
+    lock = LeaderLock(engine, LEADER_LOCK_NAME)
+
+    while not _stopping.is_set():
+        try:
+            if not lock.held:
+                if lock.acquire():
+                    _become_leader(engine)
+            elif not lock.check():
+                print("⚠️ リーダーロックを失ったためスケジューラーを停止します")
+                _step_down()
+        except Exception as e:
+            print("⚠️ スケジューラーのリーダー選出エラー:", e)
+            _step_down()
+            lock.release()
+        _stopping.wait(LEADER_RETRY_SEC)
+
+    _step_down()
+    lock.release()
+
+
+def start_scheduler(app):
+    """
+    スケジューラー起動設定。プロセスごとに何度呼ばれても1回だけ選出を始め、
+    全プロセスの中でリーダーロックを取れた1つだけがスケジューラーを動かす。
+    """
+    global _app, _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    _app = app
 
-    print("⏱ スケジューラーが起動しました")
+    thread = threading.Thread(target=_run_leader_election, args=(app,), name="scheduler-leader", daemon=True)
+    thread.start()
+    atexit.register(_stopping.set)
@@ -1,15 +1,21 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, Response, render_template, redirect, url_for, request, flash, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload, load_only, with_expression
+from datetime import datetime
+import os
+import threading
+import time
 
 from forms import (
     CombinedForm, SiteRegisterForm, ArticleEditForm,
     RegisterForm, LoginForm
 )
-from models import db, Article, Site, User, WordPressSite
+from models import db, Article, Site, User, WordPressSite, GenerationJob
 from bulk_article_generator import generate_bulk_articles
-from utils.async_article_generator import generate_articles_safely  # 追加
-import threading  # 追加
+from utils import metrics
+from utils.generation_jobs import enqueue_job, job_counts
+from utils.progress_events import ProgressCursor, format_sse, latest_event_id, user_site_ids
 
 main = Blueprint('main', __name__)
 
@@ -73,39 +79,84 @@ def index():
 
     return render_template('index.html', form=form)
 
-# ✅ 記事生成処理（非同期スレッド）
+# ✅ 記事生成処理（ジョブを登録して即リターン。生成は worker プロセスが行う）
 @main.route('/start-generation', methods=['POST'])
 @login_required
 def start_generation():
     genre = request.form.get("genre")
     site_id = int(request.form.get("site_id"))
 
-    thread = threading.Thread(
-        target=generate_articles_safely,
-        args=(genre, site_id, current_user.id)
-    )
-    thread.start()
+    enqueue_job(genre, site_id, current_user.id)
 
-    flash("✅ インターバル付きで10記事の生成を開始しました。投稿ログから確認できます。")
+    flash("✅ 10記事の生成を受け付けました。投稿ログから確認できます。")
     return redirect(url_for("main.post_log"))
 
 # ✅ 投稿ログ画面
+POST_LOG_PAGE_SIZE = 50
+
+
+def _parse_cursor(cursor):
+    """
+    「作成日時_記事ID」形式のページ位置を (datetime, int) にする（不正なら None）
+    """
+    try:
+        created_at, article_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(article_id)
+    except (AttributeError, ValueError):
+        return None
+
+
 @main.route('/post-log')
 @login_required
 def post_log():
     site_id = request.args.get("site_id", type=int)
     status = request.args.get("status")
+    cursor = _parse_cursor(request.args.get("before"))
 
     user_sites = Site.query.filter_by(user_id=current_user.id).all()
     query = Article.query.filter_by(user_id=current_user.id)
     if site_id:
         query = query.filter_by(site_id=site_id)
+
+    # ステータスごとの件数は GROUP BY 1回で集計
+    status_counts = dict(
+        query.with_entities(Article.status, db.func.count(Article.id)).group_by(Article.status).all()
+    )
+
     if status:
         query = query.filter_by(status=status)
+    if cursor:
+        query = query.filter(db.tuple_(Article.created_at, Article.id) < cursor)
+
+    # 一覧では本文を読み込まない。プレビューは生成時に作った短い preview_html（画像付き）を表示し、
+    # まだ無い記事は本文の冒頭だけを取得して代わりに表示する（サイト名は JOIN で同時に取得）
+    rows = (
+        query
+        .options(
+            load_only(Article.id, Article.site_id, Article.keyword, Article.title, Article.preview_html,
+                      Article.status, Article.scheduled_time, Article.created_at),
+            with_expression(Article.snippet, db.func.substr(Article.content, 1, 120)),
+            joinedload(Article.site).load_only(Site.site_name)
+        )
+        .order_by(Article.created_at.desc(), Article.id.desc())
+        .limit(POST_LOG_PAGE_SIZE + 1)
+        .all()
+    )
+    articles = rows[:POST_LOG_PAGE_SIZE]
+    next_cursor = None
+    if len(rows) > POST_LOG_PAGE_SIZE:
+        last = articles[-1]
+        next_cursor = f"{last.created_at.isoformat()}_{last.id}"
 
-    articles = query.order_by(Article.created_at.desc()).all()
+    # 実行待ち・実行中の生成ジョブ（ステップごとの進捗表示用）
+    jobs = (
+        GenerationJob.query
+        .filter(GenerationJob.user_id == current_user.id, GenerationJob.status.in_(["queued", "running"]))
+        .order_by(GenerationJob.id)
+        .all()
+    )
 
-    posted_count = sum(1 for a in articles if a.status == 'posted')
+    posted_count = status_counts.get("posted", 0) if status in (None, "", "posted") else 0
     if posted_count > 0 and posted_count % 10 == 0:
         flash("🎉 10記事の投稿が完了しました！次のジャンルを入力して続きを自動投稿しましょう。")
         return redirect(url_for('main.index'))
@@ -113,7 +164,11 @@ def post_log():
     return render_template(
         "post_log.html",
         articles=articles,
+        jobs=jobs,
         user_sites=user_sites,
+        status_counts=status_counts,
+        next_cursor=next_cursor,
+        is_first_page=cursor is None,
         selected_site_id=site_id,
         selected_status=status
     )
@@ -188,3 +243,78 @@ def delete_sites():
     db.session.commit()
     flash('🗑 登録サイト情報をすべて削除しました。')
     return redirect(url_for('main.index'))
+
+# 📈 Prometheus 用メトリクス（METRICS_DIR を指定すれば全ワーカーの合算＋ジョブキューの深さ）
+@main.route('/metrics')
+def metrics_endpoint():
+    if not metrics.is_authorized(request.remote_addr, request.headers.get("Authorization")):
+        return Response("forbidden\n", status=403, content_type="text/plain")
+    try:
+        for status, count in job_counts().items():
+            metrics.generation_jobs.set(count, status=status)
+    except Exception as e:
+        db.session.rollback()
+        print("⚠️ ジョブ件数の取得エラー:", e)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# 📡 進捗のリアルタイム配信（Server-Sent Events）
+PROGRESS_POLL_SEC = float(os.getenv("PROGRESS_POLL_SEC", "1.0"))  # 新しい投稿ログを確認する間隔
+PROGRESS_STREAM_SEC = float(os.getenv("PROGRESS_STREAM_SEC", "300"))  # 1接続の長さ（切れたらブラウザが自動で再接続）
+PROGRESS_KEEPALIVE_SEC = 15
+PROGRESS_BATCH_SIZE = 100
+# 1接続が gunicorn のスレッドを1つ占有するので、プロセスあたりの同時接続数を抑えて
+# 通常のリクエスト用のスレッドを残す（あふれた接続には再接続の間隔だけ返して閉じる）
+PROGRESS_MAX_STREAMS = int(os.getenv("PROGRESS_MAX_STREAMS", "8"))
+PROGRESS_BUSY_RETRY_MS = 10000
+_progress_streams = threading.BoundedSemaphore(PROGRESS_MAX_STREAMS)
+
+@main.route('/progress/stream')
+@login_required
+def progress_stream():
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if not _progress_streams.acquire(blocking=False):
+        return Response(f"retry: {PROGRESS_BUSY_RETRY_MS}\n\n", mimetype="text/event-stream", headers=headers)
+
+    try:
+        site_ids = user_site_ids(current_user.id)
+        # 再接続時はブラウザが送る Last-Event-ID の続きから、初回は接続以降のイベントだけを送る
+        last_id = request.headers.get("Last-Event-ID", type=int)
+        if last_id is None:
+            last_id = request.args.get("after", type=int)
+        if last_id is None:
+            last_id = latest_event_id()
+        db.session.commit()
+    except Exception:
+        _progress_streams.release()
+        raise
+    cursor = ProgressCursor(last_id)
+
+    def stream():
+        sent_id = last_id
+        started = last_sent = time.monotonic()
+        yield "retry: 3000\n\n"
+        while time.monotonic() - started < PROGRESS_STREAM_SEC:
+            try:
+                events = cursor.fetch(site_ids, limit=PROGRESS_BATCH_SIZE)
+                db.session.commit()  # 待っている間は DB 接続をプールに返す
+            except Exception as e:
+                db.session.rollback()
+                print("⚠️ 進捗イベントの取得エラー:", e)
+                events = []
+
+            for event in events:
+                sent_id = max(sent_id, event["id"])
+                yield format_sse(event, sent_id)
+            if events:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= PROGRESS_KEEPALIVE_SEC:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+            if len(events) < PROGRESS_BATCH_SIZE:
+                time.sleep(PROGRESS_POLL_SEC)
+
+    response = Response(stream_with_context(stream()), mimetype="text/event-stream", headers=headers)
+    # 接続が閉じたら（途中で切れた場合も）枠を返す
+    response.call_on_close(_progress_streams.release)
+    return response
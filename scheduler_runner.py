@@ -1,38 +1,159 @@
 # scheduler_runner.py
+import asyncio
+import os
+import time
 from datetime import datetime
-from models import db, Article, Site
-from wordpress_client import post_to_wordpress
+
+from models import db, Site
+from utils import metrics
+from utils.post_claims import claim_due_articles, renew_claim, finish_claim
+from wordpress_client import AsyncWordPressClient, aclose_async_clients
 from utils.logger import log_article_progress
 
-def run_scheduled_posts():
-    now = datetime.utcnow()
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "100"))  # 1回に読み込む予約記事数
+DISPATCH_MAX_CONCURRENCY = int(os.getenv("DISPATCH_MAX_CONCURRENCY", "32"))  # 全体の同時投稿数
+DISPATCH_MAX_PER_SITE = int(os.getenv("DISPATCH_MAX_PER_SITE", "2"))  # 1サイトあたりの同時投稿数
+POST_DEADLINE_SEC = float(os.getenv("POST_DEADLINE_SEC", "120"))  # 1投稿（画像・カテゴリ含む）の制限時間
+CATEGORY_NAME = "AI記事"
+
+
+def _finish(article_id, site_id, result, error):
+    if not finish_claim(article_id, bool(result)):
+        print(f"⚠️ 記事ID {article_id} の確保が他のプロセスに移っていたため結果を保存しませんでした")
+        return
+    if result:
+        log_article_progress(step="投稿完了", article_id=article_id, site_id=site_id)
+        print(f"✅ 投稿完了（記事ID: {article_id}）")
+    else:
+        log_article_progress(step="投稿失敗", article_id=article_id, site_id=site_id)
+        print(f"❌ 投稿失敗（記事ID: {article_id}）: {error}")
+
+
+async def _post_article(post, client, global_semaphore, site_semaphore):
+    """
+    1記事を投稿する。サイトの枠を先に取るので、遅いサイトが全体の枠を占有しない。
+    """
+    result, error = None, None
+    async with site_semaphore:
+        async with global_semaphore:
+            # 枠を待つ間にリースが切れて他のプロセスに取り直されていたら投稿しない
+            try:
+                if not renew_claim(post["id"]):
+                    print(f"⏭ 記事ID {post['id']} は他のプロセスが投稿します")
+                    return False
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ 確保の延長に失敗（記事ID: {post['id']}）:", e)
+                return False
+            try:
+                result = await asyncio.wait_for(
+                    client.post(
+                        post["title"],
+                        post["content"],
+                        featured_image_url=post["featured_image_url"],
+                        category_name=CATEGORY_NAME,
+                        publish=True
+                    ),
+                    timeout=POST_DEADLINE_SEC
+                )
+                if not result:
+                    error = "WordPress が投稿を受け付けませんでした"
+            except asyncio.TimeoutError:
+                error = f"{POST_DEADLINE_SEC:.0f}秒以内に投稿が完了しませんでした"
+            except Exception as e:
+                error = str(e)
+
+    try:
+        _finish(post["id"], post["site_id"], result, error)
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ 投稿結果の保存に失敗（記事ID: {post['id']}）:", e)
+    return bool(result)
 
-    # スケジュール時刻が現在時刻以前の pending な記事を取得
-    articles = Article.query.filter(
-        Article.status == "scheduled",
-        Article.scheduled_time <= now
-    ).all()
 
-    for article in articles:
-        site = Site.query.get(article.site_id)
-        if not site:
-            continue
+async def dispatch_due_posts(now=None):
+    """
+    予約時刻を過ぎた記事をまとめて確保し、サイトをまたいで並行投稿する。
+    全体・サイトごとの同時実行数を制限し、1投稿ごとに制限時間を設ける。
+    実行中の投稿が DISPATCH_BATCH_SIZE を下回ったら次のバッチを確保する。
+    確保済みの記事は他のプロセスから見えないので、複数のプロセスで同時に実行してよい。
+    """
+    now = now or datetime.utcnow()
+    start = time.monotonic()
+    global_semaphore = asyncio.Semaphore(DISPATCH_MAX_CONCURRENCY)
+    site_semaphores = {}
+    clients = {}  # サイトID → AsyncWordPressClient
+    pending = set()
+    posted = failed = 0
 
-        try:
-            # WordPressに投稿
-            post_to_wordpress(site, article)
+    def tally(done):
+        nonlocal posted, failed
+        for task in done:
+            if task.result():
+                posted += 1
+            else:
+                failed += 1
 
-            # ステータス更新
-            article.status = "posted"
-            db.session.commit()
+    try:
+        while True:
+            with metrics.timed("due_query"):
+                articles = claim_due_articles(DISPATCH_BATCH_SIZE, now=now)
+            if not articles:
+                break
 
-            log_article_progress(site.id, f"✅ 投稿完了（記事ID: {article.id}）")
+            # サイトはバッチごとに1クエリでまとめて取得し、読み込んだ時点でクライアントを作る
+            # （ORM の Site を持ち回ると確保・結果保存のコミットで期限切れになり、投稿ごとに再取得される）
+            missing_site_ids = {article.site_id for article in articles} - set(clients)
+            if missing_site_ids:
+                rows = (
+                    db.session.query(Site.id, Site.wp_url, Site.wp_username, Site.wp_app_password)
+                    .filter(Site.id.in_(missing_site_ids))
+                    .all()
+                )
+                for row in rows:
+                    clients[row.id] = AsyncWordPressClient.for_site(row)
 
-        except Exception as e:
-            article.status = "failed"
-            db.session.commit()
+            for article in articles:
+                client = clients.get(article.site_id)
+                if not client:
+                    _finish(article.id, article.site_id, None, f"サイトID {article.site_id} が見つかりません")
+                    failed += 1
+                    continue
+                post = {
+                    "id": article.id,
+                    "site_id": article.site_id,
+                    "title": article.title,
+                    "content": article.content,
+                    "featured_image_url": article.featured_image_url,
+                }
+                site_semaphore = site_semaphores.setdefault(article.site_id, asyncio.Semaphore(DISPATCH_MAX_PER_SITE))
+                pending.add(asyncio.create_task(_post_article(post, client, global_semaphore, site_semaphore)))
+
+            while len(pending) >= DISPATCH_BATCH_SIZE:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                tally(done)
+
+        if pending:
+            done, pending = await asyncio.wait(pending)
+            tally(done)
+    finally:
+        await aclose_async_clients()
+
+    elapsed = time.monotonic() - start
+    metrics.stage_seconds.observe(elapsed, stage="dispatch", status="ok")
+    print(f"📮 予約投稿: 成功 {posted}件 / 失敗 {failed}件（{len(site_semaphores)}サイト, {elapsed:.1f}秒）")
+    return {"posted": posted, "failed": failed, "sites": len(site_semaphores), "elapsed_sec": round(elapsed, 2)}
+
+
+def run_scheduled_posts():
+    """
+    予約時刻を過ぎた記事を投稿する（アプリケーションコンテキスト内で呼び出す）
+    """
+    return asyncio.run(dispatch_due_posts())
 
-            log_article_progress(site.id, f"❌ 投稿失敗（記事ID: {article.id}）: {str(e)}")
 
 if __name__ == '__main__':
-    run_scheduled_posts()
+    from app_init import create_app
+
+    with create_app(with_scheduler=False).app_context():
+        run_scheduled_posts()
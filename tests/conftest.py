@@ -0,0 +1,53 @@
+# tests/conftest.py
+"""
+テスト用の設定。外部サービスには接続せず、DB は一時ディレクトリの SQLite を使う。
+モジュールが import 時に環境変数を読むので、import より前に設定する。
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.sqlite3')}"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["OPENAI_RATE_LIMIT_STATE"] = os.path.join(_TMP_DIR, "rate_limit.json")
+os.environ["LLM_CACHE_BACKEND"] = "none"
+os.environ["LEADER_LOCK_DIR"] = _TMP_DIR
+os.environ.pop("METRICS_DIR", None)
+
+from app_init import create_app  # noqa: E402
+from models import db, User, Site  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    return create_app(with_scheduler=False)
+
+
+@pytest.fixture
+def session(app):
+    """
+    テストごとに空のテーブルを作り直した DB セッション
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db.session
+        db.session.remove()
+
+
+@pytest.fixture
+def site(session):
+    user = User(email="test@example.com", password_hash="x")
+    session.add(user)
+    session.commit()
+    site = Site(user_id=user.id, site_name="テストサイト", wp_url="http://wp.invalid",
+                wp_username="u", wp_app_password="p")
+    session.add(site)
+    session.commit()
+    return site
@@ -0,0 +1,101 @@
+# tests/test_generation_jobs.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, GenerationJob
+from utils import generation_jobs
+
+
+@pytest.fixture
+def job_id(session, site):
+    return generation_jobs.enqueue_job("健康", site.id, site.user_id)
+
+
+def _job(session, job_id):
+    return session.get(GenerationJob, job_id, populate_existing=True)
+
+
+def _expire_lease(session, job_id):
+    stale = datetime.utcnow() - timedelta(seconds=generation_jobs.JOB_LEASE_SEC + 1)
+    session.execute(db.update(GenerationJob).where(GenerationJob.id == job_id).values(heartbeat_at=stale))
+    session.commit()
+
+
+def test_claim_job_claims_once(session, job_id):
+    assert generation_jobs.claim_job("w1") == job_id
+    assert generation_jobs.claim_job("w2") is None
+
+    job = _job(session, job_id)
+    assert (job.status, job.worker_id, job.attempts) == ("running", "w1", 1)
+
+
+def test_heartbeat_keeps_lease_and_stale_job_is_reclaimed(session, job_id):
+    generation_jobs.claim_job("w1")
+    _expire_lease(session, job_id)
+    generation_jobs.heartbeat([job_id], "w1")
+    assert generation_jobs.claim_job("w2") is None
+
+    _expire_lease(session, job_id)
+    assert generation_jobs.claim_job("w2") == job_id
+    job = _job(session, job_id)
+    assert (job.worker_id, job.attempts) == ("w2", 2)
+
+    # 引き取られた後の元のワーカーのハートビートはリースを延ばさない
+    _expire_lease(session, job_id)
+    generation_jobs.heartbeat([job_id], "w1")
+    assert generation_jobs.claim_job("w3") == job_id
+
+
+def test_job_over_max_attempts_is_failed(session, job_id, monkeypatch):
+    monkeypatch.setattr(generation_jobs, "JOB_MAX_ATTEMPTS", 1)
+    generation_jobs.claim_job("w1")
+    _expire_lease(session, job_id)
+
+    assert generation_jobs.claim_job("w2") is None
+    assert _job(session, job_id).status == "failed"
+
+
+def test_finish_and_fail_only_apply_to_owner(session, job_id):
+    generation_jobs.claim_job("w1")
+    _expire_lease(session, job_id)
+    generation_jobs.claim_job("w2")
+
+    assert generation_jobs.finish_job(job_id, "w1") is False
+    assert generation_jobs._set_job(job_id, "w1", step="scheduling") is False
+    generation_jobs._fail_job(job_id, RuntimeError("古いワーカーの失敗"), "w1")
+    job = _job(session, job_id)
+    assert (job.status, job.worker_id, job.step, job.error) == ("running", "w2", None, None)
+
+    assert generation_jobs.finish_job(job_id, "w2") is True
+    job = _job(session, job_id)
+    assert (job.status, job.step, job.worker_id) == ("done", "done", None)
+    assert job.finished_at is not None
+
+
+def test_failed_job_is_requeued_until_max_attempts(session, job_id, monkeypatch):
+    monkeypatch.setattr(generation_jobs, "JOB_MAX_ATTEMPTS", 2)
+    generation_jobs.claim_job("w1")
+    generation_jobs._fail_job(job_id, RuntimeError("一時的なエラー"), "w1")
+    job = _job(session, job_id)
+    assert (job.status, job.worker_id, job.error) == ("queued", None, "一時的なエラー")
+
+    assert generation_jobs.claim_job("w1") == job_id
+    generation_jobs._fail_job(job_id, RuntimeError("また失敗"), "w1")
+    assert _job(session, job_id).status == "failed"
+
+
+def test_release_jobs_requeues_without_counting_attempt(session, job_id):
+    generation_jobs.claim_job("w1")
+    generation_jobs.release_jobs([job_id], "w2")
+    assert _job(session, job_id).status == "running"
+
+    generation_jobs.release_jobs([job_id], "w1")
+    job = _job(session, job_id)
+    assert (job.status, job.worker_id, job.attempts) == ("queued", None, 0)
+
+
+def test_job_counts(session, site, job_id):
+    generation_jobs.enqueue_job("料理", site.id, site.user_id)
+    generation_jobs.claim_job("w1")
+    assert generation_jobs.job_counts() == {"queued": 1, "running": 1, "done": 0, "failed": 0}
@@ -0,0 +1,62 @@
+# tests/test_keyword_index.py
+from datetime import datetime
+
+from models import Article
+from utils import keyword_index
+from utils.keyword_index import KeywordIndex, filter_new_keywords, jaccard, shingles
+
+
+def test_reordered_words_are_duplicates():
+    index = KeywordIndex(threshold=0.8)
+    index.add("筋トレ 食事 おすすめ")
+    match = index.find_similar("おすすめ　食事、筋トレ")
+    assert match == ("筋トレ 食事 おすすめ", 1.0)
+
+
+def test_standalone_particles_are_ignored():
+    assert shingles("筋トレ の 食事") == shingles("筋トレ 食事")
+
+
+def test_particles_inside_words_are_kept():
+    # 「は」「で」を語の中から消すと、はがき → き、できる → きる になってしまう
+    assert "はが" in shingles("はがき")
+    assert jaccard(shingles("はがき 書き方"), shingles("がき 書き方")) < 0.8
+    assert jaccard(shingles("できる 副業"), shingles("きる 副業")) < 0.8
+
+
+def test_empty_shingles_are_never_duplicates():
+    index = KeywordIndex(threshold=0.8)
+    index.add("の")
+    index.add("")
+    assert len(index) == 0
+    assert index.find_similar("は") is None
+    assert index.find_similar("、") is None
+    assert jaccard(frozenset(), frozenset()) == 0.0
+
+
+def test_filter_new_keywords_against_site_and_batch(session, site):
+    session.add(Article(site_id=site.id, user_id=site.user_id, keyword="筋トレ 食事", title="t",
+                        content="c", status="posted", created_at=datetime.utcnow()))
+    session.commit()
+    keyword_index._site_indexes.clear()
+
+    kept, skipped = filter_new_keywords(site.id, ["食事 筋トレ", "睡眠 改善", "改善 睡眠", "の"])
+
+    assert kept == ["睡眠 改善", "の"]
+    assert [(keyword, similar) for keyword, similar, _ in skipped] == [
+        ("食事 筋トレ", "筋トレ 食事"),
+        ("改善 睡眠", "睡眠 改善"),
+    ]
+
+
+def test_site_index_loads_only_new_articles(session, site):
+    keyword_index._site_indexes.clear()
+    assert len(keyword_index.get_site_index(site.id)) == 0
+
+    session.add(Article(site_id=site.id, user_id=site.user_id, keyword="筋トレ 食事", title="t",
+                        content="c", status="posted", created_at=datetime.utcnow()))
+    session.commit()
+    index = keyword_index.get_site_index(site.id)
+    assert len(index) == 1
+    assert keyword_index.get_site_index(site.id) is index
+    assert len(index) == 1
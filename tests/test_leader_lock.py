@@ -0,0 +1,65 @@
+# tests/test_leader_lock.py
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from models import db
+from utils import leader_lock
+from utils.leader_lock import LeaderLock
+
+
+@pytest.fixture
+def engine(app, tmp_path, monkeypatch):
+    # SQLite なので advisory lock ではなくファイルロックで選出する
+    monkeypatch.setattr(leader_lock, "LOCK_DIR", str(tmp_path))
+    with app.app_context():
+        yield db.engine
+
+
+def test_only_one_holder(engine):
+    first = LeaderLock(engine, "scheduler")
+    second = LeaderLock(engine, "scheduler")
+
+    assert first.acquire() is True
+    assert first.acquire() is True
+    assert second.acquire() is False
+    assert first.check() is True
+    assert second.check() is False
+
+    first.release()
+    assert first.held is False
+    assert second.acquire() is True
+    second.release()
+
+
+def test_different_names_do_not_conflict(engine):
+    scheduler = LeaderLock(engine, "scheduler")
+    other = LeaderLock(engine, "other")
+    assert scheduler.acquire() and other.acquire()
+    scheduler.release()
+    other.release()
+
+
+def test_lock_is_freed_when_holder_process_exits(engine, tmp_path):
+    holder = subprocess.Popen(
+        [sys.executable, "-c", textwrap.dedent(f"""
+            import fcntl, sys
+            f = open({str(tmp_path / "scheduler.lock")!r}, "a+")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            print("locked", flush=True)
+            sys.stdin.read()
+        """)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        lock = LeaderLock(engine, "scheduler")
+        assert lock.acquire() is False
+    finally:
+        holder.kill()
+        holder.wait()
+
+    assert lock.acquire() is True
+    lock.release()
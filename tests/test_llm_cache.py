@@ -0,0 +1,94 @@
+# tests/test_llm_cache.py
+import sqlite3
+import time
+
+import pytest
+
+from utils.llm_cache import LLMCache, MemoryCacheBackend, SQLiteCacheBackend, make_key
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(ttl=3600, max_entries=10):
+        if request.param == "memory":
+            return MemoryCacheBackend(ttl=ttl, max_entries=max_entries)
+        return SQLiteCacheBackend(path=str(tmp_path / "cache.sqlite3"), ttl=ttl, max_entries=max_entries)
+    return make
+
+
+def test_evicts_least_recently_used(make_backend, monkeypatch):
+    backend = make_backend(max_entries=2)
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    backend.set("a", {"content": "A"})
+    clock[0] += 1
+    backend.set("b", {"content": "B"})
+    clock[0] += 1
+    assert backend.get("a") == {"content": "A"}  # a を最近使ったので、追い出されるのは b
+    clock[0] += 1
+    backend.set("c", {"content": "C"})
+
+    assert backend.get("a") == {"content": "A"}
+    assert backend.get("b") is None
+    assert backend.get("c") == {"content": "C"}
+
+
+def test_expired_entries_are_not_returned(make_backend, monkeypatch):
+    backend = make_backend(ttl=60)
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    backend.set("a", {"content": "A"})
+    clock[0] += 59
+    assert backend.get("a") == {"content": "A"}
+    clock[0] += 2
+    assert backend.get("a") is None
+
+
+def test_sqlite_set_removes_expired_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteCacheBackend(path=path, ttl=60, max_entries=10)
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    backend.set("old", {"content": "old"})
+    clock[0] += 120
+    backend.set("new", {"content": "new"})
+
+    with sqlite3.connect(path) as conn:
+        assert [row[0] for row in conn.execute("SELECT key FROM llm_cache")] == ["new"]
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCacheBackend(path=path).set("k", {"content": "v"})
+    assert SQLiteCacheBackend(path=path).get("k") == {"content": "v"}
+
+
+def test_key_depends_on_model_and_sampling():
+    messages = [{"role": "user", "content": "こんにちは"}]
+    key = make_key("gpt-4o", messages, 0.7, 100)
+    assert key == make_key("gpt-4o", list(messages), 0.7, 100)
+    assert key != make_key("gpt-4o-mini", messages, 0.7, 100)
+    assert key != make_key("gpt-4o", messages, 0.2, 100)
+    assert key != make_key("gpt-4o", messages, 0.7, 200)
+
+
+def test_cache_counts_hits_and_survives_backend_errors():
+    class BrokenBackend:
+        def get(self, key):
+            raise OSError("disk full")
+
+        def set(self, key, value):
+            raise OSError("disk full")
+
+    cache = LLMCache(MemoryCacheBackend())
+    cache.set("k", {"content": "v"})
+    assert cache.get("k") == {"content": "v"}
+    assert cache.get("missing") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    broken = LLMCache(BrokenBackend())
+    broken.set("k", {"content": "v"})
+    assert broken.get("k") is None
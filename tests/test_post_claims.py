@@ -0,0 +1,97 @@
+# tests/test_post_claims.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Article
+from utils import post_claims
+
+
+@pytest.fixture
+def schedule(session, site):
+    """
+    予約時刻の一覧から scheduled の記事を作り、記事IDを返す
+    """
+    def make(*scheduled_times):
+        articles = [
+            Article(site_id=site.id, user_id=site.user_id, keyword=f"k{i}", title=f"t{i}", content="c",
+                    status="scheduled", scheduled_time=scheduled_time, created_at=datetime.utcnow())
+            for i, scheduled_time in enumerate(scheduled_times)
+        ]
+        session.add_all(articles)
+        session.commit()
+        return [article.id for article in articles]
+    return make
+
+
+def _article(session, article_id):
+    return session.get(Article, article_id, populate_existing=True)
+
+
+def _expire_claim(session, article_id):
+    stale = datetime.utcnow() - timedelta(seconds=post_claims.POST_LEASE_SEC + 1)
+    session.execute(db.update(Article).where(Article.id == article_id).values(claimed_at=stale))
+    session.commit()
+
+
+def test_claims_due_articles_in_schedule_order(session, schedule):
+    now = datetime.utcnow()
+    later, earlier, future = schedule(now - timedelta(minutes=1), now - timedelta(minutes=5), now + timedelta(hours=1))
+
+    claimed = post_claims.claim_due_articles(10, now=now, worker_id="w1")
+
+    assert [article.id for article in claimed] == [earlier, later]
+    assert all(article.status == "posting" and article.claimed_by == "w1" for article in claimed)
+    assert _article(session, future).status == "scheduled"
+
+
+def test_claimed_articles_are_not_claimed_again(session, schedule):
+    now = datetime.utcnow()
+    ids = schedule(*[now - timedelta(minutes=i) for i in range(5)])
+
+    first = post_claims.claim_due_articles(3, now=now, worker_id="w1")
+    second = post_claims.claim_due_articles(3, now=now, worker_id="w2")
+    third = post_claims.claim_due_articles(3, now=now, worker_id="w3")
+
+    assert len(first) == 3 and len(second) == 2 and third == []
+    assert sorted(article.id for article in first + second) == sorted(ids)
+
+
+def test_stale_claim_is_taken_over(session, schedule):
+    now = datetime.utcnow()
+    article_id, = schedule(now - timedelta(minutes=1))
+    post_claims.claim_due_articles(10, now=now, worker_id="w1")
+
+    assert post_claims.claim_due_articles(10, now=now, worker_id="w2") == []
+    _expire_claim(session, article_id)
+    assert [article.id for article in post_claims.claim_due_articles(10, now=now, worker_id="w2")] == [article_id]
+
+    # 取り直された後は、元のプロセスはリースを延長も完了もできない
+    assert post_claims.renew_claim(article_id, worker_id="w1") is False
+    assert post_claims.finish_claim(article_id, posted=True, worker_id="w1") is False
+    assert _article(session, article_id).status == "posting"
+
+
+def test_renew_claim_extends_the_lease(session, schedule):
+    now = datetime.utcnow()
+    article_id, = schedule(now - timedelta(minutes=1))
+    post_claims.claim_due_articles(10, now=now, worker_id="w1")
+    _expire_claim(session, article_id)
+
+    assert post_claims.renew_claim(article_id, worker_id="w1") is True
+    assert post_claims.claim_due_articles(10, now=now, worker_id="w2") == []
+
+
+def test_finish_claim_records_result(session, schedule):
+    now = datetime.utcnow()
+    posted_id, failed_id = schedule(now - timedelta(minutes=2), now - timedelta(minutes=1))
+    post_claims.claim_due_articles(10, now=now, worker_id="w1")
+
+    assert post_claims.finish_claim(posted_id, posted=True, worker_id="w1") is True
+    assert post_claims.finish_claim(failed_id, posted=False, worker_id="w1") is True
+    assert post_claims.finish_claim(posted_id, posted=False, worker_id="w1") is False
+
+    posted, failed = _article(session, posted_id), _article(session, failed_id)
+    assert (posted.status, failed.status) == ("posted", "failed")
+    assert posted.posted_time is not None and failed.posted_time is None
+    assert post_claims.claim_due_articles(10, now=now, worker_id="w2") == []
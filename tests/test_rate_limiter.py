@@ -0,0 +1,73 @@
+# tests/test_rate_limiter.py
+import pytest
+
+from utils.rate_limiter import RateLimiter, estimate_text_tokens, estimate_tokens, parse_duration
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return RateLimiter(path=str(tmp_path / "limits.json"), rpm=2, tpm=1000, hosts=1)
+
+
+def test_reserve_drains_only_the_models_bucket(limiter):
+    assert limiter.reserve(100, model="gpt-4o") == 0
+    assert limiter.reserve(100, model="gpt-4o") == 0
+    # gpt-4o の1分あたり2リクエストを使い切っても、他のモデルは止まらない
+    assert limiter.reserve(100, model="gpt-4o") > 0
+    assert limiter.reserve(100, model="gpt-4o-mini") == 0
+
+
+def test_token_budget_returns_wait(limiter):
+    assert limiter.reserve(900, model="gpt-4o") == 0
+    wait = limiter.reserve(500, model="gpt-4o")
+    # 足りない 400 トークンが補充されるまで（1000 トークン/分）
+    assert 20 < wait <= 24
+
+
+def test_request_larger_than_bucket_passes_when_full(limiter):
+    assert limiter.reserve(5000, model="gpt-4o") == 0
+
+
+def test_rate_limited_blocks_only_that_model(limiter):
+    wait = limiter.on_rate_limited({"retry-after": "30"}, model="gpt-4o")
+    assert wait == 30
+    assert limiter.reserve(1, model="gpt-4o") > 25
+    assert limiter.reserve(1, model="gpt-4o-mini") == 0
+
+
+def test_rate_limited_without_headers_uses_reset_then_default(limiter):
+    assert limiter.on_rate_limited({"x-ratelimit-reset-tokens": "1m30s"}, model="a") == 90
+    assert limiter.on_rate_limited({}, default_wait=7, model="b") == 7
+
+
+def test_headers_split_limits_across_hosts(tmp_path):
+    limiter = RateLimiter(path=str(tmp_path / "limits.json"), rpm=100, tpm=100000, hosts=4)
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "400",
+        "x-ratelimit-limit-tokens": "8000",
+        "x-ratelimit-remaining-tokens": "10",
+    }, model="gpt-4o")
+    assert limiter.reserve(100, model="gpt-4o") > 0
+    assert limiter.reserve(100, model="gpt-4o-mini") == 0
+
+
+def test_state_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.json")
+    first = RateLimiter(path=path, rpm=1, tpm=1000, hosts=1)
+    second = RateLimiter(path=path, rpm=1, tpm=1000, hosts=1)
+    assert first.reserve(10, model="gpt-4o") == 0
+    assert second.reserve(10, model="gpt-4o") > 0
+
+
+def test_parse_duration():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration("2") == 2
+    assert parse_duration(None) is None
+
+
+def test_estimate_tokens_counts_characters():
+    assert estimate_text_tokens("こんにちは") == 5
+    assert estimate_text_tokens(None) == 0
+    messages = [{"role": "system", "content": "あいう"}, {"role": "user", "content": None}]
+    assert estimate_tokens(messages, 100) == 103
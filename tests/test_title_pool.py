@@ -0,0 +1,74 @@
+# tests/test_title_pool.py
+from datetime import datetime, timedelta
+
+from models import db, TitlePool
+from utils import title_pool
+
+
+def test_take_title_claims_each_title_once(session):
+    assert title_pool.add_titles("筋トレ 食事", ["タイトルA", "タイトルB"], genre="健康") == 2
+
+    taken = {title_pool.take_title("筋トレ　食事", genre="健康") for _ in range(2)}
+    assert taken == {"タイトルA", "タイトルB"}
+    assert title_pool.take_title("筋トレ 食事", genre="健康") is None
+
+
+def test_claim_skips_titles_taken_by_another_process(session):
+    title_pool.add_titles("筋トレ", ["先に使われる", "残り"], genre="健康")
+    first = TitlePool.query.filter_by(title="先に使われる").one()
+    first.used_at = datetime.utcnow()
+    session.commit()
+
+    assert title_pool._claim([first.id]) is None
+    assert title_pool.take_title("筋トレ", genre="健康") == "残り"
+
+
+def test_pool_is_scoped_by_genre(session):
+    title_pool.add_titles("筋トレ", ["健康のタイトル"], genre="健康")
+    assert title_pool.take_title("筋トレ", genre="料理") is None
+    assert title_pool.take_title("筋トレ") is None
+    assert title_pool.take_title("筋トレ", genre="健康") == "健康のタイトル"
+
+
+def test_exact_keyword_is_preferred_over_related(session):
+    title_pool.add_titles("筋トレ 食事 おすすめ", ["関連のタイトル"], genre="健康")
+    title_pool.add_titles("筋トレ 食事", ["同じキーワードのタイトル"], genre="健康")
+
+    assert title_pool.take_title("筋トレ 食事", genre="健康") == "同じキーワードのタイトル"
+    assert title_pool.take_title("筋トレ 食事", genre="健康") == "関連のタイトル"
+
+
+def test_related_match_is_word_prefix_only(session):
+    title_pool.add_titles("筋トレ食事", ["語の途中で一致"], genre="健康")
+    title_pool.add_titles("100%_off セール", ["記号入り"], genre="健康")
+
+    assert title_pool.take_title("筋トレ", genre="健康") is None
+    assert title_pool.take_title("100% off", genre="健康") is None
+    assert title_pool.take_title("100%_off", genre="健康") == "記号入り"
+
+
+def test_add_titles_skips_duplicates_and_respects_cap(session, monkeypatch):
+    monkeypatch.setattr(title_pool, "TITLE_POOL_MAX_PER_KEYWORD", 3)
+
+    assert title_pool.add_titles("筋トレ", ["A", "A", " ", "B"], genre="健康") == 2
+    assert title_pool.add_titles("筋トレ", ["B", "C", "D", "E"], genre="健康") == 1
+    assert sorted(row.title for row in TitlePool.query.all()) == ["A", "B", "C"]
+
+
+def test_expired_titles_are_not_used_and_are_pruned(session):
+    title_pool.add_titles("筋トレ", ["古いタイトル"], genre="健康")
+    expired = datetime.utcnow() - timedelta(days=title_pool.TITLE_POOL_TTL_DAYS + 1)
+    session.execute(db.update(TitlePool).values(created_at=expired))
+    session.commit()
+
+    assert title_pool.keywords_without_titles(["筋トレ"], genre="健康") == ["筋トレ"]
+    assert title_pool.take_title("筋トレ", genre="健康") is None
+    assert title_pool.prune_titles() == 1
+    assert TitlePool.query.count() == 0
+
+
+def test_keywords_without_titles(session):
+    title_pool.add_titles("筋トレ", ["A"], genre="健康")
+    title_pool.add_titles("ダイエット", ["B"], genre="料理")
+
+    assert title_pool.keywords_without_titles(["筋トレ", "ダイエット", "睡眠"], genre="健康") == ["ダイエット", "睡眠"]
@@ -0,0 +1,39 @@
+# utils/async_article_generator.py
+from flask import current_app
+
+from utils import generation_engine
+from utils.logger import log_article_progress
+from utils.scheduler import schedule_posting_for_articles
+
+
+async def _generate_and_schedule(app, genre, site_id, user_id):
+    with app.app_context():
+        log_article_progress(step="🧠 キーワードを生成中…", genre=genre, site_id=site_id)
+
+    result = await generation_engine.generate_batch(app, genre, site_id, user_id)
+
+    # すべて完了後、スケジュール投稿へ移行
+    with app.app_context():
+        log_article_progress(
+            step=f"✅ {len(result['article_ids'])}記事の生成完了。スケジュール投稿を開始します。",
+            genre=genre,
+            site_id=site_id
+        )
+        try:
+            schedule_posting_for_articles(site_id, user_id)
+        except Exception as e:
+            log_article_progress(step=f"❌ スケジュール投稿設定エラー: {str(e)}", site_id=site_id)
+
+    return result
+
+
+# 🔸 記事生成メイン処理
+
+def generate_articles_safely(genre, site_id, user_id, app=None, wait=True):
+    """
+    ジャンルから記事を並行生成し、完了後にスケジュール投稿を設定する。
+    wait=False の場合はエンジンに投入した Future をすぐに返す。
+    """
+    app = app or current_app._get_current_object()
+    future = generation_engine.submit(_generate_and_schedule(app, genre, site_id, user_id))
+    return future.result() if wait else future
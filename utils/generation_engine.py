@@ -0,0 +1,282 @@
+# utils/generation_engine.py
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from article_generator import agenerate_article, aprefill_title_pool, BODY_PLACEHOLDER, TITLE_PLACEHOLDER
+from keywords import agenerate_keywords
+from models import db, Article
+from utils import metrics
+from utils.keyword_index import filter_new_keywords
+from utils.logger import log_article_progress
+from utils.pixabay import prefetch_genre_images
+from utils.title_pool import keywords_without_titles
+
+# 本文の同時生成数の上限（プロセス全体 / ユーザーごと）。
+# タイトル・画像は枠を待たずに先に進めるので、本文の枠が空いたらすぐ次の記事の本文に入れる。
+MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", "8"))
+MAX_CONCURRENCY_PER_USER = int(os.getenv("GENERATION_MAX_CONCURRENCY_PER_USER", "3"))
+# 本文の前（記事の仮登録・タイトル・画像）を進められる記事数のユーザーごとの上限。
+# 本文の枠を確保するまで持ち続けるので、1ユーザーの大量投入で DB・Pixabay を埋め尽くさない。
+MAX_PREPARE_PER_USER = int(os.getenv("GENERATION_MAX_PREPARE_PER_USER", "10"))
+
+# 本文をストリーミングで受信し、途中経過を Article に書き込む
+BODY_STREAMING = os.getenv("BODY_STREAMING", "true").lower() in ("1", "true", "yes")
+
+_loop = None
+_loop_lock = threading.Lock()
+
+# セマフォはエンジンのイベントループ上でのみ生成・使用する
+_global_semaphore = None
+_user_semaphores = {}
+_prepare_semaphores = {}
+
+
+def _get_loop():
+    """
+    プロセスで1つだけのエンジン用イベントループ（専用スレッドで常駐）
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="generation-engine", daemon=True)
+            thread.start()
+    return _loop
+
+
+def submit(coro):
+    """
+    コルーチンをエンジンのイベントループに投入し、concurrent.futures.Future を返す
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def run(coro):
+    """
+    コルーチンをエンジンで実行し、完了まで待って結果を返す
+    """
+    return submit(coro).result()
+
+
+def _semaphores(user_id):
+    global _global_semaphore
+    if _global_semaphore is None:
+        _global_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    if user_id not in _user_semaphores:
+        _user_semaphores[user_id] = asyncio.Semaphore(MAX_CONCURRENCY_PER_USER)
+    return _global_semaphore, _user_semaphores[user_id]
+
+
+class _PrepareSlot:
+    """
+    本文の前の処理の枠（ユーザーごと）。本文の枠を確保した時点か記事の終了時に1回だけ返す。
+    """
+
+    def __init__(self, user_id):
+        if user_id not in _prepare_semaphores:
+            _prepare_semaphores[user_id] = asyncio.Semaphore(MAX_PREPARE_PER_USER)
+        self._semaphore = _prepare_semaphores[user_id]
+        self._held = False
+
+    async def acquire(self):
+        waited = time.monotonic()
+        await self._semaphore.acquire()
+        self._held = True
+        metrics.stage_seconds.observe(time.monotonic() - waited, stage="prepare_wait", status="ok")
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._semaphore.release()
+
+
+@asynccontextmanager
+async def _body_slot(user_id, prepare_slot=None):
+    """
+    本文生成の枠。ユーザー枠 → 全体枠の順に確保する（1ユーザーが全体枠を占有しないように）。
+    確保できたら本文の前の処理の枠を返し、次の記事のタイトル・画像に回す。
+    """
+    global_semaphore, user_semaphore = _semaphores(user_id)
+    waited = time.monotonic()
+    async with user_semaphore, global_semaphore:
+        metrics.stage_seconds.observe(time.monotonic() - waited, stage="body_wait", status="ok")
+        if prepare_slot:
+            prepare_slot.release()
+        yield
+
+
+async def _generate_one(app, keyword, genre, site_id, user_id, job_id=None, article_id=None):
+    """
+    1キーワード分の記事を生成して Article に保存し、記事IDを返す（失敗時は None）。
+    article_id を渡すと、生成途中で止まった Article をその続きから生成する。
+    """
+    prepare_slot = _PrepareSlot(user_id)
+    await prepare_slot.acquire()
+    try:
+        return await _generate_prepared(app, keyword, genre, site_id, user_id, job_id, article_id, prepare_slot)
+    finally:
+        prepare_slot.release()
+
+
+async def _generate_prepared(app, keyword, genre, site_id, user_id, job_id, article_id, prepare_slot):
+    # DB への書き込みは別スレッドで行い、エンジンのイベントループを止めない
+    resumed = bool(article_id)
+    if resumed:
+        print(f"🔁 生成途中の記事を再開します（記事ID: {article_id}）")
+    else:
+        article_id = await asyncio.to_thread(_create_article, app, keyword, genre, site_id, user_id, job_id)
+
+    with app.app_context():
+        metrics.generation_in_flight.inc()
+        try:
+            with metrics.timed("article"):
+                article_data = await agenerate_article(
+                    keyword, article_id=article_id, stream=BODY_STREAMING, genre=genre, resume=resumed,
+                    body_slot=_body_slot(user_id, prepare_slot)
+                )
+        except Exception as e:
+            print(f"❌ 記事生成エラー（{keyword}）:", e)
+            metrics.articles_generated.inc(result="failed")
+            await asyncio.to_thread(_set_article_status, app, article_id, "failed")
+            return None
+        finally:
+            metrics.generation_in_flight.dec()
+
+    if not article_data["body_complete"]:
+        # 途中までの本文は Article に残したまま失敗扱い（resume_article_body で再開できる）
+        print(f"❌ 本文を最後まで生成できませんでした（{keyword}）")
+        metrics.articles_generated.inc(result="incomplete")
+        await asyncio.to_thread(_set_article_status, app, article_id, "failed")
+        return None
+
+    await asyncio.to_thread(_save_article, app, article_id, keyword, genre, article_data)
+    metrics.articles_generated.inc(result="ok")
+    return article_id
+
+
+def _create_article(app, keyword, genre, site_id, user_id, job_id):
+    """
+    🔄 生成中フラグでDBに仮登録（status="generating"）し、記事IDを返す
+    """
+    with app.app_context():
+        article = Article(
+            site_id=site_id,
+            user_id=user_id,
+            keyword=keyword,
+            title=TITLE_PLACEHOLDER,
+            content=BODY_PLACEHOLDER,
+            featured_image_url="",
+            status="generating",
+            created_at=datetime.utcnow(),
+            genre=genre,
+            job_id=job_id
+        )
+        db.session.add(article)
+        db.session.commit()
+        return article.id
+
+
+def _set_article_status(app, article_id, status):
+    with app.app_context():
+        db.session.execute(db.update(Article).where(Article.id == article_id).values(status=status))
+        db.session.commit()
+
+
+def _save_article(app, article_id, keyword, genre, article_data):
+    """
+    🔁 仮登録した記事を生成結果で更新する
+    """
+    with app.app_context():
+        db.session.execute(
+            db.update(Article)
+            .where(Article.id == article_id)
+            .values(
+                title=article_data["title"],
+                content=article_data["content"],
+                featured_image_url=article_data["featured_image_url"],
+                preview_html=article_data["preview_html"],
+                gpt_tokens=article_data["gpt_tokens"],
+                gpt_cost_usd=article_data["gpt_cost_usd"],
+                status="pending"
+            )
+        )
+        db.session.commit()
+
+        log_article_progress(
+            step="記事生成完了",
+            article_id=article_id,
+            genre=genre,
+            keyword=keyword,
+            title=article_data["title"],
+            preview_html=article_data["preview_html"],
+            tokens=article_data["gpt_tokens"],
+            cost_usd=article_data["gpt_cost_usd"]
+        )
+
+
+async def generate_batch(app, genre, site_id, user_id, keywords=None, job_id=None, resume_articles=None):
+    """
+    キーワード生成 → 各キーワードのタイトル・本文・画像を並行実行する。
+    keywords を省略した場合はジャンルから生成する。
+    resume_articles（記事ID → キーワード）の記事は新規作成せず、生成途中から再開する。
+    """
+    resume_articles = resume_articles or {}
+    started = time.monotonic()
+
+    if keywords is None:
+        with app.app_context():
+            keywords = await agenerate_keywords(genre)
+            log_article_progress(
+                step="キーワード取得完了",
+                genre=genre,
+                keyword=", ".join(keywords),
+                site_id=site_id
+            )
+
+    # ✅ サイトの既存記事と近似重複するキーワードは生成しない
+    with app.app_context():
+        keywords, skipped = filter_new_keywords(site_id, keywords)
+        for keyword, similar, similarity in skipped:
+            print(f"⏭ 重複キーワードをスキップ: {keyword}（既存: {similar}, 類似度 {similarity:.2f}）")
+
+    # ✅ タイトルはジャンル単位で1回だけまとめて生成し、各記事はプールから取り出す
+    #    （ジャンルの画像プールの取得も同時に行う）
+    with app.app_context():
+        missing = keywords_without_titles(keywords, genre)
+        prefetch = asyncio.to_thread(prefetch_genre_images, genre)
+        if missing:
+            added, _ = await asyncio.gather(aprefill_title_pool(genre, missing), prefetch)
+            print(f"🗂 タイトルプールに {added} 件追加しました")
+        else:
+            await prefetch
+
+    results = await asyncio.gather(*[
+        _generate_one(app, keyword, genre, site_id, user_id, job_id=job_id)
+        for keyword in keywords
+    ] + [
+        _generate_one(app, keyword, genre, site_id, user_id, job_id=job_id, article_id=article_id)
+        for article_id, keyword in resume_articles.items()
+    ], return_exceptions=True)
+    keywords = keywords + list(resume_articles.values())
+
+    article_ids = []
+    for keyword, result in zip(keywords, results):
+        if isinstance(result, Exception):
+            print(f"❌ 記事保存エラー（{keyword}）:", result)
+        elif result:
+            article_ids.append(result)
+
+    elapsed = time.monotonic() - started
+    per_minute = len(article_ids) / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"🎉 {len(article_ids)} / {len(keywords)} 記事を {elapsed:.1f} 秒で生成（{per_minute:.1f} 記事/分）")
+
+    return {
+        "article_ids": article_ids,
+        "failed": len(keywords) - len(article_ids),
+        "elapsed_sec": elapsed,
+        "articles_per_minute": per_minute
+    }
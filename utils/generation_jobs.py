@@ -0,0 +1,279 @@
+# utils/generation_jobs.py
+import json
+import os
+import socket
+from datetime import datetime, timedelta
+
+from keywords import agenerate_keywords
+from models import db, Article, GenerationJob
+from utils import generation_engine
+from utils.keyword_index import filter_new_keywords
+from utils.logger import log_article_progress
+from utils.scheduler import schedule_posting_for_articles
+
+# ハートビートがこの秒数途切れたジョブは、ワーカーが落ちたとみなして他のワーカーが引き取る
+JOB_LEASE_SEC = int(os.getenv("GENERATION_JOB_LEASE_SEC", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", "3"))
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_job(genre, site_id, user_id):
+    """
+    記事生成ジョブを登録してジョブIDを返す（実行はワーカープロセスが行う）
+    """
+    job = GenerationJob(
+        user_id=user_id,
+        site_id=site_id,
+        genre=genre,
+        status="queued",
+        attempts=0,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+    log_article_progress(step="🕒 記事生成ジョブを登録しました", genre=genre, site_id=site_id)
+    return job.id
+
+
+def start_job(genre, site_id, user_id, step, worker_id=WORKER_ID):
+    """
+    呼び出し元のプロセスがその場で実行するジョブを実行中として登録し、ジョブIDを返す
+    （Batch 生成など）。ハートビートが途切れたら、ワーカーが run_job で続きから引き取る。
+    """
+    now = datetime.utcnow()
+    job = GenerationJob(
+        user_id=user_id,
+        site_id=site_id,
+        genre=genre,
+        status="running",
+        step=step,
+        attempts=1,
+        worker_id=worker_id,
+        heartbeat_at=now,
+        started_at=now,
+        created_at=now
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def finish_job(job_id, worker_id=WORKER_ID):
+    """
+    確保しているジョブを完了にする。他のワーカーに引き取られていれば何もせず False。
+    """
+    result = db.session.execute(
+        db.update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.worker_id == worker_id,
+               GenerationJob.status == "running")
+        .values(step="done", status="done", worker_id=None, finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def job_counts():
+    """
+    状態ごとのジョブ数（キューの深さ）
+    """
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    rows = (
+        db.session.query(GenerationJob.status, db.func.count(GenerationJob.id))
+        .group_by(GenerationJob.status)
+        .all()
+    )
+    counts.update(rows)
+    return counts
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=JOB_LEASE_SEC)
+    return db.or_(
+        GenerationJob.status == "queued",
+        db.and_(GenerationJob.status == "running", GenerationJob.heartbeat_at < stale)
+    )
+
+
+def claim_job(worker_id=WORKER_ID):
+    """
+    実行待ち（またはハートビートが途切れた実行中）のジョブを1件確保してジョブIDを返す。
+    FOR UPDATE SKIP LOCKED で他のワーカーが確保中の行を読み飛ばし、
+    確保自体は条件付き UPDATE で行う（行ロックの無い DB でも二重に確保しない）。
+    """
+    while True:
+        now = datetime.utcnow()
+        job = (
+            GenerationJob.query
+            .filter(_claimable(now))
+            .order_by(GenerationJob.id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if not job:
+            db.session.commit()
+            return None
+
+        if (job.attempts or 0) >= JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = job.error or "再試行回数の上限に達しました"
+            job.finished_at = now
+            db.session.commit()
+            continue
+
+        result = db.session.execute(
+            db.update(GenerationJob)
+            .where(GenerationJob.id == job.id, _claimable(now))
+            .values(
+                status="running",
+                worker_id=worker_id,
+                heartbeat_at=now,
+                attempts=GenerationJob.attempts + 1,
+                started_at=db.func.coalesce(GenerationJob.started_at, now)
+            )
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return job.id
+
+
+def heartbeat(job_ids, worker_id=WORKER_ID):
+    """
+    実行中ジョブのハートビートを更新する
+    """
+    if not job_ids:
+        return
+    db.session.execute(
+        db.update(GenerationJob)
+        .where(GenerationJob.id.in_(list(job_ids)), GenerationJob.worker_id == worker_id,
+               GenerationJob.status == "running")
+        .values(heartbeat_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def release_jobs(job_ids, worker_id=WORKER_ID):
+    """
+    停止するワーカーの実行中ジョブを実行待ちに戻す（すぐに他のワーカーが続きから実行できる）
+    """
+    if not job_ids:
+        return
+    db.session.execute(
+        db.update(GenerationJob)
+        .where(GenerationJob.id.in_(list(job_ids)), GenerationJob.worker_id == worker_id,
+               GenerationJob.status == "running")
+        .values(status="queued", worker_id=None, attempts=GenerationJob.attempts - 1)
+    )
+    db.session.commit()
+
+
+def _set_job(job_id, worker_id=WORKER_ID, **values):
+    """
+    確保しているジョブだけを更新する（リースが切れて他のワーカーに引き取られていれば何もしない）
+    """
+    result = db.session.execute(
+        db.update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.worker_id == worker_id)
+        .values(**values)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+async def _job_keywords(job):
+    """
+    ジョブの生成対象キーワード。一度決まったらジョブに保存し、再実行でも作り直さない。
+    """
+    if job.keywords is not None:
+        return json.loads(job.keywords)
+
+    _set_job(job.id, step="keywords")
+    log_article_progress(step="🧠 キーワードを生成中…", genre=job.genre, site_id=job.site_id)
+    keywords = await agenerate_keywords(job.genre)
+    if not keywords:
+        raise RuntimeError("キーワードを生成できませんでした")
+
+    # ✅ サイトの既存記事と近似重複するキーワードは生成しない
+    keywords, skipped = filter_new_keywords(job.site_id, keywords)
+    for keyword, similar, similarity in skipped:
+        print(f"⏭ 重複キーワードをスキップ: {keyword}（既存: {similar}, 類似度 {similarity:.2f}）")
+
+    _set_job(job.id, keywords=json.dumps(keywords, ensure_ascii=False))
+    log_article_progress(
+        step="キーワード取得完了",
+        genre=job.genre,
+        keyword=", ".join(keywords),
+        site_id=job.site_id
+    )
+    return keywords
+
+
+async def run_job(app, job_id):
+    """
+    ジョブを実行する（キーワード → 記事生成 → 投稿スケジュール）。
+    途中で止まったジョブは、記事の無いキーワードだけを生成し、
+    generating のまま残った記事は保存済みのタイトル・本文の続きから再開する。
+    """
+    with app.app_context():
+        job = db.session.get(GenerationJob, job_id)
+        genre, site_id, user_id = job.genre, job.site_id, job.user_id
+        try:
+            keywords = await _job_keywords(job)
+
+            _set_job(job_id, step="articles")
+            articles = Article.query.filter_by(job_id=job_id).all()
+            started = {article.keyword for article in articles}
+            resume_articles = {article.id: article.keyword for article in articles if article.status == "generating"}
+            remaining = [keyword for keyword in keywords if keyword not in started]
+        except Exception as e:
+            db.session.rollback()
+            return _fail_job(job_id, e)
+
+    try:
+        result = await generation_engine.generate_batch(
+            app, genre, site_id, user_id,
+            keywords=remaining, job_id=job_id, resume_articles=resume_articles
+        )
+    except Exception as e:
+        with app.app_context():
+            return _fail_job(job_id, e)
+
+    with app.app_context():
+        _set_job(job_id, step="scheduling")
+        log_article_progress(
+            step=f"✅ {len(result['article_ids'])}記事の生成完了。スケジュール投稿を開始します。",
+            genre=genre,
+            site_id=site_id
+        )
+        try:
+            schedule_posting_for_articles(site_id, user_id)
+        except Exception as e:
+            db.session.rollback()
+            log_article_progress(step=f"❌ スケジュール投稿設定エラー: {str(e)}", site_id=site_id)
+
+        if not finish_job(job_id):
+            print(f"⚠️ ジョブ {job_id} は他のワーカーに引き取られていたため完了にしませんでした")
+    return result
+
+
+def _fail_job(job_id, error, worker_id=WORKER_ID):
+    """
+    失敗したジョブを実行待ちに戻す（上限回数に達していれば failed にする）
+    """
+    print(f"❌ 記事生成ジョブ {job_id} 失敗:", error)
+    job = db.session.get(GenerationJob, job_id, with_for_update=True, populate_existing=True)
+    if job.worker_id != worker_id:
+        db.session.rollback()
+        print(f"⚠️ ジョブ {job_id} は他のワーカーに引き取られていたため失敗にしませんでした")
+        return None
+    job.error = str(error)
+    job.worker_id = None
+    if (job.attempts or 0) >= JOB_MAX_ATTEMPTS:
+        job.status = "failed"
+        job.finished_at = datetime.utcnow()
+    else:
+        job.status = "queued"
+    db.session.commit()
+    log_article_progress(step=f"❌ 記事生成ジョブ失敗: {str(error)[:60]}", genre=job.genre, site_id=job.site_id)
+    return None
@@ -0,0 +1,159 @@
+# utils/keyword_index.py
+import os
+import random
+import re
+import threading
+import zlib
+
+from models import db, Article
+
+# この類似度（Jaccard）以上のキーワードは重複とみなす
+DUPLICATE_THRESHOLD = float(os.getenv("KEYWORD_DUP_THRESHOLD", "0.8"))
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20250404)  # プロセス間で同じハッシュ関数にする
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# 語の区切りとみなす空白・記号
+_SPLIT_RE = re.compile(r"[\s　、。・,.!?！？「」『』()（）]+")
+# 単独の語になっている助詞（「筋トレ の 食事」など）は除く。語の中の文字（はがき の「は」など）は消さない
+_PARTICLES = frozenset(["の", "は", "が", "を", "に", "で", "と", "へ", "や", "も", "から", "まで", "より"])
+
+
+def shingles(keyword):
+    """
+    語順の違いを吸収するため、語そのものと語ごとの文字2-gram の集合にする（単独の助詞の語は除く）。
+    語そのものも入れるので、1文字違いの別の語（はがき / がき）は似ているとはみなさない。
+    """
+    result = set()
+    for word in _SPLIT_RE.split((keyword or "").lower()):
+        if not word or word in _PARTICLES:
+            continue
+        result.add(word)
+        for i in range(len(word) - 1):
+            result.add(word[i:i + 2])
+    return frozenset(result)
+
+
+def minhash(shingle_set):
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set]
+    if not hashes:
+        return (0,) * NUM_PERM
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a, b):
+    """
+    shingle 集合の Jaccard 係数（どちらかが空なら比べようがないので 0）
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class KeywordIndex:
+    """
+    MinHash + LSH によるキーワードの近似重複インデックス。
+    候補はバンドのバケットから引き、最終判定は shingle 集合の Jaccard で行う。
+    """
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._shingles = []
+        self._keywords = []
+        self._buckets = [dict() for _ in range(BANDS)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keywords)
+
+    def _bands(self, signature):
+        return [signature[i * ROWS:(i + 1) * ROWS] for i in range(BANDS)]
+
+    def add(self, keyword):
+        shingle_set = shingles(keyword)
+        if not shingle_set:
+            return  # 記号・助詞だけのキーワードは何とも重複させない
+        bands = self._bands(minhash(shingle_set))
+        with self._lock:
+            position = len(self._keywords)
+            self._keywords.append(keyword)
+            self._shingles.append(shingle_set)
+            for bucket, band in zip(self._buckets, bands):
+                bucket.setdefault(band, []).append(position)
+
+    def find_similar(self, keyword, threshold=None):
+        """
+        しきい値以上に似た登録済みキーワードと類似度を返す（なければ None）
+        """
+        threshold = self.threshold if threshold is None else threshold
+        shingle_set = shingles(keyword)
+        if not shingle_set:
+            return None
+        bands = self._bands(minhash(shingle_set))
+        with self._lock:
+            candidates = set()
+            for bucket, band in zip(self._buckets, bands):
+                candidates.update(bucket.get(band, ()))
+
+            best = None
+            for position in candidates:
+                similarity = jaccard(shingle_set, self._shingles[position])
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (self._keywords[position], similarity)
+        return best
+
+
+class _SiteIndex(KeywordIndex):
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        super().__init__(threshold)
+        self.last_article_id = 0
+        self.load_lock = threading.Lock()
+
+
+_site_indexes = {}
+_registry_lock = threading.Lock()
+
+
+def get_site_index(site_id):
+    """
+    サイトのインデックスを返す。前回以降に追加された Article だけを読み込む。
+    """
+    with _registry_lock:
+        index = _site_indexes.setdefault(site_id, _SiteIndex())
+
+    with index.load_lock:
+        rows = (
+            db.session.query(Article.id, Article.keyword)
+            .filter(Article.site_id == site_id, Article.id > index.last_article_id)
+            .order_by(Article.id)
+            .all()
+        )
+        for row in rows:
+            index.add(row.keyword)
+            index.last_article_id = row.id
+    return index
+
+
+def filter_new_keywords(site_id, keywords, threshold=None):
+    """
+    サイトの既存記事・候補同士と近似重複するキーワードを除く。
+    (残すキーワード, [(除外キーワード, 類似する既存キーワード, 類似度)]) を返す。
+    """
+    site_index = get_site_index(site_id)
+    threshold = site_index.threshold if threshold is None else threshold
+    accepted = KeywordIndex(threshold)
+
+    kept, skipped = [], []
+    for keyword in keywords:
+        match = site_index.find_similar(keyword, threshold) or accepted.find_similar(keyword, threshold)
+        if match:
+            skipped.append((keyword, match[0], match[1]))
+            continue
+        accepted.add(keyword)
+        kept.append(keyword)
+    return kept, skipped
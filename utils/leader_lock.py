@@ -0,0 +1,98 @@
+# utils/leader_lock.py
+"""
+複数プロセス（gunicorn の各ワーカー・複数 dyno）の中から1つだけを選ぶためのロック。
+PostgreSQL ではセッション単位の advisory lock を専用の接続で保持するので、
+プロセスが落ちて接続が切れればロックも外れ、他のプロセスが引き継げる。
+advisory lock の無い DB（開発用の SQLite）では同一ホスト内のファイルロックで代用する。
+"""
+import fcntl
+import os
+import zlib
+
+from sqlalchemy import text
+
+LOCK_DIR = os.getenv("LEADER_LOCK_DIR", "/tmp")
+
+
+class LeaderLock:
+    """
+    acquire() で取得を試み（待たない）、取れたら release() まで保持する
+    """
+
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.name = name
+        # advisory lock のキーは bigint なので名前から決める
+        self.key = zlib.crc32(name.encode("utf-8"))
+        self._connection = None
+        self._file = None
+
+    @property
+    def held(self):
+        return self._connection is not None or self._file is not None
+
+    def acquire(self):
+        if self.held:
+            return True
+        if self.engine.dialect.name == "postgresql":
+            return self._acquire_advisory()
+        return self._acquire_file()
+
+    def _acquire_advisory(self):
+        connection = self.engine.connect()
+        try:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _acquire_file(self):
+        f = open(os.path.join(LOCK_DIR, f"{self.name}.lock"), "a+")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def check(self):
+        """
+        保持しているロックがまだ有効か確かめる（DB の接続が切れていればロックも失っている）
+        """
+        if self._connection is None:
+            return self._file is not None
+        try:
+            self._connection.execute(text("SELECT 1")).scalar()
+            self._connection.commit()
+            return True
+        except Exception as e:
+            print("⚠️ リーダーロックの接続が切れました:", e)
+            self._close_connection()
+            return False
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+                self._connection.commit()
+            except Exception:
+                pass
+            self._close_connection()
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def _close_connection(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
@@ -1,42 +1,206 @@
 # utils/logger.py
 
 from models import db, Article, PostLog
+from utils import metrics
 from flask import current_app
 from datetime import datetime
+from collections import deque
+import atexit
+import os
+import threading
 import traceback
 
-def log_article_progress(step: str, article_id: int = None, genre: str = None, keyword: str = None, 
-                         title: str = None, preview_html: str = None, tokens: int = None, cost_usd: float = None):
+# ログはプロセス内にためて、件数・時間ごとにまとめて書き込む
+POST_LOG_BUFFERED = os.getenv("POST_LOG_BUFFERED", "true").lower() in ("1", "true", "yes")
+POST_LOG_FLUSH_SIZE = int(os.getenv("POST_LOG_FLUSH_SIZE", "100"))
+POST_LOG_FLUSH_SEC = float(os.getenv("POST_LOG_FLUSH_SEC", "1.0"))
+POST_LOG_MAX_BUFFER = int(os.getenv("POST_LOG_MAX_BUFFER", "10000"))  # 超えた分は古いものから捨てる
+
+
+# PostLog の文字列カラムの長さ（超える値は切り詰めてから書き込む）
+_LOG_COLUMN_LENGTHS = {"step": 100, "genre": 100, "keyword": 255, "title": 300}
+
+
+def _truncate(field, value):
+    limit = _LOG_COLUMN_LENGTHS[field]
+    return value[:limit] if isinstance(value, str) else value
+
+
+def _build_rows(entries):
     """
-    記事の生成・投稿ステップをログに記録し、必要に応じてArticleテーブルも更新
+    ためたログから PostLog の INSERT 行と Article の UPDATE 行を作る。
+    記事の情報は1クエリでまとめて読む。
     """
-    try:
-        article = Article.query.get(article_id) if article_id else None
+    article_ids = {entry["article_id"] for entry in entries if entry["article_id"]}
+    articles = {}
+    if article_ids:
+        rows = db.session.query(
+            Article.id, Article.site_id, Article.genre, Article.keyword, Article.title
+        ).filter(Article.id.in_(article_ids)).all()
+        articles = {row.id: row for row in rows}
+
+    logs, updates = [], []
+    for entry in entries:
+        article = articles.get(entry["article_id"])
 
         # Article に情報を追記
         if article:
-            if genre:
-                article.genre = genre
-            if preview_html:
-                article.preview_html = preview_html
-            if tokens is not None:
-                article.gpt_tokens = tokens
-            if cost_usd is not None:
-                article.gpt_cost_usd = cost_usd
-            article.posted_time = datetime.utcnow()
-            db.session.add(article)
-
-        # PostLog を新規作成
-        log = PostLog(
-            article_id=article.id if article else None,
-            step=step,
-            genre=genre or (article.genre if article else None),
-            keyword=keyword or (article.keyword if article else None),
-            title=title or (article.title if article else None),
-            created_at=datetime.utcnow()
-        )
-        db.session.add(log)
-        db.session.commit()
+            values = {"id": article.id, "posted_time": entry["created_at"]}
+            for field in ("genre", "preview_html", "gpt_tokens", "gpt_cost_usd"):
+                if entry[field] is not None:
+                    values[field] = entry[field]
+            if "genre" in values:
+                values["genre"] = _truncate("genre", values["genre"])
+            updates.append(values)
+
+        logs.append({
+            "article_id": article.id if article else None,
+            "site_id": entry["site_id"] or (article.site_id if article else None),
+            "step": _truncate("step", entry["step"]),
+            "genre": _truncate("genre", entry["genre"] or (article.genre if article else None)),
+            "keyword": _truncate("keyword", entry["keyword"] or (article.keyword if article else None)),
+            "title": _truncate("title", entry["title"] or (article.title if article else None)),
+            "created_at": entry["created_at"]
+        })
+    return logs, updates
+
+
+def _insert_rows(entries):
+    """
+    PostLog は一括 INSERT、Article は主キー指定の一括 UPDATE で1トランザクションに書き込む
+    """
+    logs, updates = _build_rows(entries)
+    db.session.execute(db.insert(PostLog), logs)
+    if updates:
+        db.session.execute(db.update(Article), updates)
+    db.session.commit()
+
+
+def _write_entries(app, entries):
+    """
+    ためたログを1トランザクションで書き込む。
+    失敗した場合は1件ずつ書き直し、それでも書けないログだけを捨てる（post_log_dropped_total）。
+    """
+    with app.app_context():
+        try:
+            with metrics.timed("post_log_flush"):
+                _insert_rows(entries)
+            return
+        except Exception:
+            db.session.rollback()
+            if len(entries) == 1:
+                metrics.post_log_dropped.inc(reason="write_error")
+                app.logger.error("❌ ログ記録に失敗しました:")
+                app.logger.error(traceback.format_exc())
+                return
+            app.logger.warning(f"⚠️ ログの一括記録に失敗したため1件ずつ記録します（{len(entries)}件）")
+
+        failed = 0
+        for entry in entries:
+            try:
+                _insert_rows([entry])
+            except Exception:
+                db.session.rollback()
+                failed += 1
+                app.logger.error(f"❌ ログ記録に失敗しました（{entry['step']}）:")
+                app.logger.error(traceback.format_exc())
+        if failed:
+            metrics.post_log_dropped.inc(failed, reason="write_error")
+
+
+class PostLogBuffer:
+    """
+    PostLog の書き込みバッファ。呼び出し側はためるだけで待たず、
+    バックグラウンドスレッドが FLUSH_SIZE 件ごと・FLUSH_SEC 秒ごと・終了時に書き込む。
+    """
+
+    def __init__(self, flush_size=POST_LOG_FLUSH_SIZE, flush_sec=POST_LOG_FLUSH_SEC, max_size=POST_LOG_MAX_BUFFER):
+        self.flush_size = flush_size
+        self.flush_sec = flush_sec
+        self._entries = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def append(self, app, entry):
+        with self._lock:
+            if len(self._entries) == self._entries.maxlen:
+                self.dropped += 1
+                metrics.post_log_dropped.inc(reason="overflow")
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    print(f"⚠️ 投稿ログのバッファがあふれたため古いログを捨てました（累計{self.dropped}件）")
+            self._entries.append((app, entry))
+            full = len(self._entries) >= self.flush_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="post-log-writer", daemon=True)
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_sec)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        たまっているログをすべて書き込む
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = list(self._entries)
+                self._entries.clear()
+            if not pending:
+                return 0
+
+            by_app = {}
+            for app, entry in pending:
+                by_app.setdefault(app, []).append(entry)
+            for app, entries in by_app.items():
+                _write_entries(app, entries)
+            return len(pending)
+
+
+_buffer = PostLogBuffer()
+atexit.register(_buffer.flush)
+metrics.post_log_buffer.set_function(lambda: len(_buffer._entries))
+
+
+def flush_logs():
+    """
+    バッファ中のログをすぐに書き込む（バッチ処理の終了時など）
+    """
+    return _buffer.flush()
+
+
+def log_article_progress(step: str, article_id: int = None, genre: str = None, keyword: str = None,
+                         title: str = None, preview_html: str = None, tokens: int = None, cost_usd: float = None,
+                         site_id: int = None):
+    """
+    記事の生成・投稿ステップをログに記録し、必要に応じてArticleテーブルも更新。
+    書き込みはバッファ経由でまとめて行う（POST_LOG_BUFFERED=false なら即時）。
+    """
+    try:
+        entry = {
+            "step": step,
+            "article_id": article_id,
+            "site_id": site_id,
+            "genre": genre,
+            "keyword": keyword,
+            "title": title,
+            "preview_html": preview_html,
+            "gpt_tokens": tokens,
+            "gpt_cost_usd": cost_usd,
+            "created_at": datetime.utcnow()
+        }
+        app = current_app._get_current_object()
+        if POST_LOG_BUFFERED:
+            _buffer.append(app, entry)
+        else:
+            _write_entries(app, [entry])
 
     except Exception as e:
         current_app.logger.error("❌ ログ記録に失敗しました:")
@@ -0,0 +1,52 @@
+# utils/media_cache.py
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, MediaCache
+
+
+def _normalize(site_url):
+    return (site_url or "").rstrip("/")
+
+
+def find_by_source(site_url, source_url):
+    """
+    同じ画像URLをこのサイトにアップロード済みならメディアIDを返す
+    """
+    row = MediaCache.query.filter_by(site_url=_normalize(site_url), source_url=source_url).first()
+    return row.media_id if row else None
+
+
+def find_by_hash(site_url, content_hash):
+    """
+    同じ内容の画像をこのサイトにアップロード済みならメディアIDを返す
+    """
+    row = MediaCache.query.filter_by(site_url=_normalize(site_url), content_hash=content_hash).first()
+    return row.media_id if row else None
+
+
+def remember(site_url, content_hash, media_id, source_url=None, content_type=None):
+    """
+    アップロードしたメディアを記録（並行アップロードで先に記録されていれば何もしない）
+    """
+    db.session.add(MediaCache(
+        site_url=_normalize(site_url),
+        content_hash=content_hash,
+        media_id=media_id,
+        source_url=source_url,
+        content_type=content_type,
+        created_at=datetime.utcnow()
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+
+def forget(site_url, media_id):
+    """
+    WordPress 側で削除されたメディアをキャッシュから外す
+    """
+    MediaCache.query.filter_by(site_url=_normalize(site_url), media_id=media_id).delete()
+    db.session.commit()
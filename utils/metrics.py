@@ -0,0 +1,399 @@
+# utils/metrics.py
+"""
+処理ステージごとのレイテンシ・件数を集計し、Prometheus のテキスト形式で出力する。
+値はプロセスごとに持つので、Web は /metrics、ワーカーは METRICS_PORT で公開する。
+METRICS_DIR を指定すると各プロセスが値を定期的にそのディレクトリへ書き出し、
+出力時に同じディレクトリのプロセス（gunicorn の全ワーカーなど）の値を合算する。
+終了したプロセスの値は合算から外してファイルも消す（カウンターはリセットとして扱われる）。
+"""
+import atexit
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+# .envの読み込み
+load_dotenv()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SEC = float(os.getenv("METRICS_FLUSH_SEC", "5"))
+
+# /metrics を見られるのは METRICS_TOKEN（Bearer）を付けたリクエストか、許可したアドレスからのみ
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOWED_IPS = [
+    ipaddress.ip_network(value.strip(), strict=False)
+    for value in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if value.strip()
+]
+
+# 秒単位のバケット（DB書き込み〜本文生成まで）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ラベルは {self.labelnames} を指定してください（{tuple(labels)}）")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _raw(self):
+        with self._lock:
+            return dict(self._values)
+
+    def _merge(self, snapshots):
+        """
+        プロセスごとの値 [{ラベル: 値}, ...] を合算する
+        """
+        merged = {}
+        for values in snapshots:
+            for key, value in values.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def _samples(self, values=None):
+        values = self._raw() if values is None else values
+        return [(self.name, key, [], value) for key, value in values.items()]
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples(values):
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    set() で値を置くか、set_function() で出力時に値（ラベル → 値の dict も可）を計算する。
+    複数プロセスの値は multiprocess_mode（"sum" / "max"）でまとめる。
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode="sum"):
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        self._function = function
+
+    def _raw(self):
+        if self._function is None:
+            return super()._raw()
+        try:
+            value = self._function()
+        except Exception as e:
+            print(f"⚠️ メトリクス {self.name} の取得エラー:", e)
+            return {}
+        if isinstance(value, dict):
+            return {key if isinstance(key, tuple) else (key,): v for key, v in value.items()}
+        return {(): value}
+
+    def _merge(self, snapshots):
+        merged = {}
+        for values in snapshots:
+            for key, value in values.items():
+                if key not in merged:
+                    merged[key] = value
+                elif self.multiprocess_mode == "max":
+                    merged[key] = max(merged[key], value)
+                else:
+                    merged[key] += value
+        return merged
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _raw(self):
+        with self._lock:
+            return {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+    def _merge(self, snapshots):
+        merged = {}
+        for values in snapshots:
+            for key, (counts, total) in values.items():
+                merged_counts, merged_total = merged.get(key, ([0] * len(self.buckets), 0.0))
+                merged[key] = ([a + b for a, b in zip(merged_counts, counts)], merged_total + total)
+        return merged
+
+    def _samples(self, values=None):
+        values = self._raw() if values is None else values
+        samples = []
+        for key, (counts, total) in values.items():
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", key, [("le", _format_value(float(bound)))], count))
+            samples.append((f"{self.name}_count", key, [], counts[-1]))
+            samples.append((f"{self.name}_sum", key, [], total))
+        return samples
+
+
+class _Timer:
+    """
+    with ブロックの所要時間を記録する（例外で抜けたら status="error"）
+    """
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = dict(self.labels)
+        if "status" in self.histogram.labelnames and "status" not in labels:
+            labels["status"] = "error" if exc_type else "ok"
+        self.histogram.observe(time.perf_counter() - self.started, **labels)
+        return False
+
+
+# ---- 複数プロセスの合算（METRICS_DIR） ----
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def write_snapshot():
+    """
+    このプロセスの値を METRICS_DIR/<pid>.json に書き出す（一時ファイルから置き換える）
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    snapshot = {metric.name: [[list(key), value] for key, value in metric._raw().items()] for metric in metrics}
+    path = _snapshot_path(os.getpid())
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_snapshot(pid):
+    try:
+        os.remove(_snapshot_path(pid))
+    except OSError:
+        pass
+
+
+def _read_snapshots():
+    """
+    METRICS_DIR の生きているプロセスの値を [{メトリクス名: {ラベル: 値}}, ...] で返す
+    （終了したプロセスのファイルは消す。残すとワーカーの入れ替えのたびに増え続ける）
+    """
+    snapshots = []
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            pid = int(filename[:-len(".json")])
+        except ValueError:
+            continue
+        if not _is_alive(pid):
+            _remove_snapshot(pid)
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            continue
+        snapshots.append({
+            name: {tuple(key): value for key, value in samples} for name, samples in raw.items()
+        })
+    return snapshots
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SEC)
+        try:
+            write_snapshot()
+        except Exception as e:
+            print("⚠️ メトリクスの書き出しエラー:", e)
+
+
+def _start_snapshot_writer():
+    threading.Thread(target=_snapshot_loop, name="metrics-snapshot", daemon=True).start()
+
+
+if METRICS_DIR:
+    _start_snapshot_writer()
+    os.register_at_fork(after_in_child=_start_snapshot_writer)  # gunicorn の --preload でも各ワーカーで書き出す
+    atexit.register(lambda: _remove_snapshot(os.getpid()))
+
+
+def render():
+    """
+    登録済みの全メトリクスを Prometheus のテキスト形式で返す
+    （METRICS_DIR を指定していれば全プロセスの合算）
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    snapshots = None
+    if METRICS_DIR:
+        write_snapshot()
+        snapshots = _read_snapshots()
+
+    lines = []
+    for metric in metrics:
+        values = None
+        if snapshots is not None:
+            values = metric._merge([values.get(metric.name, {}) for values in snapshots])
+        lines.extend(metric.render(values))
+    return "\n".join(lines) + "\n"
+
+
+def is_authorized(remote_addr, authorization=None):
+    """
+    /metrics を返してよいリクエストか（METRICS_TOKEN の Bearer トークンか、METRICS_ALLOWED_IPS のアドレス）
+    """
+    if METRICS_TOKEN and authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.strip(), METRICS_TOKEN):
+            return True
+    try:
+        address = ipaddress.ip_address(remote_addr or "")
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOWED_IPS)
+
+
+# ---- パイプライン共通のメトリクス ----
+
+stage_seconds = Histogram(
+    "pipeline_stage_seconds", "処理ステージごとの所要時間（秒）", ["stage", "status"]
+)
+openai_request_seconds = Histogram(
+    "openai_request_seconds", "OpenAI API 呼び出しの所要時間（秒）", ["model", "mode", "status"]
+)
+openai_tokens = Counter("openai_tokens_total", "OpenAI API の消費トークン数", ["model", "type"])
+openai_retries = Counter("openai_retries_total", "OpenAI API の再試行回数", ["model", "error"])
+model_fallbacks = Counter("model_fallbacks_total", "失敗して次のモデルに切り替えた回数", ["stage", "model"])
+generation_cost = Counter("generation_cost_usd_total", "記事生成の推定 API コスト（USD）")
+articles_generated = Counter("articles_generated_total", "記事生成の件数", ["result"])
+wordpress_posts = Counter("wordpress_posts_total", "WordPress への投稿件数", ["result"])
+cache_requests = Counter(
+    "cache_requests_total", "キャッシュ（LLM・Pixabay・メディア・ターム）の参照回数", ["cache", "result"]
+)
+generation_in_flight = Gauge("generation_in_flight", "生成中の記事数（このプロセス）")
+generation_jobs = Gauge(
+    "generation_jobs", "状態ごとの記事生成ジョブ数（キューの深さ）", ["status"], multiprocess_mode="max"
+)
+post_log_buffer = Gauge("post_log_buffer_size", "書き込み待ちの投稿ログ件数")
+post_log_dropped = Counter("post_log_dropped_total", "書き込めずに捨てた投稿ログ件数", ["reason"])
+
+
+def timed(stage):
+    """
+    with metrics.timed("title"): ... の形でステージの所要時間を記録する（async の中でも使える）
+    """
+    return stage_seconds.time(stage=stage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if not is_authorized(self.client_address[0], self.headers.get("Authorization")):
+            self.send_error(403)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, addr="0.0.0.0"):
+    """
+    Flask を持たないプロセス（ワーカー）用に /metrics を返す HTTP サーバーを別スレッドで起動する
+    """
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 メトリクスを :{port}/metrics で公開しています")
+    return server
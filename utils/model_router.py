@@ -0,0 +1,256 @@
+# utils/model_router.py
+"""
+処理ステージ（キーワード・タイトル・本文）ごとに、使うモデル・max_tokens・タイムアウトを決める。
+ステージごとにモデルのフォールバック順を持ち、直近の p95 レイテンシかエラー率が
+しきい値を超えたモデルは後回しにして次のモデルで呼び出す。
+遅くなったモデルには新しい呼び出しが行かないので、時間が経って記録が消えると元のモデルに戻る。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+from utils import metrics
+from utils.openai_client import (
+    DEFAULT_MODEL, MAX_RETRIES,
+    chat_completion, achat_completion, stream_chat_completion, astream_chat_completion
+)
+
+# .envの読み込み
+load_dotenv()
+
+# ステージごとの既定ルート。MODEL_ROUTES（JSON）でステージ単位に上書きできる。
+#   例: MODEL_ROUTES='{"body": {"models": ["gpt-4o", "gpt-4o-mini"], "timeout": 90}}'
+DEFAULT_ROUTES = {
+    # 短い出力で済むステージは速いモデルから
+    "keywords": {"models": ["gpt-4o-mini", "gpt-3.5-turbo", "gpt-4"], "max_tokens": 300,
+                 "timeout": 20, "p95_sec": 10, "max_error_rate": 0.3},
+    "title": {"models": ["gpt-4o-mini", "gpt-3.5-turbo", "gpt-4"], "max_tokens": 500,
+              "timeout": 20, "p95_sec": 10, "max_error_rate": 0.3},
+    "title_batch": {"models": ["gpt-4o-mini", "gpt-4"], "max_tokens": 4000,
+                    "timeout": 90, "p95_sec": 60, "max_error_rate": 0.3},
+    "body": {"models": ["gpt-4", "gpt-4o", "gpt-4o-mini"], "max_tokens": 2000,
+             "timeout": 120, "p95_sec": 90, "max_error_rate": 0.3},
+    # 見出しごとの並行生成（article_generator の BODY_SECTIONS）
+    "outline": {"models": ["gpt-4o-mini", "gpt-4o", "gpt-4"], "max_tokens": 300,
+                "timeout": 20, "p95_sec": 10, "max_error_rate": 0.3},
+    "section": {"models": ["gpt-4", "gpt-4o", "gpt-4o-mini"], "max_tokens": 800,
+                "timeout": 60, "p95_sec": 40, "max_error_rate": 0.3},
+}
+
+# 直近 HEALTH_WINDOW_SEC 秒の呼び出しが HEALTH_MIN_SAMPLES 件以上あるときだけ判定する
+HEALTH_WINDOW_SEC = float(os.getenv("MODEL_HEALTH_WINDOW_SEC", "300"))
+HEALTH_MIN_SAMPLES = int(os.getenv("MODEL_HEALTH_MIN_SAMPLES", "5"))
+
+# 1K トークンあたりの料金（USD）: (入力, 出力)
+MODEL_PRICES = {
+    "gpt-4": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+
+def _load_routes():
+    routes = {stage: dict(route) for stage, route in DEFAULT_ROUTES.items()}
+    raw = os.getenv("MODEL_ROUTES")
+    if raw:
+        try:
+            for stage, override in json.loads(raw).items():
+                routes[stage] = {**routes.get(stage, DEFAULT_ROUTES["body"]), **override}
+        except (ValueError, AttributeError) as e:
+            print("⚠️ MODEL_ROUTES を読み込めません（既定のルートを使います）:", e)
+    return routes
+
+
+ROUTES = _load_routes()
+
+
+def route(stage):
+    """
+    ステージのルート（models / max_tokens / timeout / p95_sec / max_error_rate）
+    """
+    return ROUTES.get(stage) or {**DEFAULT_ROUTES["body"], "models": [DEFAULT_MODEL]}
+
+
+def estimate_cost(model, input_tokens, output_tokens):
+    """
+    トークン数から API コスト（USD）を見積もる（料金表に無いモデルは GPT-4 の料金で計算）
+    """
+    input_price, output_price = MODEL_PRICES.get(model, MODEL_PRICES["gpt-4"])
+    return (input_tokens * input_price + output_tokens * output_price) / 1000
+
+
+class ModelHealth:
+    """
+    ステージ・モデルごとの直近の呼び出し結果（時刻, 所要秒数, 成否）を保持する
+    """
+
+    def __init__(self, window_sec=HEALTH_WINDOW_SEC, min_samples=HEALTH_MIN_SAMPLES):
+        self.window_sec = window_sec
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, model, latency, ok):
+        with self._lock:
+            self._samples.setdefault((stage, model), deque()).append((time.monotonic(), latency, ok))
+
+    def stats(self, stage, model):
+        """
+        直近の件数・p95 レイテンシ・エラー率
+        """
+        cutoff = time.monotonic() - self.window_sec
+        with self._lock:
+            samples = self._samples.get((stage, model), deque())
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            latencies = sorted(latency for _, latency, _ in samples)
+            errors = sum(1 for _, _, ok in samples if not ok)
+        if not latencies:
+            return {"samples": 0, "p95_sec": None, "error_rate": None}
+        return {
+            "samples": len(latencies),
+            "p95_sec": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "error_rate": errors / len(latencies)
+        }
+
+    def is_degraded(self, stage, model):
+        stats = self.stats(stage, model)
+        if stats["samples"] < self.min_samples:
+            return False
+        settings = route(stage)
+        return stats["p95_sec"] > settings["p95_sec"] or stats["error_rate"] > settings["max_error_rate"]
+
+
+health = ModelHealth()
+
+
+def candidates(stage):
+    """
+    呼び出す順のモデル一覧。劣化中のモデルは後ろに回す（全部劣化していても止めずに呼ぶ）。
+    """
+    models = route(stage)["models"]
+    degraded = [model for model in models if health.is_degraded(stage, model)]
+    return [model for model in models if model not in degraded] + degraded
+
+
+def _attempts(stage, max_tokens, timeout):
+    """
+    (モデル, 呼び出しオプション, 最後の候補か) を順に返す。
+    次の候補があるうちは再試行せず、すぐにフォールバックする。
+    """
+    settings = route(stage)
+    models = candidates(stage)
+    if models[0] != settings["models"][0]:
+        print(f"🔀 {stage}: {settings['models'][0]} が劣化しているため {models[0]} を使います")
+    for i, model in enumerate(models):
+        last = i == len(models) - 1
+        yield model, {
+            "max_tokens": min(max_tokens, settings["max_tokens"]) if max_tokens else settings["max_tokens"],
+            "timeout": timeout or settings["timeout"],
+            "max_retries": MAX_RETRIES if last else 0
+        }, last
+
+
+def _fall_back(stage, model, error):
+    metrics.model_fallbacks.inc(stage=stage, model=model)
+    print(f"⚠️ {stage}: {model} の呼び出しに失敗したため次のモデルで再試行します:", error)
+
+
+def _on_error(stage, model, started, error, last):
+    health.record(stage, model, time.monotonic() - started, ok=False)
+    if not last:
+        _fall_back(stage, model, error)
+
+
+def _on_result(stage, model, started, result):
+    """
+    結果を記録し、呼び出し元に返せるなら結果（使ったモデル名付き）を返す。
+    ストリームが何も届かずに切れた場合は None（次のモデルへ）。
+    """
+    ok = result.get("complete", True)
+    if not result["cached"]:
+        health.record(stage, model, time.monotonic() - started, ok=ok)
+    if ok or result["content"]:
+        return dict(result, model=model)
+    return None
+
+
+def complete(stage, messages, temperature=0.7, max_tokens=None, timeout=None, use_cache=True):
+    """
+    ステージのルートに従って chat_completion を呼び出す（戻り値に model が加わる）
+    """
+    for model, options, last in _attempts(stage, max_tokens, timeout):
+        started = time.monotonic()
+        try:
+            result = chat_completion(messages, model=model, temperature=temperature, use_cache=use_cache, **options)
+        except Exception as e:
+            _on_error(stage, model, started, e, last)
+            if last:
+                raise
+            continue
+        return _on_result(stage, model, started, result)
+
+
+async def acomplete(stage, messages, temperature=0.7, max_tokens=None, timeout=None, use_cache=True):
+    """
+    complete の非同期版
+    """
+    for model, options, last in _attempts(stage, max_tokens, timeout):
+        started = time.monotonic()
+        try:
+            result = await achat_completion(
+                messages, model=model, temperature=temperature, use_cache=use_cache, **options
+            )
+        except Exception as e:
+            _on_error(stage, model, started, e, last)
+            if last:
+                raise
+            continue
+        return _on_result(stage, model, started, result)
+
+
+def stream(stage, messages, temperature=0.7, max_tokens=None, timeout=None, use_cache=True, on_text=None):
+    """
+    ステージのルートに従って stream_chat_completion を呼び出す。
+    本文が届き始めてから切れた場合はフォールバックせず、そのまま返す（続きは呼び出し側で再開）。
+    """
+    for model, options, last in _attempts(stage, max_tokens, timeout):
+        started = time.monotonic()
+        try:
+            result = stream_chat_completion(
+                messages, model=model, temperature=temperature, use_cache=use_cache, on_text=on_text, **options
+            )
+        except Exception as e:
+            _on_error(stage, model, started, e, last)
+            if last:
+                raise
+            continue
+        routed = _on_result(stage, model, started, result)
+        if routed or last:
+            return routed or dict(result, model=model)
+        _fall_back(stage, model, result["error"])
+
+
+async def astream(stage, messages, temperature=0.7, max_tokens=None, timeout=None, use_cache=True, on_text=None):
+    """
+    stream の非同期版
+    """
+    for model, options, last in _attempts(stage, max_tokens, timeout):
+        started = time.monotonic()
+        try:
+            result = await astream_chat_completion(
+                messages, model=model, temperature=temperature, use_cache=use_cache, on_text=on_text, **options
+            )
+        except Exception as e:
+            _on_error(stage, model, started, e, last)
+            if last:
+                raise
+            continue
+        routed = _on_result(stage, model, started, result)
+        if routed or last:
+            return routed or dict(result, model=model)
+        _fall_back(stage, model, result["error"])
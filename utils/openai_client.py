@@ -0,0 +1,439 @@
+# utils/openai_client.py
+import asyncio
+import json
+import os
+import tempfile
+import time
+import weakref
+from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI, NOT_GIVEN, RateLimitError, APIConnectionError, InternalServerError
+
+from utils import metrics
+from utils.llm_cache import cache, make_key
+from utils.rate_limiter import limiter, estimate_tokens
+
+# .envの読み込み
+load_dotenv()
+
+DEFAULT_MODEL = "gpt-4"
+
+# 429 / 一時的なエラーの再試行回数（SDK 側の再試行は無効化し、リミッターで待つ）
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+_client = None
+# AsyncOpenAI の接続プールはイベントループに紐づくため、ループごとに保持する
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """
+    同期用 OpenAI クライアント（プロセス内で共有）
+    """
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return _client
+
+
+def get_async_client():
+    """
+    実行中のイベントループ用 AsyncOpenAI クライアント
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        _async_clients[loop] = client
+    return client
+
+
+def _to_result(response):
+    usage = response.usage
+    return {
+        "content": (response.choices[0].message.content or "").strip(),
+        "input_tokens": usage.prompt_tokens if usage else 0,
+        "output_tokens": usage.completion_tokens if usage else 0,
+        "cached": False
+    }
+
+
+def _cached_result(key):
+    """
+    キャッシュ済みの本文とトークン数（コスト計算用）を返す
+    """
+    value = cache.get(key)
+    metrics.cache_requests.inc(cache="llm", result="miss" if value is None else "hit")
+    if value is None:
+        return None
+    return dict(value, cached=True)
+
+
+def _store_result(key, result):
+    cache.set(key, {
+        "content": result["content"],
+        "input_tokens": result["input_tokens"],
+        "output_tokens": result["output_tokens"]
+    })
+
+
+def _observe(model, mode, started, status, result=None):
+    """
+    API 呼び出し1回分の所要時間・トークン数をメトリクスに記録する
+    """
+    metrics.openai_request_seconds.observe(time.monotonic() - started, model=model, mode=mode, status=status)
+    if result:
+        metrics.openai_tokens.inc(result["input_tokens"], model=model, type="input")
+        metrics.openai_tokens.inc(result["output_tokens"], model=model, type="output")
+
+
+def _on_retryable_error(model, mode, started, error):
+    _observe(model, mode, started, "error")
+    metrics.openai_retries.inc(model=model, error=type(error).__name__)
+
+
+def _retry_wait(model, error, attempt):
+    """
+    再試行までの待ち秒数。429 は共有リミッターのそのモデルのバケットを止める。
+    再試行しない場合（フォールバック時の max_retries=0 など）も 429 は記録する。
+    """
+    if isinstance(error, RateLimitError):
+        return limiter.on_rate_limited(error.response.headers, model=model)
+    return min(2 ** attempt, 30)
+
+
+def chat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=500, use_cache=True,
+                    timeout=None, max_retries=MAX_RETRIES):
+    """
+    Chat Completions を呼び出し、本文とトークン数を dict で返す。
+    同じ条件の結果はキャッシュから返し（use_cache=False で無効）、
+    API 呼び出しは共有レートリミッター経由で行う。
+    timeout は1回の呼び出しの秒数、max_retries は一時的なエラーの再試行回数。
+    """
+    key = make_key(model, messages, temperature, max_tokens)
+    if use_cache:
+        cached = _cached_result(key)
+        if cached:
+            return cached
+
+    estimated = estimate_tokens(messages, max_tokens)
+    for attempt in range(max_retries + 1):
+        limiter.acquire(estimated, model)
+        started = time.monotonic()
+        try:
+            raw = get_client().chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout if timeout is not None else NOT_GIVEN
+            )
+        except RETRYABLE_ERRORS as e:
+            limiter.settle(estimated, 0, model)
+            _on_retryable_error(model, "chat", started, e)
+            wait = _retry_wait(model, e, attempt)
+            if attempt == max_retries:
+                raise
+            time.sleep(wait)
+            continue
+        except Exception:
+            _observe(model, "chat", started, "error")
+            raise
+
+        result = _to_result(raw.parse())
+        _observe(model, "chat", started, "ok", result)
+        limiter.settle(estimated, result["input_tokens"] + result["output_tokens"], model)
+        limiter.update_from_headers(raw.headers, model)
+        _store_result(key, result)
+        return result
+
+
+async def achat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=500, use_cache=True,
+                           timeout=None, max_retries=MAX_RETRIES):
+    """
+    chat_completion の非同期版
+    """
+    key = make_key(model, messages, temperature, max_tokens)
+    if use_cache:
+        cached = _cached_result(key)
+        if cached:
+            return cached
+
+    estimated = estimate_tokens(messages, max_tokens)
+    for attempt in range(max_retries + 1):
+        await limiter.aacquire(estimated, model)
+        started = time.monotonic()
+        try:
+            raw = await get_async_client().chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout if timeout is not None else NOT_GIVEN
+            )
+        except RETRYABLE_ERRORS as e:
+            limiter.settle(estimated, 0, model)
+            _on_retryable_error(model, "chat", started, e)
+            wait = _retry_wait(model, e, attempt)
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(wait)
+            continue
+        except Exception:
+            _observe(model, "chat", started, "error")
+            raise
+
+        result = _to_result(raw.parse())
+        _observe(model, "chat", started, "ok", result)
+        limiter.settle(estimated, result["input_tokens"] + result["output_tokens"], model)
+        limiter.update_from_headers(raw.headers, model)
+        _store_result(key, result)
+        return result
+
+
+def _stream_result(parts, usage, messages, ttft, complete, error=None):
+    content = "".join(parts)
+    return {
+        # 途中で切れた本文は続きを連結できるようそのまま返す
+        "content": content.strip() if complete else content,
+        # 途中で切れた場合は usage が届かないため文字数で見積もる
+        "input_tokens": usage.prompt_tokens if usage else estimate_tokens(messages, 0),
+        "output_tokens": usage.completion_tokens if usage else len(content),
+        "cached": False,
+        "ttft_sec": ttft,
+        "complete": complete,
+        "error": error
+    }
+
+
+def _stream_from_cache(key, on_text):
+    cached = _cached_result(key)
+    if cached is None:
+        return None
+    if on_text:
+        on_text(cached["content"])
+    return dict(cached, ttft_sec=0.0, complete=True, error=None)
+
+
+def stream_chat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=500,
+                           on_text=None, timeout=None, use_cache=True, max_retries=MAX_RETRIES):
+    """
+    stream=True で Chat Completions を呼び出し、差分テキストを届くたびに on_text へ渡す。
+    途中でタイムアウト・切断した場合は例外にせず、そこまでの本文を
+    complete=False で返す（ttft_sec は最初のトークンまでの秒数）。
+    """
+    key = make_key(model, messages, temperature, max_tokens)
+    if use_cache:
+        cached = _stream_from_cache(key, on_text)
+        if cached:
+            return cached
+
+    estimated = estimate_tokens(messages, max_tokens)
+    for attempt in range(max_retries + 1):
+        limiter.acquire(estimated, model)
+        started = time.monotonic()
+        try:
+            raw = get_client().chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
+            )
+        except RETRYABLE_ERRORS as e:
+            limiter.settle(estimated, 0, model)
+            _on_retryable_error(model, "stream", started, e)
+            wait = _retry_wait(model, e, attempt)
+            if attempt == max_retries:
+                raise
+            time.sleep(wait)
+            continue
+        except Exception:
+            _observe(model, "stream", started, "error")
+            raise
+        break
+
+    limiter.update_from_headers(raw.headers, model)
+    parts, usage, ttft = [], None, None
+    try:
+        for chunk in raw.parse():
+            if chunk.usage:
+                usage = chunk.usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                parts.append(delta)
+                if on_text:
+                    on_text(delta)
+    except Exception as e:
+        result = _stream_result(parts, usage, messages, ttft, complete=False, error=str(e))
+        limiter.settle(estimated, result["input_tokens"] + result["output_tokens"], model)
+        _observe(model, "stream", started, "incomplete", result)
+        return result
+
+    result = _stream_result(parts, usage, messages, ttft, complete=True)
+    limiter.settle(estimated, result["input_tokens"] + result["output_tokens"], model)
+    _observe(model, "stream", started, "ok", result)
+    _store_result(key, result)
+    return result
+
+
+async def astream_chat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=500,
+                                  on_text=None, timeout=None, use_cache=True, max_retries=MAX_RETRIES):
+    """
+    stream_chat_completion の非同期版（on_text は同期関数）
+    """
+    key = make_key(model, messages, temperature, max_tokens)
+    if use_cache:
+        cached = _stream_from_cache(key, on_text)
+        if cached:
+            return cached
+
+    estimated = estimate_tokens(messages, max_tokens)
+    for attempt in range(max_retries + 1):
+        await limiter.aacquire(estimated, model)
+        started = time.monotonic()
+        try:
+            raw = await get_async_client().chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
+            )
+        except RETRYABLE_ERRORS as e:
+            limiter.settle(estimated, 0, model)
+            _on_retryable_error(model, "stream", started, e)
+            wait = _retry_wait(model, e, attempt)
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(wait)
+            continue
+        except Exception:
+            _observe(model, "stream", started, "error")
+            raise
+        break
+
+    limiter.update_from_headers(raw.headers, model)
+    parts, usage, ttft = [], None, None
+    try:
+        async for chunk in raw.parse():
+            if chunk.usage:
+                usage = chunk.usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                parts.append(delta)
+                if on_text:
+                    on_text(delta)
+    except Exception as e:
+        result = _stream_result(parts, usage, messages, ttft, complete=False, error=str(e))
+        limiter.settle(estimated, result["input_tokens"] + result["output_tokens"], model)
+        _observe(model, "stream", started, "incomplete", result)
+        return result
+
+    result = _stream_result(parts, usage, messages, ttft, complete=True)
+    limiter.settle(estimated, result["input_tokens"] + result["output_tokens"], model)
+    _observe(model, "stream", started, "ok", result)
+    _store_result(key, result)
+    return result
+
+
+# ---- Batch API（夜間の一括生成用） ----
+
+BATCH_POLL_SEC = float(os.getenv("OPENAI_BATCH_POLL_SEC", "30"))
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def build_batch_request(custom_id, messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=500):
+    """
+    Batch 入力 JSONL の1行分（Chat Completions リクエスト）
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+    }
+
+
+def submit_chat_batch(requests, metadata=None):
+    """
+    リクエストを JSONL ファイルに書き出してアップロードし、Batch を作成して ID を返す
+    """
+    with tempfile.NamedTemporaryFile("wb", suffix=".jsonl", delete=False) as f:
+        for request in requests:
+            f.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        path = f.name
+
+    try:
+        with open(path, "rb") as f:
+            uploaded = get_client().files.create(file=f, purpose="batch")
+    finally:
+        os.remove(path)
+
+    batch = get_client().batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata=metadata
+    )
+    print(f"📦 Batch {batch.id} を作成しました（{len(requests)} 件）")
+    return batch.id
+
+
+def wait_for_batch(batch_id, poll_interval=BATCH_POLL_SEC):
+    """
+    Batch が終了状態になるまでポーリングし、最終的な Batch オブジェクトを返す
+    """
+    while True:
+        batch = get_client().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts:
+            print(f"⏳ Batch {batch_id}: {batch.status}（{counts.completed}/{counts.total} 完了, 失敗 {counts.failed}）")
+        if batch.status in BATCH_FINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def _iter_jsonl(file_id):
+    with get_client().files.with_streaming_response.content(file_id) as response:
+        for line in response.iter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_batch_results(batch):
+    """
+    Batch の出力・エラーファイルを1行ずつ読み、(custom_id, result, error) を返す。
+    result は chat_completion と同じ形式の dict（失敗時は None）。
+    """
+    if batch.output_file_id:
+        for line in _iter_jsonl(batch.output_file_id):
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") == 200 and body.get("choices"):
+                usage = body.get("usage") or {}
+                yield line["custom_id"], {
+                    "content": (body["choices"][0]["message"].get("content") or "").strip(),
+                    "input_tokens": usage.get("prompt_tokens", 0),
+                    "output_tokens": usage.get("completion_tokens", 0),
+                    "cached": False
+                }, None
+            else:
+                yield line["custom_id"], None, line.get("error") or body.get("error") or response.get("status_code")
+
+    if batch.error_file_id:
+        for line in _iter_jsonl(batch.error_file_id):
+            yield line.get("custom_id"), None, line.get("error") or (line.get("response") or {}).get("body")
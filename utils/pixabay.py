@@ -0,0 +1,155 @@
+# utils/pixabay.py
+import os
+import threading
+import time
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import metrics
+from utils.llm_cache import MemoryCacheBackend
+
+# .envの読み込み
+load_dotenv()
+
+PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY")
+PIXABAY_URL = os.getenv("PIXABAY_URL", "https://pixabay.com/api/")
+PIXABAY_TIMEOUT = (3.05, float(os.getenv("PIXABAY_TIMEOUT", "10")))  # (接続, 読み込み)
+# Pixabay の規約上、検索結果は24時間キャッシュする
+PIXABAY_CACHE_TTL = int(os.getenv("PIXABAY_CACHE_TTL", str(24 * 3600)))
+GENRE_PAGE_SIZE = 200  # per_page の上限
+MIN_PER_PAGE = 3  # per_page の下限
+
+_session = None
+_session_lock = threading.Lock()
+_search_cache = MemoryCacheBackend(ttl=PIXABAY_CACHE_TTL, max_entries=2000)
+
+
+def get_session():
+    """
+    接続を使い回す requests.Session（429・5xx は自動で再試行）
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def search_images(query, per_page=MIN_PER_PAGE, page=1):
+    """
+    Pixabay を検索して画像URLのリストを返す（同じ条件の結果は TTL の間キャッシュ）
+    """
+    per_page = max(MIN_PER_PAGE, min(per_page, GENRE_PAGE_SIZE))
+    key = (query, per_page, page)
+    cached = _search_cache.get(key)
+    metrics.cache_requests.inc(cache="pixabay", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return cached
+
+    params = {
+        "key": PIXABAY_API_KEY,
+        "q": query,
+        "image_type": "photo",
+        "orientation": "horizontal",
+        "per_page": per_page,
+        "page": page,
+        "safesearch": "true",
+        "lang": "ja"
+    }
+    with metrics.timed("pixabay_search"):
+        response = get_session().get(PIXABAY_URL, params=params, timeout=PIXABAY_TIMEOUT)
+        response.raise_for_status()
+    urls = [hit["webformatURL"] for hit in response.json().get("hits", [])]
+    _search_cache.set(key, urls)
+    return urls
+
+
+class GenreImagePool:
+    """
+    ジャンルの検索結果を大きなページで1回だけ取得し、記事ごとに重複しない画像を配る。
+    使い切ったら次のページを取得し、それも無ければ先頭から使い回す。
+    最初の取得から ttl 秒（Pixabay の規約上のキャッシュ期間）を過ぎたら取り直す。
+    """
+
+    def __init__(self, genre, page_size=GENRE_PAGE_SIZE, ttl=PIXABAY_CACHE_TTL):
+        self.genre = genre
+        self.page_size = page_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._urls = []
+        self._cursor = 0
+        self._page = 0
+        self._exhausted = False
+        self._fetched_at = None
+
+    def _expire(self):
+        if self._fetched_at is not None and time.monotonic() - self._fetched_at >= self.ttl:
+            self._reset()
+
+    def _fetch_next_page(self):
+        if self._exhausted:
+            return False
+        urls = search_images(self.genre, per_page=self.page_size, page=self._page + 1)
+        if not urls:
+            self._exhausted = True
+            return False
+        if self._fetched_at is None:
+            self._fetched_at = time.monotonic()
+        self._page += 1
+        self._urls.extend(url for url in urls if url not in self._urls)
+        if len(urls) < self.page_size:
+            self._exhausted = True
+        return True
+
+    def prefetch(self):
+        with self._lock:
+            self._expire()
+            if not self._urls:
+                self._fetch_next_page()
+        return len(self._urls)
+
+    def take(self, n=2):
+        with self._lock:
+            self._expire()
+            if self._cursor + n > len(self._urls):
+                try:
+                    self._fetch_next_page()
+                except Exception as e:
+                    print("Pixabay画像取得エラー:", e)
+            if not self._urls:
+                return []
+            if self._cursor + n > len(self._urls):
+                self._cursor = 0
+            images = self._urls[self._cursor:self._cursor + n]
+            self._cursor += n
+            return images
+
+
+_genre_pools = {}
+_genre_pools_lock = threading.Lock()
+
+
+def get_genre_pool(genre):
+    with _genre_pools_lock:
+        return _genre_pools.setdefault(genre, GenreImagePool(genre))
+
+
+def prefetch_genre_images(genre):
+    """
+    バッチ開始前にジャンルの画像をまとめて取得しておく（取得件数を返す）
+    """
+    try:
+        return get_genre_pool(genre).prefetch()
+    except Exception as e:
+        print("Pixabay画像取得エラー:", e)
+        return 0
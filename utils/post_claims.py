@@ -0,0 +1,87 @@
+# utils/post_claims.py
+"""
+予約投稿の確保（claim）。投稿する記事は先に status="posting" へ条件付き UPDATE で確保し、
+確保できたプロセスだけが投稿するので、複数のプロセス・サーバーで投稿しても二重投稿しない。
+投稿中のままリースが切れた記事（プロセスが落ちたもの）は他のプロセスが取り直す。
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+
+from models import db, Article
+
+# 確保からこの秒数が過ぎても投稿中のままの記事は、プロセスが落ちたとみなして取り直す
+POST_LEASE_SEC = int(os.getenv("POST_LEASE_SEC", "600"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claimable(now):
+    """
+    確保できる記事の条件（予約時刻を過ぎた記事か、リースの切れた投稿中の記事）
+    """
+    stale = datetime.utcnow() - timedelta(seconds=POST_LEASE_SEC)
+    scheduled = db.and_(Article.status == "scheduled", Article.scheduled_time <= now)
+    return db.or_(scheduled, db.and_(Article.status == "posting", Article.claimed_at < stale))
+
+
+def _claim(where, worker_id):
+    return (
+        db.update(Article)
+        .where(*where)
+        .values(status="posting", claimed_by=worker_id, claimed_at=datetime.utcnow())
+        .returning(Article.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim_due_articles(limit, now=None, worker_id=WORKER_ID):
+    """
+    予約時刻を過ぎた記事を最大 limit 件確保し、予約時刻順に返す。
+    FOR UPDATE SKIP LOCKED で他のプロセスが確保中の行を読み飛ばし、
+    UPDATE ... RETURNING の1文で確保する（行ロックの無い DB でも二重に確保しない）。
+    """
+    now = now or datetime.utcnow()
+    due = (
+        db.select(Article.id)
+        .where(_claimable(now))
+        .order_by(Article.scheduled_time, Article.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    ids = db.session.execute(
+        _claim([Article.id.in_(due.scalar_subquery()), _claimable(now)], worker_id)
+    ).scalars().all()
+    db.session.commit()
+    if not ids:
+        return []
+    return Article.query.filter(Article.id.in_(ids)).order_by(Article.scheduled_time, Article.id).all()
+
+
+def renew_claim(article_id, worker_id=WORKER_ID):
+    """
+    投稿を始める直前にリースを延長する。他のプロセスに取り直されていれば False（投稿しない）。
+    """
+    result = db.session.execute(
+        db.update(Article)
+        .where(Article.id == article_id, Article.status == "posting", Article.claimed_by == worker_id)
+        .values(claimed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def finish_claim(article_id, posted, worker_id=WORKER_ID):
+    """
+    確保した記事の投稿結果を保存する（posted / failed）。確保を失っていれば False。
+    """
+    values = {"status": "posted", "posted_time": datetime.utcnow()} if posted else {"status": "failed"}
+    result = db.session.execute(
+        db.update(Article)
+        .where(Article.id == article_id, Article.status == "posting", Article.claimed_by == worker_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
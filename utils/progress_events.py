@@ -0,0 +1,111 @@
+# utils/progress_events.py
+"""
+投稿ログ（log_article_progress が記録した PostLog）を進捗イベントとして読み出し、
+Server-Sent Events の形式に整える。生成はワーカー、投稿はスケジューラーと別プロセスなので、
+プロセス間の受け渡しは PostLog をそのまま使い、ID より新しい行だけを読む。
+"""
+import json
+import os
+
+from models import db, PostLog, Site
+
+# ID の採番とコミットの順は一致しない（バッファの一括 INSERT など）ので、
+# 送信済みの最大 ID よりこの件数分前まで毎回読み直し、遅れてコミットされた行も送る
+PROGRESS_LOOKBACK_IDS = int(os.getenv("PROGRESS_LOOKBACK_IDS", "1000"))
+
+# ステップの文言 → イベントの種類（上から順に判定する）
+EVENT_KINDS = [
+    ("投稿完了", "posted"),
+    ("投稿失敗", "post_failed"),
+    ("エラー", "error"),
+    ("失敗", "error"),
+    ("⚠️", "error"),
+    ("キーワード", "keywords"),
+    ("タイトル", "title"),
+    ("本文", "body"),
+    ("画像", "images"),
+    ("生成完了", "generated"),
+    ("予約", "scheduled"),
+    ("スケジュール", "scheduled"),
+    ("ジョブ", "job"),
+]
+
+
+def event_kind(step):
+    for text, kind in EVENT_KINDS:
+        if text in (step or ""):
+            return kind
+    return "progress"
+
+
+def user_site_ids(user_id):
+    return [site_id for site_id, in db.session.query(Site.id).filter(Site.user_id == user_id).all()]
+
+
+def latest_event_id():
+    return db.session.query(db.func.max(PostLog.id)).scalar() or 0
+
+
+def progress_events(site_ids, after_id, limit=100):
+    """
+    サイトの進捗イベントを after_id より新しい順に最大 limit 件（主キーの範囲検索のみ）
+    """
+    if not site_ids:
+        return []
+    rows = (
+        db.session.query(
+            PostLog.id, PostLog.step, PostLog.article_id, PostLog.site_id,
+            PostLog.keyword, PostLog.title, PostLog.created_at
+        )
+        .filter(PostLog.id > after_id, PostLog.site_id.in_(site_ids))
+        .order_by(PostLog.id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "id": row.id,
+            "kind": event_kind(row.step),
+            "step": row.step,
+            "article_id": row.article_id,
+            "site_id": row.site_id,
+            "keyword": row.keyword,
+            "title": row.title,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        }
+        for row in rows
+    ]
+
+
+class ProgressCursor:
+    """
+    1接続分の読み出し位置。送信済みの最大 ID と、その少し前までに送った ID を覚えておき、
+    読み直した範囲から未送信の行だけを返す（start_id 以前の行は送らない）。
+    """
+
+    def __init__(self, start_id, lookback=PROGRESS_LOOKBACK_IDS):
+        self.start_id = start_id
+        self.last_id = start_id
+        self.lookback = lookback
+        self._sent = set()
+
+    def fetch(self, site_ids, limit=100):
+        floor = max(self.start_id, self.last_id - self.lookback)
+        self._sent = {event_id for event_id in self._sent if event_id > floor}
+        events = [
+            event for event in progress_events(site_ids, floor, limit=limit + len(self._sent))
+            if event["id"] not in self._sent
+        ][:limit]
+        for event in events:
+            self._sent.add(event["id"])
+            self.last_id = max(self.last_id, event["id"])
+        return events
+
+
+def format_sse(event, event_id=None):
+    """
+    1イベントを SSE のメッセージにする（id はブラウザが再接続時に Last-Event-ID で送り返す）。
+    遅れて届いた行も送るので、id には event_id（それまでに送った最大の ID）を渡す。
+    """
+    event_id = event["id"] if event_id is None else event_id
+    return f"id: {event_id}\nevent: progress\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
@@ -0,0 +1,231 @@
+# utils/rate_limiter.py
+import asyncio
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from dotenv import load_dotenv
+
+# .envの読み込み
+load_dotenv()
+
+# 状態ファイルはホストごとなので、OpenAI を呼ぶホスト（Web・ワーカーの dyno / サーバー）が複数ある場合は
+# OPENAI_RATE_LIMIT_HOSTS にその数を指定し、組織のクォータを等分した値を各ホストの上限にする
+RATE_LIMIT_HOSTS = max(1, int(os.getenv("OPENAI_RATE_LIMIT_HOSTS", "1")))
+
+# 既定の上限（OpenAI の組織クォータに合わせて .env で上書きする）
+DEFAULT_RPM = max(1, int(os.getenv("OPENAI_RPM", "500")) // RATE_LIMIT_HOSTS)
+DEFAULT_TPM = max(1, int(os.getenv("OPENAI_TPM", "40000")) // RATE_LIMIT_HOSTS)
+STATE_PATH = os.getenv("OPENAI_RATE_LIMIT_STATE", "/tmp/openai_rate_limit.json")
+# モデルを指定しない呼び出しのバケット名
+DEFAULT_BUCKET = "default"
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """
+    "1s" / "6m0s" / "20ms" / "3" 形式のリセット時間を秒に変換
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = _DURATION_RE.findall(value)
+    if not matches:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in matches)
+
+
+def estimate_text_tokens(text):
+    """
+    文章のトークン数を見積もる（日本語は概ね1文字≒1トークン）
+    """
+    return len(text or "")
+
+
+def estimate_tokens(messages, max_tokens):
+    """
+    リクエストの消費トークン数を見積もる
+    """
+    prompt_tokens = sum(estimate_text_tokens(message.get("content")) for message in messages)
+    return prompt_tokens + (max_tokens or 0)
+
+
+class RateLimiter:
+    """
+    RPM と TPM の2つのトークンバケットで OpenAI 呼び出しを制御する。
+    OpenAI の上限はモデルごとなので、バケットもモデルごとに持つ
+    （あるモデルの 429 やヘッダーで他のモデルを止めたり上限を書き換えたりしない）。
+    状態はファイルに置き fcntl のロックで更新するため、
+    同一ホスト上のスレッド・gunicorn ワーカー間で共有される（ホストをまたいでは共有しない。
+    複数ホストでは RATE_LIMIT_HOSTS で上限を等分し、429 を受けたらそのホストのバケットを止める）。
+    """
+
+    def __init__(self, path=STATE_PATH, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, hosts=RATE_LIMIT_HOSTS):
+        self.path = path
+        self.rpm = rpm
+        self.tpm = tpm
+        self.hosts = hosts
+        self._lock = threading.Lock()
+
+    # ---- 共有状態の読み書き ----
+
+    def _update(self, model, func):
+        """
+        ロックを取ってモデルのバケットを補充し、func(bucket, now) の戻り値を返す
+        """
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+
+                bucket = state.get(model)
+                if not isinstance(bucket, dict):
+                    bucket = state[model] = {}
+                now = time.time()
+                self._refill(bucket, now)
+                result = func(bucket, now)
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state, now):
+        rpm = state.setdefault("rpm", self.rpm)
+        tpm = state.setdefault("tpm", self.tpm)
+        updated = state.get("updated", now)
+        elapsed = max(0.0, now - updated)
+
+        state["requests"] = min(rpm, state.get("requests", rpm) + elapsed * rpm / 60)
+        state["tokens"] = min(tpm, state.get("tokens", tpm) + elapsed * tpm / 60)
+        state["updated"] = now
+
+    # ---- 取得 ----
+
+    def reserve(self, tokens, model=DEFAULT_BUCKET):
+        """
+        model のバケットから1リクエスト分と tokens 分を確保する。確保できれば 0、
+        できなければ次に試すまでの待ち秒数を返す。
+        """
+        def _reserve(state, now):
+            blocked_until = state.get("blocked_until", 0)
+            if now < blocked_until:
+                return blocked_until - now
+
+            # 1リクエストでバケット容量を超える場合は満タン時に通す
+            needed = min(tokens, state["tpm"])
+            if state["requests"] >= 1 and state["tokens"] >= needed:
+                state["requests"] -= 1
+                state["tokens"] -= tokens
+                return 0.0
+
+            wait_requests = max(0.0, 1 - state["requests"]) * 60 / state["rpm"]
+            wait_tokens = max(0.0, needed - state["tokens"]) * 60 / state["tpm"]
+            return max(wait_requests, wait_tokens, 0.01)
+
+        return self._update(model, _reserve)
+
+    def acquire(self, tokens, model=DEFAULT_BUCKET):
+        """
+        枠が空くまでブロックして確保する
+        """
+        while True:
+            wait = self.reserve(tokens, model)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, tokens, model=DEFAULT_BUCKET):
+        """
+        acquire の非同期版
+        """
+        while True:
+            wait = self.reserve(tokens, model)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    # ---- レスポンスからの補正 ----
+
+    def settle(self, estimated, actual, model=DEFAULT_BUCKET):
+        """
+        見積もりと実際の消費トークン数の差をバケットに戻す
+        """
+        def _settle(state, now):
+            state["tokens"] = min(state["tpm"], state["tokens"] + estimated - actual)
+
+        self._update(model, _settle)
+
+    def update_from_headers(self, headers, model=DEFAULT_BUCKET):
+        """
+        x-ratelimit-* ヘッダーの残量・上限でバケットを補正する
+        （ヘッダーの上限は組織全体の値なので、ホスト数で割って使う）
+        """
+        if not headers:
+            return
+
+        limit_requests = headers.get("x-ratelimit-limit-requests")
+        limit_tokens = headers.get("x-ratelimit-limit-tokens")
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+
+        def _apply(state, now):
+            if limit_requests:
+                state["rpm"] = max(1, int(limit_requests) // self.hosts)
+            if limit_tokens:
+                state["tpm"] = max(1, int(limit_tokens) // self.hosts)
+            # サーバー側の残量が少なければそれに合わせる（多い分は補充に任せる）
+            if remaining_requests is not None:
+                state["requests"] = min(state["requests"], float(remaining_requests))
+            if remaining_tokens is not None:
+                state["tokens"] = min(state["tokens"], float(remaining_tokens))
+
+        self._update(model, _apply)
+
+    def on_rate_limited(self, headers, default_wait=5.0, model=DEFAULT_BUCKET):
+        """
+        429 を受けたときに Retry-After（なければリセット時間）までそのモデルを止める。
+        待ち秒数を返す。
+        """
+        headers = headers or {}
+        wait = None
+        if headers.get("retry-after-ms"):
+            wait = parse_duration(headers.get("retry-after-ms"))
+            wait = wait / 1000 if wait is not None else None
+        if wait is None:
+            wait = parse_duration(headers.get("retry-after"))
+        if wait is None:
+            resets = [
+                parse_duration(headers.get("x-ratelimit-reset-requests")),
+                parse_duration(headers.get("x-ratelimit-reset-tokens")),
+            ]
+            resets = [reset for reset in resets if reset is not None]
+            wait = max(resets) if resets else default_wait
+
+        def _block(state, now):
+            state["blocked_until"] = max(state.get("blocked_until", 0), now + wait)
+            state["requests"] = 0.0
+            state["tokens"] = 0.0
+
+        self._update(model, _block)
+        return wait
+
+
+# プロセス内で共有する既定のリミッター
+limiter = RateLimiter()
@@ -1,15 +1,20 @@
 # utils/scheduler.py
+import os
 import random
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import datetime, timedelta, time
 from models import db, Article
 from utils.logger import log_article_progress
 
+DAILY_POSTS_PER_SITE = int(os.getenv("DAILY_POSTS_PER_SITE", "3"))  # 1サイトあたりの1日の投稿数
+SCHEDULED_STATUSES = ("scheduled", "posting", "posted")  # その日の投稿数に数える状態
+
 # 📅 記事10本に対してランダムな投稿時刻を設定し、status=scheduledに変更
 def schedule_posting_for_articles(site_id, user_id):
     articles = Article.query.filter_by(site_id=site_id, user_id=user_id, status="pending").order_by(Article.created_at).all()
 
     if len(articles) < 10:
-        log_article_progress(site_id, "⚠️ スケジュール投稿の対象記事が10本未満です。")
+        log_article_progress(step="⚠️ スケジュール投稿の対象記事が10本未満です。", site_id=site_id)
         return
 
     now = datetime.utcnow()
@@ -34,4 +39,106 @@ def schedule_posting_for_articles(site_id, user_id):
 
     db.session.commit()
 
-    log_article_progress(site_id, f"📅 スケジュール投稿設定完了（{len(scheduled_times)}記事分）")
+    log_article_progress(step=f"📅 スケジュール投稿設定完了（{len(scheduled_times)}記事分）", site_id=site_id)
+
+
+def _open_windows(windows, day, now):
+    """
+    時間帯（開始時, 終了時）のうち、まだ終わっていないものを (開始, 終了) の日時で返す
+    """
+    opened = []
+    for start_hour, end_hour in windows:
+        start = datetime.combine(day, time(start_hour))
+        end = start + timedelta(hours=end_hour - start_hour + 1)
+        if end > now:
+            opened.append((max(start, now), end))
+    return opened
+
+
+def _spread(count, start, end):
+    """
+    count 件の時刻を [start, end) に等間隔で並べる（各間隔の中でランダムにずらす）
+    """
+    step = (end - start) / count
+    return [(start + step * (i + random.random())).replace(microsecond=0) for i in range(count)]
+
+
+def plan_daily_posts(windows, day=None, per_site=DAILY_POSTS_PER_SITE, now=None):
+    """
+    全サイトの pending 記事から、その日の投稿予定 [(記事ID, サイトID, 予約時刻)] をまとめて決める。
+      - サイトごとの枠は per_site からその日に予約・投稿済みの数を引いたもの（終わった時間帯は使わない）
+      - 各サイトの古い pending から順に、時間帯を1つずつ割り当てる
+      - 時間帯の中では全サイトの投稿をシャッフルして等間隔に並べ、WordPress への投稿を特定の時刻に集中させない
+    クエリはサイト数によらず2回（予約済み数の集計と、サイトごとの順位付け）。
+    """
+    now = now or datetime.utcnow()  # 予約時刻は UTC（scheduler_runner と同じ基準）
+    day = day or now.date()
+    opened = _open_windows(windows, day, now)
+    if not opened or per_site <= 0:
+        return []
+
+    day_start = datetime.combine(day, time.min)
+    booked = dict(
+        db.session.query(Article.site_id, db.func.count(Article.id))
+        .filter(
+            Article.status.in_(SCHEDULED_STATUSES),
+            Article.scheduled_time >= day_start,
+            Article.scheduled_time < day_start + timedelta(days=1)
+        )
+        .group_by(Article.site_id)
+        .all()
+    )
+
+    ranked = (
+        db.select(
+            Article.id,
+            Article.site_id,
+            db.func.row_number().over(
+                partition_by=Article.site_id, order_by=(Article.created_at, Article.id)
+            ).label("rank")
+        )
+        .where(Article.status == "pending")
+        .subquery()
+    )
+    rows = db.session.execute(
+        db.select(ranked.c.id, ranked.c.site_id, ranked.c.rank)
+        .where(ranked.c.rank <= min(per_site, len(opened)))
+    ).all()
+
+    # 枠が少ないサイト（その日すでに予約済みのもの）は後ろの時間帯に入れる
+    by_window = [[] for _ in opened]
+    for article_id, site_id, rank in rows:
+        quota = min(per_site - booked.get(site_id, 0), len(opened))
+        if rank <= quota:
+            by_window[len(opened) - quota + rank - 1].append((article_id, site_id))
+
+    plan = []
+    for (start, end), posts in zip(opened, by_window):
+        if posts:
+            random.shuffle(posts)
+            plan.extend(
+                (article_id, site_id, scheduled_time)
+                for (article_id, site_id), scheduled_time in zip(posts, _spread(len(posts), start, end))
+            )
+    return plan
+
+
+def schedule_daily_posts(windows, day=None, per_site=DAILY_POSTS_PER_SITE, now=None):
+    """
+    plan_daily_posts の予定を一括 UPDATE で反映し、[(記事ID, サイトID, 予約時刻)] を返す
+    （その間に pending でなくなった記事は更新しない）
+    """
+    plan = plan_daily_posts(windows, day=day, per_site=per_site, now=now)
+    if plan:
+        db.session.execute(
+            db.update(Article).where(Article.status == "pending"),
+            [{"id": article_id, "scheduled_time": scheduled_time, "status": "scheduled"}
+             for article_id, _, scheduled_time in plan],
+            execution_options={"synchronize_session": None}
+        )
+    db.session.commit()
+
+    per_site = Counter(site_id for _, site_id, _ in plan)
+    for site_id, count in per_site.items():
+        log_article_progress(step=f"📅 本日の投稿を予約しました（{count}記事）", site_id=site_id)
+    return plan
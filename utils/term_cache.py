@@ -0,0 +1,70 @@
+# utils/term_cache.py
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, TermCache
+
+
+def _normalize(site_url):
+    return (site_url or "").rstrip("/")
+
+
+def get_many(site_url, taxonomy, names):
+    """
+    キャッシュ済みのターム名 → ID を返す（無いものは含まない）
+    """
+    if not names:
+        return {}
+    rows = TermCache.query.filter(
+        TermCache.site_url == _normalize(site_url),
+        TermCache.taxonomy == taxonomy,
+        TermCache.name.in_(list(names))
+    ).all()
+    return {row.name: row.term_id for row in rows}
+
+
+def remember_many(site_url, taxonomy, term_ids):
+    """
+    ターム名 → ID をまとめて保存（既に同じ名前があれば ID を上書き）
+    """
+    if not term_ids:
+        return
+    site_url = _normalize(site_url)
+    existing = {
+        row.name: row for row in TermCache.query.filter(
+            TermCache.site_url == site_url,
+            TermCache.taxonomy == taxonomy,
+            TermCache.name.in_(list(term_ids))
+        ).all()
+    }
+    for name, term_id in term_ids.items():
+        if name in existing:
+            existing[name].term_id = term_id
+        else:
+            db.session.add(TermCache(
+                site_url=site_url,
+                taxonomy=taxonomy,
+                name=name,
+                term_id=term_id,
+                created_at=datetime.utcnow()
+            ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 並行して同じタームが記録された（次回の参照で読める）
+        db.session.rollback()
+
+
+def forget(site_url, taxonomy, term_ids):
+    """
+    WordPress 側で削除・統合されたタームをキャッシュから外す
+    """
+    if not term_ids:
+        return
+    TermCache.query.filter(
+        TermCache.site_url == _normalize(site_url),
+        TermCache.taxonomy == taxonomy,
+        TermCache.term_id.in_(list(term_ids))
+    ).delete(synchronize_session=False)
+    db.session.commit()
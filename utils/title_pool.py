@@ -0,0 +1,142 @@
+# utils/title_pool.py
+import os
+from datetime import datetime, timedelta
+
+from models import db, TitlePool
+
+# 1キーワードで取り出し候補として見る件数
+_CANDIDATE_LIMIT = 20
+
+# プールはジャンル単位。1キーワードの未使用タイトルはこの件数まで、
+# 作成からこの日数を過ぎたタイトルは使わずに prune_titles で削除する
+TITLE_POOL_MAX_PER_KEYWORD = int(os.getenv("TITLE_POOL_MAX_PER_KEYWORD", "30"))
+TITLE_POOL_TTL_DAYS = int(os.getenv("TITLE_POOL_TTL_DAYS", "30"))
+
+
+def normalize_keyword(keyword):
+    """
+    全角スペース・連続空白をまとめ、小文字化したキーワード
+    """
+    return " ".join((keyword or "").replace("　", " ").split()).lower()
+
+
+def _prefix_pattern(key):
+    """
+    key で始まるキーワード（key に語を足した関連キーワード）にマッチする LIKE パターン
+    """
+    return key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + " %"
+
+
+def _expires_before():
+    return datetime.utcnow() - timedelta(days=TITLE_POOL_TTL_DAYS)
+
+
+def _in_genre(query, genre):
+    return query.filter(TitlePool.genre == genre if genre else TitlePool.genre.is_(None))
+
+
+def _unused(query, genre):
+    """
+    ジャンルの未使用で期限内のタイトルに絞る
+    """
+    return _in_genre(query, genre).filter(TitlePool.used_at.is_(None), TitlePool.created_at >= _expires_before())
+
+
+def add_titles(keyword, titles, genre=None):
+    """
+    生成済みタイトルをジャンルのプールに追加（同じキーワードの既存タイトルは除く）。
+    未使用タイトルが TITLE_POOL_MAX_PER_KEYWORD 件に達した分は追加しない。追加件数を返す。
+    """
+    key = normalize_keyword(keyword)
+    rows = _in_genre(
+        db.session.query(TitlePool.title, TitlePool.used_at, TitlePool.created_at), genre
+    ).filter(TitlePool.keyword == key).all()
+    existing = {row.title for row in rows}
+    expires_before = _expires_before()
+    room = TITLE_POOL_MAX_PER_KEYWORD - sum(
+        1 for row in rows if row.used_at is None and row.created_at >= expires_before
+    )
+
+    new_rows = []
+    for title in titles:
+        title = title.strip()[:300]
+        if len(new_rows) >= room:
+            break
+        if not title or title in existing:
+            continue
+        existing.add(title)
+        new_rows.append({"genre": genre, "keyword": key, "title": title, "created_at": datetime.utcnow()})
+
+    if new_rows:
+        db.session.execute(db.insert(TitlePool), new_rows)
+        db.session.commit()
+    return len(new_rows)
+
+
+def _claim(candidate_ids):
+    """
+    候補を順に「未使用なら使用済みにする」UPDATE で確保する（並行実行でも重複しない）
+    """
+    for pool_id in candidate_ids:
+        result = db.session.execute(
+            db.update(TitlePool)
+            .where(TitlePool.id == pool_id, TitlePool.used_at.is_(None))
+            .values(used_at=datetime.utcnow())
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(TitlePool, pool_id).title
+    return None
+
+
+def take_title(keyword, genre=None):
+    """
+    キーワードに使える未使用タイトルをジャンルのプールから1件取り出す。
+    同じキーワードのタイトルを優先し、なければキーワードに語を足した
+    関連キーワードのタイトルを使う（前方一致なので索引で引ける）。なければ None。
+    """
+    key = normalize_keyword(keyword)
+    if not key:
+        return None
+
+    unused = _unused(db.session.query(TitlePool.id), genre)
+
+    exact = unused.filter(TitlePool.keyword == key).order_by(TitlePool.id).limit(_CANDIDATE_LIMIT)
+    title = _claim([row.id for row in exact.all()])
+    if title:
+        return title
+
+    related = (
+        unused.filter(TitlePool.keyword.like(_prefix_pattern(key), escape="\\"))
+        .order_by(TitlePool.id)
+        .limit(_CANDIDATE_LIMIT)
+    )
+    return _claim([row.id for row in related.all()])
+
+
+def prune_titles():
+    """
+    期限（TITLE_POOL_TTL_DAYS）を過ぎたタイトルを使用済みも含めて削除する。削除件数を返す。
+    """
+    result = db.session.execute(
+        db.delete(TitlePool)
+        .where(TitlePool.created_at < _expires_before())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def keywords_without_titles(keywords, genre=None):
+    """
+    未使用タイトルがジャンルのプールに無いキーワードだけを返す（一括補充の対象判定用）
+    """
+    keys = {normalize_keyword(keyword) for keyword in keywords}
+    stocked = {
+        row.keyword for row in
+        _unused(db.session.query(TitlePool.keyword), genre)
+        .filter(TitlePool.keyword.in_(keys))
+        .distinct()
+        .all()
+    }
+    return [keyword for keyword in keywords if normalize_keyword(keyword) not in stocked]
@@ -1,106 +1,719 @@
 # wordpress_client.py
+import asyncio
+import hashlib
+import html
+import os
+import tempfile
+import threading
+import weakref
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 
-def upload_featured_image(site_url, username, app_password, image_url):
+from utils import media_cache, metrics, term_cache
+
+WP_CONNECT_TIMEOUT = 3.05
+WP_READ_TIMEOUT = float(os.getenv("WP_TIMEOUT", "30"))
+WP_POOL_MAXSIZE = int(os.getenv("WP_POOL_MAXSIZE", "4"))  # 1サイトあたりの同時接続数の上限
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = (3.05, 30)
+TERM_LOOKUP_PAGE_SIZE = 100
+_INVALID_TERM_CODES = {"rest_invalid_term", "rest_term_invalid", "rest_cannot_assign_term"}
+# これを超える画像はメモリではなく一時ファイルに置く
+SPOOL_MAX_SIZE = 2 * 1024 * 1024
+
+# 先頭バイト → (Content-Type, 拡張子)
+_IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", ("image/jpeg", "jpg")),
+    (b"\x89PNG\r\n\x1a\n", ("image/png", "png")),
+    (b"GIF87a", ("image/gif", "gif")),
+    (b"GIF89a", ("image/gif", "gif")),
+]
+
+
+def detect_image_type(head):
     """
-    画像URLをダウンロードし、WordPressメディアにアップロード → メディアIDを返す
+    画像の先頭バイトから Content-Type と拡張子を判定（不明なら JPEG 扱い）
     """
-    try:
-        image_data = requests.get(image_url).content
-        filename = image_url.split("/")[-1]
+    for signature, image_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ("image/webp", "webp")
+    return ("image/jpeg", "jpg")
+
 
-        headers = {
+class ImageBuffer:
+    """
+    ダウンロード中の画像をチャンクごとに一時ファイルへ書き、同時に SHA-256 と先頭バイトを取る
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.head = b""
+
+    def write(self, chunk):
+        if len(self.head) < 16:
+            self.head += chunk[:16 - len(self.head)]
+        self._digest.update(chunk)
+        self.file.write(chunk)
+
+    def finish(self):
+        self.file.seek(0)
+        self.content_hash = self._digest.hexdigest()
+        return self
+
+    def upload_headers(self, image_url):
+        content_type, extension = detect_image_type(self.head)
+        filename = image_url.split("/")[-1].split("?")[0] or f"{self.content_hash[:16]}.{extension}"
+        if "." not in filename:
+            filename = f"{filename}.{extension}"
+        return {
             "Content-Disposition": f"attachment; filename={filename}",
-            "Content-Type": "image/jpeg"
+            "Content-Type": content_type
         }
-        media_url = f"{site_url}/wp-json/wp/v2/media"
 
-        response = requests.post(
-            media_url,
-            headers=headers,
-            data=image_data,
-            auth=HTTPBasicAuth(username, app_password)
-        )
+    def close(self):
+        self.file.close()
 
-        if response.status_code in [200, 201]:
-            media_id = response.json()["id"]
-            print(f"🖼 画像アップロード成功: media_id={media_id}")
-            return media_id
-        else:
-            print("❌ 画像アップロード失敗:", response.status_code, response.text)
-            return None
 
+def _cache_call(func, *args, **kwargs):
+    """
+    メディア・タームキャッシュの読み書き。DB が使えなくても投稿は続ける。
+    """
+    try:
+        return func(*args, **kwargs)
     except Exception as e:
-        print("⚠️ 画像アップロードエラー:", e)
+        print("⚠️ キャッシュ処理エラー:", e)
+        try:
+            media_cache.db.session.rollback()
+        except Exception:
+            pass
         return None
 
-def get_or_create_category(site_url, username, app_password, category_name):
+
+def _term_names(names):
+    return list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+
+
+def _match_terms(terms, wanted):
+    found = {}
+    for term in terms:
+        name = html.unescape(term.get("name", ""))
+        if name in wanted:
+            found[name] = term["id"]
+    return found
+
+
+def _created_term_id(response, taxonomy, name):
+    if response.status_code in [200, 201]:
+        return response.json()["id"]
+    error = _error_of(response)
+    # slug が名前と異なる既存タームは一覧で引けないが、作成時に term_exists として ID が返る
+    if error.get("code") == "term_exists":
+        return (error.get("data") or {}).get("term_id")
+    print(f"❌ {taxonomy} 作成失敗:", name, response.status_code)
+    return None
+
+
+def _split_tags(tags):
+    return [tag for tag in tags if isinstance(tag, str)], [tag for tag in tags if not isinstance(tag, str)]
+
+
+def _error_of(response):
+    if response.status_code not in [400, 403]:
+        return {}
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def _is_invalid_featured_media(response):
+    error = _error_of(response)
+    return error.get("code") == "rest_invalid_featured_media" or \
+        "featured_media" in (error.get("data") or {}).get("params", {})
+
+
+def _invalid_taxonomies(response):
     """
-    カテゴリがあればIDを取得、なければ新規作成してIDを返す
+    存在しないタームを指定したことによる投稿エラーなら、該当するタクソノミーを返す
     """
-    try:
-        url = f"{site_url}/wp-json/wp/v2/categories"
-        params = {"search": category_name}
-        response = requests.get(url, auth=HTTPBasicAuth(username, app_password), params=params)
-
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                return data[0]["id"]
-
-        response = requests.post(
-            url,
-            auth=HTTPBasicAuth(username, app_password),
-            json={"name": category_name}
-        )
-        if response.status_code in [200, 201]:
-            return response.json()["id"]
-    except Exception as e:
-        print("⚠️ カテゴリ取得/作成エラー:", e)
+    error = _error_of(response)
+    if not error:
+        return []
+    params = (error.get("data") or {}).get("params", {})
+    if error.get("code") in _INVALID_TERM_CODES:
+        return ["categories", "tags"]
+    return [taxonomy for taxonomy in ["categories", "tags"] if taxonomy in params]
+
+
+def _forget_dropped_terms(site_url, post_data, post):
+    """
+    WordPress は存在しないターム ID を黙って無視するので、投稿結果に無い ID はキャッシュから外す
+    """
+    for taxonomy in ["categories", "tags"]:
+        dropped = set(post_data.get(taxonomy, [])) - set(post.get(taxonomy, []))
+        if dropped:
+            print(f"♻️ {taxonomy} のID {sorted(dropped)} が無効だったためキャッシュから外します")
+            _cache_call(term_cache.forget, site_url, taxonomy, dropped)
+
+
+def _build_post_data(title, content, publish, featured_media_id, category_id, tag_ids):
+    post_data = {
+        "title": title,
+        "content": content,
+        "status": "publish" if publish else "draft",
+    }
+    if featured_media_id:
+        post_data["featured_media"] = featured_media_id
+    if category_id:
+        post_data["categories"] = [category_id]
+    if tag_ids:
+        post_data["tags"] = tag_ids
+    return post_data
+
+
+def _count_cache(cache, hits, misses):
+    if hits:
+        metrics.cache_requests.inc(hits, cache=cache, result="hit")
+    if misses:
+        metrics.cache_requests.inc(misses, cache=cache, result="miss")
+
+
+def _post_result(site_url, post_data, response):
+    if response.status_code in [200, 201]:
+        post = response.json()
+        print("✅ 投稿成功:", post.get("id"))
+        metrics.wordpress_posts.inc(result="ok")
+        _forget_dropped_terms(site_url, post_data, post)
+        return post
+    metrics.wordpress_posts.inc(result="failed")
+    print("❌ 投稿失敗:", response.status_code)
+    print(response.text)
     return None
 
-def post_to_wordpress(title, content, site_url, username, app_password,
-                      featured_image_url=None, category_name=None, tags=None, publish=True):
+
+_download_session = None
+_download_session_lock = threading.Lock()
+
+
+def get_download_session():
     """
-    WordPressへ記事投稿＋アイキャッチ画像＋カテゴリ・タグ指定＋失敗時ログ
+    画像ダウンロード用の Session（WordPress の認証情報は付けない）
+    """
+    global _download_session
+    with _download_session_lock:
+        if _download_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16,
+                                  max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _download_session = session
+    return _download_session
+
+
+def download_image(image_url):
+    """
+    画像をチャンクごとにダウンロードし、ImageBuffer（一時ファイル・SHA-256・先頭バイト）を返す
     """
+    buffer = ImageBuffer()
     try:
-        featured_media_id = None
-        if featured_image_url:
-            featured_media_id = upload_featured_image(site_url, username, app_password, featured_image_url)
-
-        category_id = None
-        if category_name:
-            category_id = get_or_create_category(site_url, username, app_password, category_name)
-
-        post_data = {
-            "title": title,
-            "content": content,
-            "status": "publish" if publish else "draft",
-        }
+        with get_download_session().get(image_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                buffer.write(chunk)
+    except Exception:
+        buffer.close()
+        raise
+    return buffer.finish()
+
+
+class WordPressClient:
+    """
+    1サイト分の WordPress REST API クライアント。
+    認証付きの Session で接続を使い回し、接続数の上限とタイムアウトを設ける。
+    """
+
+    def __init__(self, site_url, username, app_password,
+                 timeout=(WP_CONNECT_TIMEOUT, WP_READ_TIMEOUT), pool_maxsize=WP_POOL_MAXSIZE):
+        self.site_url = site_url.rstrip("/")
+        self.api_url = f"{self.site_url}/wp-json/wp/v2"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(username, app_password)
+        # 5xx の再試行は GET のみ（POST は二重投稿になりうるので urllib3 の既定どおり再試行しない）
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def for_site(cls, site):
+        return get_client(site.wp_url, site.wp_username, site.wp_app_password)
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, path, **kwargs):
+        return self.session.get(f"{self.api_url}/{path}", timeout=self.timeout, **kwargs)
+
+    def _post(self, path, **kwargs):
+        return self.session.post(f"{self.api_url}/{path}", timeout=self.timeout, **kwargs)
+
+    def upload_featured_image(self, image_url):
+        """
+        画像URLをダウンロードし、WordPressメディアにアップロード → メディアIDを返す。
+        同じ画像（URL または内容ハッシュが一致）をアップロード済みのサイトには再送しない。
+        """
+        try:
+            media_id = _cache_call(media_cache.find_by_source, self.site_url, image_url)
+            if media_id:
+                _count_cache("media", 1, 0)
+                print(f"🖼 アップロード済み画像を再利用: media_id={media_id}")
+                return media_id
+
+            with metrics.timed("image_download"):
+                image = download_image(image_url)
+            try:
+                media_id = _cache_call(media_cache.find_by_hash, self.site_url, image.content_hash)
+                if media_id:
+                    _count_cache("media", 1, 0)
+                    print(f"🖼 同一内容の画像を再利用: media_id={media_id}")
+                    return media_id
+
+                _count_cache("media", 0, 1)
+                headers = image.upload_headers(image_url)
+                with metrics.timed("media_upload"):
+                    response = self._post("media", headers=headers, data=image.file)
+            finally:
+                image.close()
+
+            if response.status_code in [200, 201]:
+                media_id = response.json()["id"]
+                print(f"🖼 画像アップロード成功: media_id={media_id}")
+                _cache_call(media_cache.remember, self.site_url, image.content_hash, media_id,
+                            source_url=image_url, content_type=headers["Content-Type"])
+                return media_id
+            else:
+                print("❌ 画像アップロード失敗:", response.status_code, response.text)
+                return None
+
+        except Exception as e:
+            print("⚠️ 画像アップロードエラー:", e)
+            return None
+
+    def _lookup_terms(self, taxonomy, names):
+        """
+        名前の一覧から既存タームのIDを1回の一覧取得でまとめて引く。
+        slug パラメータは WordPress 側で名前と同じ規則で sanitize されるので、名前をそのまま渡せる。
+        """
+        found = {}
+        for start in range(0, len(names), TERM_LOOKUP_PAGE_SIZE):
+            chunk = names[start:start + TERM_LOOKUP_PAGE_SIZE]
+            response = self._get(taxonomy, params={
+                "slug": ",".join(chunk), "per_page": TERM_LOOKUP_PAGE_SIZE, "_fields": "id,name"
+            })
+            if response.status_code == 200:
+                found.update(_match_terms(response.json(), set(chunk)))
+        return found
+
+    def resolve_term_ids(self, taxonomy, names):
+        """
+        カテゴリ・タグ名のリストを ID のリストにする。
+        サイトごとのキャッシュに無い名前だけをまとめて WordPress に問い合わせ、それでも無ければ作成する。
+        """
+        names = _term_names(names)
+        if not names:
+            return []
+
+        term_ids = _cache_call(term_cache.get_many, self.site_url, taxonomy, names) or {}
+        missing = [name for name in names if name not in term_ids]
+        _count_cache("term", len(names) - len(missing), len(missing))
+        if missing:
+            with metrics.timed("term_lookup"):
+                resolved = self._lookup_terms(taxonomy, missing)
+                for name in missing:
+                    if name not in resolved:
+                        term_id = _created_term_id(self._post(taxonomy, json={"name": name}), taxonomy, name)
+                        if term_id:
+                            resolved[name] = term_id
+            _cache_call(term_cache.remember_many, self.site_url, taxonomy, resolved)
+            term_ids.update(resolved)
+        return [term_ids[name] for name in names if name in term_ids]
+
+    def get_or_create_category(self, category_name):
+        """
+        カテゴリがあればIDを取得、なければ新規作成してIDを返す（IDはサイトごとにキャッシュ）
+        """
+        try:
+            term_ids = self.resolve_term_ids("categories", [category_name])
+            if term_ids:
+                return term_ids[0]
+        except Exception as e:
+            print("⚠️ カテゴリ取得/作成エラー:", e)
+        return None
+
+    def resolve_tags(self, tags):
+        """
+        タグ名（またはID）のリストを ID のリストにする。名前はまとめて解決する。
+        """
+        names, tag_ids = _split_tags(tags)
+        if names:
+            tag_ids += self.resolve_term_ids("tags", names)
+        return list(dict.fromkeys(tag_ids))
+
+    def post(self, title, content, featured_image_url=None, category_name=None, tags=None, publish=True):
+        """
+        記事投稿＋アイキャッチ画像＋カテゴリ・タグ指定。投稿結果（JSON）か None を返す。
+        """
+        try:
+            featured_media_id = self.upload_featured_image(featured_image_url) if featured_image_url else None
+            category_id = self.get_or_create_category(category_name) if category_name else None
+            tag_ids = self.resolve_tags(tags) if tags else []
+            post_data = _build_post_data(title, content, publish, featured_media_id, category_id, tag_ids)
+
+            # キャッシュしていたメディア・タームが WordPress 側で削除されていたら、取り直して1回だけ再試行
+            for attempt in range(2):
+                with metrics.timed("wp_post"):
+                    response = self._post("posts", json=post_data)
+                if response.status_code in [200, 201] or attempt > 0:
+                    break
 
-        if featured_media_id:
-            post_data["featured_media"] = featured_media_id
-        if category_id:
-            post_data["categories"] = [category_id]
-        if tags:
-            post_data["tags"] = tags
-
-        response = requests.post(
-            f"{site_url}/wp-json/wp/v2/posts",
-            auth=HTTPBasicAuth(username, app_password),
-            json=post_data
+                retry = False
+                if featured_media_id and _is_invalid_featured_media(response):
+                    print(f"♻️ メディアID {featured_media_id} が無効なため再アップロードします")
+                    _cache_call(media_cache.forget, self.site_url, featured_media_id)
+                    featured_media_id = self.upload_featured_image(featured_image_url)
+                    post_data.pop("featured_media", None)
+                    if featured_media_id:
+                        post_data["featured_media"] = featured_media_id
+                    retry = True
+
+                for taxonomy in _invalid_taxonomies(response):
+                    if taxonomy not in post_data:
+                        continue
+                    print(f"♻️ {taxonomy} のIDが無効なため取り直します")
+                    _cache_call(term_cache.forget, self.site_url, taxonomy, post_data.pop(taxonomy))
+                    if taxonomy == "categories":
+                        term_ids = self.resolve_term_ids("categories", [category_name])
+                    else:
+                        term_ids = self.resolve_tags(tags)
+                    if term_ids:
+                        post_data[taxonomy] = term_ids
+                    retry = True
+
+                if not retry:
+                    break
+
+            return _post_result(self.site_url, post_data, response)
+
+        except Exception as e:
+            print("⚠️ 投稿中エラー:", e)
+            metrics.wordpress_posts.inc(result="error")
+            return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(site_url, username, app_password):
+    """
+    サイト（URL・認証情報）ごとに共有する WordPressClient
+    """
+    key = (site_url.rstrip("/"), username, app_password)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = WordPressClient(site_url, username, app_password)
+    return client
+
+
+class AsyncWordPressClient:
+    """
+    WordPressClient の非同期版（httpx）。
+    多数のサイトへの投稿を1つのイベントループ上で並行して行う。
+    """
+
+    def __init__(self, site_url, username, app_password,
+                 timeout=(WP_CONNECT_TIMEOUT, WP_READ_TIMEOUT), pool_maxsize=WP_POOL_MAXSIZE):
+        self.site_url = site_url.rstrip("/")
+        self.api_url = f"{self.site_url}/wp-json/wp/v2"
+        self.client = httpx.AsyncClient(
+            auth=(username, app_password),
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+            transport=httpx.AsyncHTTPTransport(retries=1),  # 接続エラーのみ再試行
         )
 
-        if response.status_code in [200, 201]:
-            print("✅ 投稿成功:", response.json().get("id"))
-            return response.json()
-        else:
-            print("❌ 投稿失敗:", response.status_code)
-            print(response.text)
+    @classmethod
+    def for_site(cls, site):
+        return get_async_client(site.wp_url, site.wp_username, site.wp_app_password)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _get(self, path, **kwargs):
+        return await self.client.get(f"{self.api_url}/{path}", **kwargs)
+
+    async def _post(self, path, **kwargs):
+        return await self.client.post(f"{self.api_url}/{path}", **kwargs)
+
+    async def upload_featured_image(self, image_url):
+        """
+        WordPressClient.upload_featured_image の非同期版
+        """
+        try:
+            media_id = _cache_call(media_cache.find_by_source, self.site_url, image_url)
+            if media_id:
+                _count_cache("media", 1, 0)
+                print(f"🖼 アップロード済み画像を再利用: media_id={media_id}")
+                return media_id
+
+            with metrics.timed("image_download"):
+                image = await adownload_image(image_url)
+            try:
+                media_id = _cache_call(media_cache.find_by_hash, self.site_url, image.content_hash)
+                if media_id:
+                    _count_cache("media", 1, 0)
+                    print(f"🖼 同一内容の画像を再利用: media_id={media_id}")
+                    return media_id
+
+                _count_cache("media", 0, 1)
+                headers = image.upload_headers(image_url)
+                with metrics.timed("media_upload"):
+                    response = await self._post("media", headers=headers, content=image.file.read())
+            finally:
+                image.close()
+
+            if response.status_code in [200, 201]:
+                media_id = response.json()["id"]
+                print(f"🖼 画像アップロード成功: media_id={media_id}")
+                _cache_call(media_cache.remember, self.site_url, image.content_hash, media_id,
+                            source_url=image_url, content_type=headers["Content-Type"])
+                return media_id
+            else:
+                print("❌ 画像アップロード失敗:", response.status_code, response.text)
+                return None
+
+        except Exception as e:
+            print("⚠️ 画像アップロードエラー:", e)
             return None
 
-    except Exception as e:
-        print("⚠️ 投稿中エラー:", e)
+    async def _lookup_terms(self, taxonomy, names):
+        found = {}
+        for start in range(0, len(names), TERM_LOOKUP_PAGE_SIZE):
+            chunk = names[start:start + TERM_LOOKUP_PAGE_SIZE]
+            response = await self._get(taxonomy, params={
+                "slug": ",".join(chunk), "per_page": TERM_LOOKUP_PAGE_SIZE, "_fields": "id,name"
+            })
+            if response.status_code == 200:
+                found.update(_match_terms(response.json(), set(chunk)))
+        return found
+
+    async def resolve_term_ids(self, taxonomy, names):
+        """
+        WordPressClient.resolve_term_ids の非同期版（未作成のタームは並行して作成）
+        """
+        names = _term_names(names)
+        if not names:
+            return []
+
+        term_ids = _cache_call(term_cache.get_many, self.site_url, taxonomy, names) or {}
+        missing = [name for name in names if name not in term_ids]
+        _count_cache("term", len(names) - len(missing), len(missing))
+        if missing:
+            with metrics.timed("term_lookup"):
+                resolved = await self._lookup_terms(taxonomy, missing)
+                to_create = [name for name in missing if name not in resolved]
+                responses = await asyncio.gather(*[self._post(taxonomy, json={"name": name}) for name in to_create])
+            for name, response in zip(to_create, responses):
+                term_id = _created_term_id(response, taxonomy, name)
+                if term_id:
+                    resolved[name] = term_id
+            _cache_call(term_cache.remember_many, self.site_url, taxonomy, resolved)
+            term_ids.update(resolved)
+        return [term_ids[name] for name in names if name in term_ids]
+
+    async def get_or_create_category(self, category_name):
+        try:
+            term_ids = await self.resolve_term_ids("categories", [category_name])
+            if term_ids:
+                return term_ids[0]
+        except Exception as e:
+            print("⚠️ カテゴリ取得/作成エラー:", e)
         return None
+
+    async def resolve_tags(self, tags):
+        names, tag_ids = _split_tags(tags)
+        if names:
+            tag_ids += await self.resolve_term_ids("tags", names)
+        return list(dict.fromkeys(tag_ids))
+
+    async def post(self, title, content, featured_image_url=None, category_name=None, tags=None, publish=True):
+        """
+        WordPressClient.post の非同期版（画像・カテゴリ・タグの準備は並行して行う）
+        """
+        async def no_value():
+            return None
+
+        try:
+            featured_media_id, category_id, tag_ids = await asyncio.gather(
+                self.upload_featured_image(featured_image_url) if featured_image_url else no_value(),
+                self.get_or_create_category(category_name) if category_name else no_value(),
+                self.resolve_tags(tags) if tags else no_value(),
+            )
+            post_data = _build_post_data(title, content, publish, featured_media_id, category_id, tag_ids)
+
+            for attempt in range(2):
+                with metrics.timed("wp_post"):
+                    response = await self._post("posts", json=post_data)
+                if response.status_code in [200, 201] or attempt > 0:
+                    break
+
+                retry = False
+                if featured_media_id and _is_invalid_featured_media(response):
+                    print(f"♻️ メディアID {featured_media_id} が無効なため再アップロードします")
+                    _cache_call(media_cache.forget, self.site_url, featured_media_id)
+                    featured_media_id = await self.upload_featured_image(featured_image_url)
+                    post_data.pop("featured_media", None)
+                    if featured_media_id:
+                        post_data["featured_media"] = featured_media_id
+                    retry = True
+
+                for taxonomy in _invalid_taxonomies(response):
+                    if taxonomy not in post_data:
+                        continue
+                    print(f"♻️ {taxonomy} のIDが無効なため取り直します")
+                    _cache_call(term_cache.forget, self.site_url, taxonomy, post_data.pop(taxonomy))
+                    if taxonomy == "categories":
+                        term_ids = await self.resolve_term_ids("categories", [category_name])
+                    else:
+                        term_ids = await self.resolve_tags(tags)
+                    if term_ids:
+                        post_data[taxonomy] = term_ids
+                    retry = True
+
+                if not retry:
+                    break
+
+            return _post_result(self.site_url, post_data, response)
+
+        except Exception as e:
+            print("⚠️ 投稿中エラー:", e)
+            metrics.wordpress_posts.inc(result="error")
+            return None
+
+
+# イベントループごとのクライアント（httpx.AsyncClient はループをまたいで使えない）
+_async_clients = weakref.WeakKeyDictionary()
+_async_download_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client(site_url, username, app_password):
+    """
+    実行中のイベントループ・サイトごとに共有する AsyncWordPressClient
+    """
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    key = (site_url.rstrip("/"), username, app_password)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = AsyncWordPressClient(site_url, username, app_password)
+    return client
+
+
+def _get_async_download_client():
+    loop = asyncio.get_running_loop()
+    client = _async_download_clients.get(loop)
+    if client is None:
+        client = _async_download_clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(DOWNLOAD_TIMEOUT[1], connect=DOWNLOAD_TIMEOUT[0]),
+            limits=httpx.Limits(max_connections=16),
+            follow_redirects=True,
+        )
+    return client
+
+
+async def adownload_image(image_url):
+    """
+    download_image の非同期版
+    """
+    buffer = ImageBuffer()
+    try:
+        async with _get_async_download_client().stream("GET", image_url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                buffer.write(chunk)
+    except Exception:
+        buffer.close()
+        raise
+    return buffer.finish()
+
+
+async def aclose_async_clients():
+    """
+    実行中のイベントループのクライアントをすべて閉じる
+    """
+    loop = asyncio.get_running_loop()
+    clients = list(_async_clients.pop(loop, {}).values())
+    download_client = _async_download_clients.pop(loop, None)
+    if download_client:
+        clients.append(download_client)
+    await asyncio.gather(*[client.aclose() for client in clients], return_exceptions=True)
+
+
+def upload_featured_image(site_url, username, app_password, image_url):
+    """
+    画像URLをダウンロードし、WordPressメディアにアップロード → メディアIDを返す
+    """
+    return get_client(site_url, username, app_password).upload_featured_image(image_url)
+
+
+def resolve_term_ids(site_url, username, app_password, taxonomy, names):
+    return get_client(site_url, username, app_password).resolve_term_ids(taxonomy, names)
+
+
+def get_or_create_category(site_url, username, app_password, category_name):
+    """
+    カテゴリがあればIDを取得、なければ新規作成してIDを返す
+    """
+    return get_client(site_url, username, app_password).get_or_create_category(category_name)
+
+
+def resolve_tags(site_url, username, app_password, tags):
+    return get_client(site_url, username, app_password).resolve_tags(tags)
+
+
+def post_to_wordpress(title, content, site_url, username, app_password,
+                      featured_image_url=None, category_name=None, tags=None, publish=True):
+    """
+    WordPressへ記事投稿＋アイキャッチ画像＋カテゴリ・タグ指定＋失敗時ログ
+    tags には タグ名・タグID のどちらも指定できる。
+    """
+    return get_client(site_url, username, app_password).post(
+        title, content,
+        featured_image_url=featured_image_url,
+        category_name=category_name,
+        tags=tags,
+        publish=publish
+    )
+
+
+async def apost_to_wordpress(title, content, site_url, username, app_password,
+                             featured_image_url=None, category_name=None, tags=None, publish=True):
+    """
+    post_to_wordpress の非同期版
+    """
+    return await get_async_client(site_url, username, app_password).post(
+        title, content,
+        featured_image_url=featured_image_url,
+        category_name=category_name,
+        tags=tags,
+        publish=publish
+    )
@@ -1,5 +1,3 @@
 from app_init import create_app
-from post_scheduler import start_scheduler  # ✅ 追加
 
-app = create_app()
-start_scheduler(app)  # ✅ アプリにスケジューラーを紐付けて起動
+app = create_app()  # ✅ スケジューラーは create_app 内で起動（リーダーの1プロセスだけが動かす）